@@ -20,6 +20,11 @@ from app.database import Base
 from app.models.user import User  # Import all models here
 from app.models.profile import StudentProfile
 from app.models.analytics import UserEvent
+from app.models.cache import AnalysisCacheEntry, ResumeSignature
+from app.models.job import AIJob
+from app.models.counselor import CounselorOutcome
+from app.models.roadmap_template import RoadmapTemplate
+from app.models.upload import UploadBlob
 
 # this is the Alembic Config object
 config = context.config
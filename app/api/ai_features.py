@@ -1,14 +1,25 @@
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Body, status
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, status
+from fastapi.responses import StreamingResponse, JSONResponse
+from app.database import get_db, SessionLocal, run_with_session
 from app.models.user import User
 from app.models.profile import StudentProfile
-from app.dependencies import get_current_user
-from app.services.ai_service import analyze_resume, improve_resume_text, generate_learning_roadmap
+from app.dependencies import get_current_user, request_deadline
+from app.services.ai_service import analyze_resume_async, improve_resume_text_async, improve_resume_texts_async, generate_learning_roadmap_async
+from app.services.analysis_service import IMPROVE_BATCH_MAX_TEXTS
 from app.services.analytics_service import track_event
-from pydantic import BaseModel
+from app.services.prompt_budget import compact_resume
+from app.utils.pdf_engine import IMAGE_ONLY
+from app.services.speculative_analysis import SPECULATIVE_JOB, resume_hash, record_speculation_outcome
+from app.services.job_queue import job_handler, enqueue_job, load_job, wait_for_job_update, TERMINAL_STATES, AI_JOB_POLL_SECONDS
+from app.services.deadline import (
+    BUDGET_ANALYZE, BUDGET_IMPROVE, BUDGET_IMPROVE_BATCH, BUDGET_ROADMAP, BUDGET_COUNSELOR, BUDGET_CHAT, BUDGET_STREAM
+)
+from pydantic import BaseModel, Field
+from typing import List
 import json
+import asyncio
 
 router = APIRouter(prefix="/ai", tags=["AI Features"])
 
@@ -19,68 +30,95 @@ class ImproveTextResponse(BaseModel):
     original: str
     improved: str
 
+class ImproveTextsRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=IMPROVE_BATCH_MAX_TEXTS)
+
+class ImproveTextsResponse(BaseModel):
+    items: List[ImproveTextResponse]
+    failed: int  # texts returned unchanged (too short, or the rewrite failed)
+
 class RoadmapResponse(BaseModel):
     roadmap: dict
 
 class CounselorRequest(BaseModel):
     answers: dict
 
-@router.post("/career-counselor")
-def career_counselor(
+@router.post("/career-counselor", dependencies=[Depends(request_deadline(BUDGET_COUNSELOR))])
+async def career_counselor(
     request: CounselorRequest,
     current_user: User = Depends(get_current_user)
 ):
     """
     Analyze user's answers to the simulation questions and suggest a career.
     """
-    from app.services.ai_service import get_career_counseling # Lazy import to avoid circular dep if any
+    from app.services.ai_service import get_career_counseling_async # Lazy import to avoid circular dep if any
     
-    return get_career_counseling(request.answers)
+    return await get_career_counseling_async(request.answers)
 
-@router.post("/analyze-resume")
-def analyze_my_resume(
-    db: Session = Depends(get_db),
+@router.post("/analyze-resume", dependencies=[Depends(request_deadline(BUDGET_ANALYZE))])
+async def analyze_my_resume(
+    background: bool = False,
     current_user: User = Depends(get_current_user)
 ):
     """
     Analyzes the user's uploaded resume text.
-    User must have uploaded a resume first.
+    User must have uploaded a resume first. An analysis already made for
+    the current resume (normally by the speculation started on upload) is
+    returned without calling the LLM again. A scanned (image-only) PDF gets
+    a 422 straight away.
+    With `?background=true` the analysis runs as a job: the response is a
+    202 with a job id to poll at GET /ai/jobs/{job_id}.
     """
+    user_id = current_user.id
     try:
-        profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
+        resume = await asyncio.to_thread(run_with_session, load_resume_state, user_id)
         
-        if not profile or not profile.has_resume or not profile.parsed_resume_content:
+        if resume and resume["has_resume"] and resume["classification"] == IMAGE_ONLY:
+            # Pre-scan found no text layer: the LLM would only be asked to analyze nothing
+            raise HTTPException(
+                status_code=422,
+                detail="Your resume is a scanned (image-only) PDF, so there is no text to analyze. Please upload a text-based PDF or a DOCX."
+            )
+        if not resume or not resume["has_resume"] or not resume["text"]:
             raise HTTPException(status_code=400, detail="No resume found to analyze. Please upload one first.")
+
+        if background:
+            job = await asyncio.to_thread(run_with_session, enqueue_job, user_id, "analyze_resume")
+            return job_accepted(job)
         
-        # helper logic to perform analysis
-        analysis_result = analyze_resume(profile.parsed_resume_content)
-        
-        profile.skill_analysis = json.dumps(analysis_result)
-        db.commit()
-        
-        # [CIG] Track Event: Resume Analyzed
-        track_event(db, current_user.id, "resume_analyzed", {
-            "score": analysis_result.get("score"),
-            "missing_skills_count": len(analysis_result.get("missing_skills", []))
-        })
+        # Usually already there: upload starts a speculative analysis
+        current_hash = resume_hash(resume["text"])
+        ready = bool(resume["skill_analysis"]) and resume["skill_analysis_hash"] == current_hash
+        await asyncio.to_thread(run_with_session, record_speculation_outcome, user_id, current_hash, ready)
+        if ready:
+            analysis_result = json.loads(resume["skill_analysis"])
+            # [CIG] Track Event: Resume Analyzed
+            await asyncio.to_thread(run_with_session, track_event, user_id, "resume_analyzed", {
+                "score": analysis_result.get("score"),
+                "missing_skills_count": len(analysis_result.get("missing_skills", []))
+            })
+        else:
+            analysis_result = await analyze_resume_async(resume["text"])
+            # Saves (unless the resume was replaced meanwhile) and tracks resume_analyzed
+            await asyncio.to_thread(save_analysis, user_id, analysis_result, resume["text"])
         
         return {
             "success": True,
             "data": analysis_result,
             "error": None
         }
+    except HTTPException:
+        raise
     except OperationalError:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database temporarily unavailable. Please retry."
         )
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/improve-text", response_model=ImproveTextResponse)
-def improve_content(
+@router.post("/improve-text", response_model=ImproveTextResponse, dependencies=[Depends(request_deadline(BUDGET_IMPROVE))])
+async def improve_content(
     request: ImproveTextRequest,
     current_user: User = Depends(get_current_user)
 ):
@@ -92,60 +130,315 @@ def improve_content(
     if not request.text or len(request.text) < 3:
         raise HTTPException(status_code=400, detail="Text too short to improve")
         
-    improved = improve_resume_text(request.text)
+    improved = await improve_resume_text_async(request.text)
     return {
         "original": request.text,
         "improved": improved
     }
 
+@router.post("/improve-texts", response_model=ImproveTextsResponse, dependencies=[Depends(request_deadline(BUDGET_IMPROVE_BATCH))])
+async def improve_many(
+    request: ImproveTextsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Rewrite many bullet points at once (e.g. a whole resume). Texts are
+    packed into a few concurrent LLM calls. Results keep the input order;
+    a text that could not be rewritten comes back as it was.
+    """
+    rewrites = await improve_resume_texts_async(request.texts)
+    return {
+        "items": [
+            {"original": text, "improved": improved if improved is not None else text}
+            for text, improved in zip(request.texts, rewrites)
+        ],
+        "failed": sum(1 for improved in rewrites if improved is None)
+    }
+
 class RoadmapRequest(BaseModel):
-    duration: int = 8
+    duration: int = Field(8, ge=1, le=52)  # Weeks; long roadmaps are generated in parallel chunks
     custom_goal: str = None  # User can override/specify goal
 
-@router.post("/roadmap", response_model=RoadmapResponse)
-def get_career_roadmap(
+@router.post("/roadmap", response_model=RoadmapResponse, dependencies=[Depends(request_deadline(BUDGET_ROADMAP))])
+async def get_career_roadmap(
     request: RoadmapRequest = Body(...),
-    db: Session = Depends(get_db),
+    background: bool = False,
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Generates and saves a learning roadmap. With `?background=true` it runs
+    as a job and the response is a 202 with a job id instead.
+    """
+    user_id = current_user.id
     try:
-        profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
-        if not profile:
+        profile_data = await asyncio.to_thread(run_with_session, load_roadmap_profile_data, user_id, request)
+        if profile_data is None:
             raise HTTPException(status_code=404, detail="Profile not found")
-            
-        # Construct profile dict for AI
-        profile_data = {
-            "education": profile.education_level,
-            "major": profile.field_of_study,
-            "interests": profile.interests,
-            "goals": request.custom_goal if request.custom_goal else profile.career_goals,
-            "has_resume": profile.has_resume,
-            "resume_content": profile.parsed_resume_content if profile.has_resume else None
-        }
-        
-        # Explicitly set the target career goal in the data so service knows what to focus on
-        if request.custom_goal:
-            profile_data['careerGoals'] = request.custom_goal
 
-        roadmap = generate_learning_roadmap(profile_data, request.duration)
+        if background:
+            job = await asyncio.to_thread(run_with_session, enqueue_job, user_id, "roadmap", {
+                "profile_data": profile_data,
+                "duration": request.duration
+            })
+            return job_accepted(job)
+
+        roadmap = await generate_learning_roadmap_async(profile_data, request.duration)
         
         # SAVE to DB (Initialize status)
         for week in roadmap.get("weeks", []):
-            week["status"] = "LOCKED" if week["week"] > 1 else "CURRENT"
-            week["completed_tasks"] = []
-            
-        # Serialize to JSON string
-        profile.roadmap_data = json.dumps(roadmap)
-        db.commit()
+            init_week_progress(week)
+        await asyncio.to_thread(save_roadmap, user_id, roadmap)
         
         return {"roadmap": roadmap}
     except OperationalError:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database temporarily unavailable. Please retry."
         )
 
+@router.post("/roadmap/stream", dependencies=[Depends(request_deadline(BUDGET_STREAM))])
+async def stream_career_roadmap(
+    http_request: Request,
+    request: RoadmapRequest = Body(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Streaming variant of POST /roadmap: each week is sent as its own event the
+    moment the model finishes it, followed by a `done` event with the full
+    roadmap, which is then saved like the non-streaming endpoint.
+    Uses SSE, or NDJSON with `Accept: application/x-ndjson`.
+    """
+    from app.services.ai_service import stream_learning_roadmap
+
+    user_id = current_user.id
+    try:
+        profile_data = await asyncio.to_thread(run_with_session, load_roadmap_profile_data, user_id, request)
+    except OperationalError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database temporarily unavailable. Please retry."
+        )
+    if profile_data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    ndjson = wants_ndjson(http_request)
+
+    async def event_stream():
+        stream = stream_learning_roadmap(profile_data, request.duration)
+        try:
+            async for event, payload in stream:
+                if event == "week":
+                    init_week_progress(payload)
+                    yield stream_frame("week", payload, ndjson)
+                    continue
+
+                for week in payload.get("weeks", []):
+                    init_week_progress(week)
+                if payload.get("weeks"):
+                    await asyncio.to_thread(save_roadmap, user_id, payload)
+                yield stream_frame("done", {"roadmap": payload}, ndjson)
+        except Exception as e:
+            print(f"Roadmap stream error: {e}")
+            yield stream_frame("error", {"detail": "Roadmap generation failed"}, ndjson)
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def build_roadmap_profile_data(profile: StudentProfile, request: RoadmapRequest) -> dict:
+    # Construct profile dict for AI
+    profile_data = {
+        "education": profile.education_level,
+        "major": profile.field_of_study,
+        "interests": profile.interests,
+        "goals": request.custom_goal if request.custom_goal else profile.career_goals,
+        "has_resume": profile.has_resume,
+        "resume_content": profile.parsed_resume_content if profile.has_resume else None,
+        "experience_level": saved_experience_level(profile)
+    }
+
+    # Explicitly set the target career goal in the data so service knows what to focus on
+    if request.custom_goal:
+        profile_data['careerGoals'] = request.custom_goal
+    return profile_data
+
+def load_roadmap_profile_data(db: Session, user_id: int, request: RoadmapRequest):
+    """Roadmap input for the user's profile, or None without a profile"""
+    profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+    return build_roadmap_profile_data(profile, request) if profile else None
+
+def saved_experience_level(profile: StudentProfile):
+    """Experience level from the last saved resume analysis, if any"""
+    try:
+        analysis = json.loads(profile.skill_analysis) if profile.skill_analysis else None
+    except ValueError:
+        return None
+    return analysis.get("experience_level") if isinstance(analysis, dict) else None
+
+def init_week_progress(week: dict):
+    week["status"] = "LOCKED" if week.get("week", 1) > 1 else "CURRENT"
+    week["completed_tasks"] = []
+
+def save_roadmap(user_id: int, roadmap: dict):
+    """
+    Persists a streamed or background roadmap. There is no request session
+    to use by then (streaming runs after it closes), so this opens its own.
+    """
+    db = SessionLocal()
+    try:
+        profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+        if profile:
+            profile.roadmap_data = json.dumps(roadmap)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to save streamed roadmap: {e}")
+    finally:
+        db.close()
+
+def save_analysis(user_id: int, analysis_result: dict, resume_text: str, track: bool = True) -> bool:
+    """
+    Persists a background analysis with its own session, like save_roadmap.
+    Skipped (returns False) if a newer resume replaced `resume_text` meanwhile.
+    """
+    db = SessionLocal()
+    try:
+        profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+        if not profile or profile.parsed_resume_content != resume_text:
+            return False
+        profile.skill_analysis = json.dumps(analysis_result)
+        profile.skill_analysis_hash = resume_hash(resume_text)
+        db.commit()
+        if track:
+            track_event(db, user_id, "resume_analyzed", {
+                "score": analysis_result.get("score"),
+                "missing_skills_count": len(analysis_result.get("missing_skills", []))
+            })
+        return True
+    finally:
+        db.close()
+
+def load_resume_state(db: Session, user_id: int):
+    """What analyze-resume needs from the profile, read in one query; None without a profile"""
+    profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+    if not profile:
+        return None
+    return {
+        "has_resume": profile.has_resume,
+        "classification": profile.resume_classification,
+        "text": profile.parsed_resume_content,
+        "skill_analysis": profile.skill_analysis,
+        "skill_analysis_hash": profile.skill_analysis_hash
+    }
+
+def load_resume_text(user_id: int):
+    db = SessionLocal()
+    try:
+        profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+        if not profile or not profile.has_resume:
+            return None
+        return profile.parsed_resume_content
+    finally:
+        db.close()
+
+@job_handler("analyze_resume", queue="analysis")
+async def run_analysis_job(user_id: int, payload: dict) -> dict:
+    resume_text = await asyncio.to_thread(load_resume_text, user_id)
+    if not resume_text:
+        raise ValueError("No resume found to analyze")
+    analysis_result = await analyze_resume_async(resume_text)
+    await asyncio.to_thread(save_analysis, user_id, analysis_result, resume_text)
+    return {"success": True, "data": analysis_result, "error": None}
+
+@job_handler(SPECULATIVE_JOB, queue="speculative")
+async def run_speculative_analysis_job(user_id: int, payload: dict) -> dict:
+    """
+    Analysis started by an upload. Tracked as resume_analyzed only when the
+    user asks for it; the result lives on the profile, not the job.
+    """
+    resume_text = await asyncio.to_thread(load_resume_text, user_id)
+    if not resume_text or resume_hash(resume_text) != payload.get("resume_hash"):
+        return {"superseded": True}
+    analysis_result = await analyze_resume_async(resume_text)
+    saved = await asyncio.to_thread(save_analysis, user_id, analysis_result, resume_text, False)
+    return {"superseded": not saved}
+
+@job_handler("roadmap", queue="roadmap")
+async def run_roadmap_job(user_id: int, payload: dict) -> dict:
+    roadmap = await generate_learning_roadmap_async(payload["profile_data"], payload.get("duration", 8))
+    for week in roadmap.get("weeks", []):
+        init_week_progress(week)
+    await asyncio.to_thread(save_roadmap, user_id, roadmap)
+    return {"roadmap": roadmap}
+
+def job_accepted(job: dict) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/ai/jobs/{job['job_id']}"
+    })
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Poll a background job. `result` holds the same body the synchronous
+    endpoint would have returned once `status` is `succeeded`.
+    """
+    job = await asyncio.to_thread(load_job, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(
+    job_id: str,
+    http_request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Subscribe to a background job: sends a `status` event on every change and
+    closes after the final one. SSE by default, NDJSON on request.
+    """
+    user_id = current_user.id
+    job = await asyncio.to_thread(load_job, job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    ndjson = wants_ndjson(http_request)
+
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield stream_frame("status", current, ndjson)
+            if current["status"] in TERMINAL_STATES or await http_request.is_disconnected():
+                return
+            await wait_for_job_update(job_id, AI_JOB_POLL_SECONDS)
+            current = await asyncio.to_thread(load_job, job_id, user_id) or current
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def wants_ndjson(http_request: Request) -> bool:
+    return "application/x-ndjson" in http_request.headers.get("accept", "")
+
+def stream_frame(event: str, payload: dict, ndjson: bool) -> str:
+    """Formats one streamed event as an SSE frame or an NDJSON line"""
+    if ndjson:
+        return json.dumps({"type": event, **payload}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 @router.get("/roadmap", response_model=RoadmapResponse)
 def get_existing_roadmap(
     db: Session = Depends(get_db),
@@ -219,56 +512,72 @@ class ChatRequest(BaseModel):
     message: str
     history: list = [] # List of {"role": "user"|"model", "content": "..."}
 
-@router.post("/chat")
-def chat_endpoint(
+@router.post("/chat", dependencies=[Depends(request_deadline(BUDGET_CHAT))])
+async def chat_endpoint(
     request: ChatRequest,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Real-time chat with the AI Career Mentor.
     """
-    from app.services.ai_service import chat_with_mentor
+    from app.services.ai_service import chat_with_mentor_async
     
-    # Optional: Fetch profile to give AI context about user
-    profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
-    user_context = {}
-    if profile:
-        user_context = {
-            "name": profile.full_name or current_user.email.split('@')[0],
-            "role": profile.target_role or "Aspiring Professional",
-            "education": profile.education_level or "Unknown",
-            "skills": profile.parsed_resume_content if profile.has_resume else "Unknown"
-        }
+    user_context = await asyncio.to_thread(run_with_session, build_chat_context, current_user)
 
-    response = chat_with_mentor(request.message, request.history, user_context)
+    response = await chat_with_mentor_async(request.message, request.history, user_context)
     return {"response": response}
 
-class ChatRequest(BaseModel):
-    message: str
-    history: list = [] # List of {"role": "user"|"model", "content": "..."}
-
-@router.post("/chat")
-def chat_endpoint(
+@router.post("/chat/stream", dependencies=[Depends(request_deadline(BUDGET_STREAM))])
+async def chat_stream_endpoint(
     request: ChatRequest,
-    db: Session = Depends(get_db),
+    http_request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """
-    Real-time chat with the AI Career Mentor.
+    Streaming chat with the AI Career Mentor.
+    Sends Server-Sent Events by default; clients that send
+    `Accept: application/x-ndjson` get newline-delimited JSON chunks instead.
+    Upstream generation stops as soon as the client disconnects.
     """
-    from app.services.ai_service import chat_with_mentor
-    
-    # Optional: Fetch profile to give AI context about user
-    profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
-    user_context = {}
-    if profile:
-        user_context = {
-            "name": profile.full_name or current_user.email.split('@')[0],
-            "role": profile.target_role or "Aspiring Professional",
-            "education": profile.education_level or "Unknown",
-            "skills": profile.parsed_resume_content if profile.has_resume else "Unknown"
-        }
+    from app.services.ai_service import stream_chat_with_mentor
 
-    response = chat_with_mentor(request.message, request.history, user_context)
-    return {"response": response}
+    user_context = await asyncio.to_thread(run_with_session, build_chat_context, current_user)
+    ndjson = wants_ndjson(http_request)
+
+    async def event_stream():
+        stream = stream_chat_with_mentor(request.message, request.history, user_context)
+        parts = []
+        try:
+            async for chunk in stream:
+                if await http_request.is_disconnected():
+                    break
+                parts.append(chunk)
+                yield stream_frame("delta", {"content": chunk}, ndjson)
+            else:
+                yield stream_frame("done", {"response": "".join(parts)}, ndjson)
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield stream_frame("error", {"detail": "AI service error", "response": "".join(parts)}, ndjson)
+        finally:
+            # Also reached when Starlette cancels us on disconnect
+            await stream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def build_chat_context(db: Session, current_user: User) -> dict:
+    """
+    Optional: Fetch profile to give AI context about user
+    """
+    profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
+    if not profile:
+        return {}
+    return {
+        "name": current_user.full_name or current_user.email.split('@')[0],
+        "role": profile.target_role or "Aspiring Professional",
+        "education": profile.education_level or "Unknown",
+        "skills": compact_resume(profile.parsed_resume_content, "chat_context") if profile.has_resume else "Unknown"
+    }
@@ -17,6 +17,7 @@ from app.utils.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from app.dependencies import get_current_user
+from app.services.upload_store import release_blob, remove_blob_file
 
 # Create router
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -145,7 +146,15 @@ def delete_account(
     Requires valid JWT token in Authorization header
     """
     # In production, you might want to soft delete or anonymize data
+    # Release the resume's stored file (deleted once no other profile uses it)
+    released_file = None
+    profile = current_user.profile
+    if profile and profile.resume_blob_hash:
+        blob_hash, profile.resume_blob_hash = profile.resume_blob_hash, None
+        db.flush()
+        released_file = release_blob(db, blob_hash)
     db.delete(current_user)
     db.commit()
+    remove_blob_file(released_file)
     
     return MessageResponse(message="Account deleted successfully")
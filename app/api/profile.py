@@ -1,12 +1,18 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, run_with_session
 from app.models.user import User
 from app.models.profile import StudentProfile
 from app.schemas.profile import ProfileCreate, ProfileResponse, ResumeUploadResponse
 from app.dependencies import get_current_user
-from app.utils.file_processing import save_upload_file, extract_text_from_file
+from app.utils.file_processing import save_upload_file
+from app.services.extraction_pool import ExtractionBusy, extraction_slot, extract_text_async, classify_upload_async
+from app.services.upload_store import store_upload, save_extraction, keep_blob, give_back_blob, remove_blob_file
+from app.utils.pdf_engine import IMAGE_ONLY
+from app.services.near_duplicate import record_resume_signature
+from app.services.speculative_analysis import start_speculative_analysis
 
 router = APIRouter(prefix="/profile", tags=["Profile & Resume"])
 
@@ -53,54 +59,107 @@ def create_or_update_profile(
             detail="Database temporarily unavailable. Please retry."
         )
 
+def save_uploaded_resume(db: Session, user_id: int, filename: str, extracted_text: str,
+                         classification, content_hash: str, file_path: str):
+    """
+    Points the user's profile at the uploaded resume and commits. Returns
+    the file of a blob the profile released, to remove after the commit.
+    """
+    profile = db.query(StudentProfile).filter(StudentProfile.user_id == user_id).first()
+    
+    if not profile:
+        profile = StudentProfile(user_id=user_id)
+        db.add(profile)
+    
+    # Update resume fields
+    profile.has_resume = True
+    profile.resume_filename = filename
+    profile.parsed_resume_content = extracted_text
+    profile.resume_classification = classification
+    # The upload's blob reference becomes the profile's; a replaced blob is released
+    released_file = keep_blob(db, profile, content_hash, file_path)
+    
+    db.commit()
+    return released_file
+
 @router.post("/upload", response_model=ResumeUploadResponse)
 async def upload_resume(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Path A: Upload resume file (PDF/DOCX) -> Extract Text -> Update Profile
+    Files are stored by content hash: a re-upload of the same file reuses
+    the stored copy and its extracted text.
     """
     # Validate file type
     if file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF and DOCX are supported.")
     
-    # 1. Save File
-    file_path = save_upload_file(file, current_user.id)
-    
-    # 2. Extract Text
-    extracted_text = extract_text_from_file(file_path, file.content_type)
+    # 1. Save File, 2. Pre-scan, 3. Extract Text - all off the event loop, scan and extraction in the process pool
+    try:
+        async with extraction_slot(current_user.id):
+            try:
+                stored = await asyncio.to_thread(store_upload, file, file.content_type)
+            except Exception as e:
+                print(f"Error saving file: {e}")
+                raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
+            content_hash, file_path = stored["content_hash"], stored["file_path"]
+            try:
+                if stored["extracted_text"] is not None:
+                    # Same bytes uploaded before: reuse that extraction
+                    extracted_text, classification = stored["extracted_text"], stored["classification"]
+                else:
+                    classification = await classify_upload_async(file_path, file.content_type)
+                    if classification == IMAGE_ONLY:
+                        # Scanned pages without a text layer: extraction would only find noise
+                        extracted_text = ""
+                    else:
+                        extracted_text = await extract_text_async(file_path, file.content_type)
+                    await asyncio.to_thread(save_extraction, content_hash, extracted_text, classification)
+            except BaseException:
+                await asyncio.to_thread(give_back_blob, content_hash)
+                raise
+    except ExtractionBusy as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
     
-    if not extracted_text or len(extracted_text.strip()) < 50:
+    if classification == IMAGE_ONLY:
+        message = "File uploaded, but it is a scanned (image-only) PDF with no text to analyze. Please upload a text-based PDF or a DOCX."
+    elif not extracted_text or len(extracted_text.strip()) < 50:
         # Warning if text extraction failed (e.g. image based PDF)
         message = "File uploaded, but could not extract much text. It might be an image-only PDF."
     else:
         message = "Resume uploaded and analyzed successfully."
 
+    blob_kept = False
     try:
-        # 3. Update/Create Profile in DB
-        profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
-        
-        if not profile:
-            profile = StudentProfile(user_id=current_user.id)
-            db.add(profile)
+        # 3. Update/Create Profile in DB, off the event loop with its own session
+        released_file = await asyncio.to_thread(
+            run_with_session, save_uploaded_resume, current_user.id, file.filename,
+            extracted_text, classification, content_hash, file_path
+        )
+        blob_kept = True
+        await asyncio.to_thread(remove_blob_file, released_file)
         
-        # Update resume fields
-        profile.has_resume = True
-        profile.resume_filename = file.filename
-        profile.resume_file_path = file_path
-        profile.parsed_resume_content = extracted_text
+        # Signature for near-duplicate analysis reuse (no-op unless enabled)
+        await asyncio.to_thread(record_resume_signature, extracted_text)
         
-        db.commit()
+        # Analyze now so the result is ready when the user opens it
+        await asyncio.to_thread(run_with_session, start_speculative_analysis, current_user.id, extracted_text)
         
         return {
             "filename": file.filename,
             "parsed_content_preview": extracted_text[:200] + "..." if extracted_text else "",
-            "message": message
+            "message": message,
+            "classification": classification
         }
     except OperationalError:
-        db.rollback()
+        if not blob_kept:
+            await asyncio.to_thread(give_back_blob, content_hash)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database temporarily unavailable. Please retry."
@@ -120,7 +179,7 @@ async def upload_profile_picture(
     
     # Save file (reusing save_upload_file logic but maybe organizing better later)
     # Ideally should be in 'uploads/avatars' but simple 'uploads' is fine for now
-    file_path = save_upload_file(file, current_user.id, sub_folder="avatars")
+    file_path = await asyncio.to_thread(save_upload_file, file, current_user.id, "avatars")
     
     try:
         profile = db.query(StudentProfile).filter(StudentProfile.user_id == current_user.id).first()
@@ -48,3 +48,18 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def run_with_session(fn, *args):
+    """
+    Calls fn(db, *args) with a session of its own. Async handlers run DB
+    work through this with asyncio.to_thread, so queries and commits never
+    block the event loop.
+    """
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
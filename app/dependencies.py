@@ -1,15 +1,17 @@
 """
 FastAPI dependencies for authentication and database
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
 from app.database import get_db
 from app.models.user import User
+from app.services.deadline import set_deadline
 
 load_dotenv()
 
@@ -61,3 +63,21 @@ def get_current_user(
         raise credentials_exception
         
     return user
+
+
+def request_deadline(default_seconds: float):
+    """
+    Build a dependency that starts the AI time budget for a request
+    
+    Args:
+        default_seconds: Budget used when the client sends no X-Request-Timeout
+        
+    Returns:
+        Async dependency; the budget is visible to every AI call the request makes
+    """
+    async def start_deadline(x_request_timeout: Optional[float] = Header(None)):
+        # Async so the context variable is set in the request's own context
+        seconds = x_request_timeout if x_request_timeout and x_request_timeout > 0 else default_seconds
+        set_deadline(seconds)
+
+    return start_deadline
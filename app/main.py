@@ -12,11 +12,27 @@ from app.api.auth import router as auth_router
 from app.api.profile import router as profile_router
 from app.api.ai_features import router as ai_router
 from app.api.analytics import router as analytics_router
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, request_deadline
 from app.models.user import User
 
 # Import existing services
-from app.services.ai_service import analyze_resume
+from app.services.ai_service import analyze_resume_async
+from app.services.llm_gateway import close_gateway
+from app.services.analysis_cache import analysis_cache_stats
+from app.services.singleflight import singleflight_stats
+from app.services.hedging import hedging_stats
+from app.services.circuit_breaker import breaker_states
+from app.services.deadline import BUDGET_ANALYZE
+from app.services.job_queue import start_job_workers, stop_job_workers, job_queue_stats
+from app.services.counselor_service import counselor_stats
+from app.services.near_duplicate import near_duplicate_stats
+from app.services.roadmap_templates import roadmap_template_stats
+from app.services.structured_output import structured_output_stats
+from app.services.prompt_budget import prompt_budget_stats
+from app.services.prompt_registry import prompt_registry_stats
+from app.services.speculative_analysis import speculative_analysis_stats
+from app.services.extraction_pool import start_extraction_pool, stop_extraction_pool, extraction_pool_stats
+from app.services.upload_store import upload_store_stats
 from app.config import get_config_status
 
 # Import database
@@ -47,6 +63,30 @@ app.include_router(ai_router)
 app.include_router(analytics_router)
 
 
+@app.on_event("startup")
+async def startup_job_workers():
+    """Start background AI job workers (disabled with AI_JOB_WORKERS=false)"""
+    await start_job_workers()
+
+
+@app.on_event("startup")
+async def startup_extraction_pool():
+    """Pre-start resume extraction workers (disabled with EXTRACTION_POOL_ENABLED=false)"""
+    await start_extraction_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown_extraction_pool():
+    await stop_extraction_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown_llm_gateway():
+    """Requeue in-flight jobs, then release pooled LLM provider connections"""
+    await stop_job_workers()
+    await close_gateway()
+
+
 # ===== AI Analysis Models (from original code) =====
 
 class ResumeRequest(BaseModel):
@@ -97,13 +137,31 @@ async def health_check():
     return {
         "status": "healthy",
         "database": "connected",
-        "ai_services": config
+        "ai_services": config,
+        "analysis_cache": analysis_cache_stats(),
+        "singleflight": singleflight_stats(),
+        "hedging": hedging_stats(),
+        "circuit_breakers": breaker_states(),
+        "job_queue": job_queue_stats(),
+        "career_counselor": counselor_stats(),
+        "near_duplicate": near_duplicate_stats(),
+        "roadmap_templates": roadmap_template_stats(),
+        "llm_output": structured_output_stats(),
+        "prompt_budget": prompt_budget_stats(),
+        "prompts": prompt_registry_stats(),
+        "speculative_analysis": speculative_analysis_stats(),
+        "extraction_pool": extraction_pool_stats(),
+        "upload_store": upload_store_stats()
     }
 
 
 # ===== AI Analysis Endpoints (from original code, now protected) =====
 
-@app.post("/analyze-resume", response_model=AnalysisResponse)
+@app.post(
+    "/analyze-resume",
+    response_model=AnalysisResponse,
+    dependencies=[Depends(request_deadline(BUDGET_ANALYZE))]
+)
 async def analyze(
     request: ResumeRequest,
     current_user: User = Depends(get_current_user)
@@ -126,7 +184,7 @@ async def analyze(
             )
         
         # Call AI service to analyze resume
-        result = analyze_resume(request.resume_text)
+        result = await analyze_resume_async(request.resume_text)
         
         return AnalysisResponse(success=True, data=result)
         
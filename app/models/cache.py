@@ -0,0 +1,30 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    # sha256 of (prompt version, model, normalized resume text)
+    cache_key = Column(String(64), primary_key=True)
+    prompt_version = Column(String(50), nullable=False)
+    model = Column(String(100), nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    # Shared second-tier cache: survives restarts and is visible to every worker
+
+
+class ResumeSignature(Base):
+    __tablename__ = "resume_signatures"
+
+    # sha256 of the normalized resume text
+    content_hash = Column(String(64), primary_key=True)
+    signature = Column(JSON, nullable=False)  # MinHash values, one per permutation
+    skills = Column(JSON, nullable=False)     # Locally extracted skills
+    # Analysis this resume produced, if any; only those resumes are reused from
+    analysis_key = Column(String(64), nullable=True)
+    prompt_version = Column(String(50), nullable=True)
+    model = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    analyzed_at = Column(DateTime(timezone=True), nullable=True, index=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+class CounselorOutcome(Base):
+    __tablename__ = "counselor_outcomes"
+
+    # One row per A/B answer combination, e.g. "ABA" for q1=A, q2=B, q3=A
+    combo = Column(String(8), primary_key=True)
+    prompt_version = Column(String(50), nullable=False)
+    result = Column(JSON, nullable=False)  # {archetype, suggested_role, reasoning, recommended_path}
+    source = Column(String(20), nullable=False)  # 'llm' (offline refresh) or 'manual'
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Served in-process by counselor_service; refreshed offline, never on the request path
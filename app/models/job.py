@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+class AIJob(Base):
+    __tablename__ = "ai_jobs"
+
+    id = Column(String(36), primary_key=True)  # uuid4, handed to the client
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False)   # e.g. 'analyze_resume', 'roadmap'
+    queue = Column(String(50), nullable=False)  # concurrency group, e.g. 'analysis'
+    status = Column(String(20), nullable=False, default="queued")  # queued | running | succeeded | failed | cancelled
+    payload = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Workers claim the oldest queued job per queue
+    __table_args__ = (Index("ix_ai_jobs_queue_status_created", "queue", "status", "created_at"),)
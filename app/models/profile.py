@@ -23,6 +23,7 @@ class StudentProfile(Base):
     
     # AI Analysis & Roadmap Persistence
     skill_analysis = Column(Text, nullable=True)  # JSON String: {score, skills: [{name, level}], missing_skills}
+    skill_analysis_hash = Column(String(64), nullable=True)  # sha256 of the resume text skill_analysis was made from
     roadmap_data = Column(Text, nullable=True)    # JSON String: {weeks: [...]}
     
     # Professional Identity (The "Imp Things")
@@ -37,7 +38,9 @@ class StudentProfile(Base):
     has_resume = Column(Boolean, default=False)
     resume_filename = Column(String(255), nullable=True)
     resume_file_path = Column(String(500), nullable=True)
+    resume_blob_hash = Column(String(64), ForeignKey("upload_blobs.content_hash"), nullable=True)  # Content-addressed upload (upload_store)
     parsed_resume_content = Column(Text, nullable=True)  # Full text extracted from PDF
+    resume_classification = Column(String(20), nullable=True)  # text / mixed / image_only (pdf_engine pre-scan)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Integer, DateTime, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+class RoadmapTemplate(Base):
+    __tablename__ = "roadmap_templates"
+
+    # sha256 of (prompt version, normalized goal, experience level, duration)
+    template_key = Column(String(64), primary_key=True)
+    prompt_version = Column(String(50), nullable=False)
+    career_goal = Column(String(200), nullable=False)  # Normalized, e.g. "full stack developer"
+    experience_level = Column(String(20), nullable=False)  # beginner / intermediate / advanced / any
+    duration_weeks = Column(Integer, nullable=False)
+    roadmap = Column(JSON, nullable=False)  # Base roadmap, before personalization
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    # Shared across users: never holds profile or resume data
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+class UploadBlob(Base):
+    __tablename__ = "upload_blobs"
+
+    # sha256 of the uploaded bytes; the file is stored once under this name
+    content_hash = Column(String(64), primary_key=True)
+    file_path = Column(String(500), nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    # Profiles (and uploads in progress) holding the blob; at 0 it is deleted
+    ref_count = Column(Integer, nullable=False, default=0)
+    # Cached extraction, valid while extraction_version matches the current engine settings
+    extracted_text = Column(Text, nullable=True)
+    classification = Column(String(20), nullable=True)  # text / mixed / image_only
+    extraction_version = Column(String(50), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())
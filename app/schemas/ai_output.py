@@ -0,0 +1,122 @@
+"""
+Shapes of the JSON documents the LLM prompts ask for.
+
+Validation is lenient where models commonly drift ("85%" for a number, a
+comma-separated string for a list) and strict on the fields the app needs.
+The TypeAdapters are built once at import; their JSON schemas are also sent
+as `response_format` to providers that support structured output.
+"""
+from typing import Any, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
+
+
+def _as_int(value):
+    if isinstance(value, str):
+        value = value.strip().rstrip("%").strip()
+    return value
+
+
+def _as_str_list(value):
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    if isinstance(value, list):
+        return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+    return value
+
+
+class CareerMatch(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    title: str
+    match_percent: int = 0
+
+    @field_validator("match_percent", mode="before")
+    @classmethod
+    def percent(cls, value):
+        return _as_int(value)
+
+
+class AnalysisOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    skills: List[str]
+    experience_level: str
+    top_careers: List[CareerMatch]
+    score: Optional[int] = None
+    missing_skills: List[str] = []
+    roadmap: Optional[Any] = None
+
+    @field_validator("skills", "missing_skills", mode="before")
+    @classmethod
+    def string_list(cls, value):
+        return _as_str_list(value)
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def score_int(cls, value):
+        return _as_int(value)
+
+
+class RoadmapWeek(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    week: int
+    topic: str
+    tasks: List[str]
+    resources: List[str] = []
+
+    @field_validator("tasks", "resources", mode="before")
+    @classmethod
+    def string_list(cls, value):
+        return _as_str_list(value)
+
+
+class RoadmapOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    career_goal: str
+    weeks: List[RoadmapWeek] = Field(min_length=1)
+
+    @field_validator("weeks", mode="before")
+    @classmethod
+    def complete_weeks(cls, value):
+        # A reply cut off at max_tokens ends in a partial week; keep the complete ones
+        if isinstance(value, list):
+            return [w for w in value if isinstance(w, dict) and w.get("topic") and w.get("tasks")]
+        return value
+
+
+class CounselingOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    archetype: str
+    suggested_role: str
+    reasoning: str
+    recommended_path: str
+
+
+class ImprovedText(BaseModel):
+    id: int
+    text: str
+
+
+class ImproveBatchOutput(BaseModel):
+    items: List[ImprovedText] = []
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def usable_items(cls, value):
+        # One malformed entry must not cost the rest of the batch
+        if isinstance(value, list):
+            return [
+                item for item in value
+                if isinstance(item, dict) and isinstance(item.get("id"), int)
+                and isinstance(item.get("text"), str) and item["text"].strip()
+            ]
+        return value
+
+
+ANALYSIS_OUTPUT = TypeAdapter(AnalysisOutput)
+ROADMAP_OUTPUT = TypeAdapter(RoadmapOutput)
+COUNSELING_OUTPUT = TypeAdapter(CounselingOutput)
+IMPROVE_BATCH_OUTPUT = TypeAdapter(ImproveBatchOutput)
@@ -45,6 +45,7 @@ class ProfileResponse(ProfileBase):
     profile_picture_url: Optional[str] = None
     has_resume: bool = False
     resume_filename: Optional[str] = None
+    resume_classification: Optional[str] = None
     skill_analysis: Optional[str] = None
     roadmap_data: Optional[str] = None
     created_at: Optional[datetime] = None
@@ -58,3 +59,4 @@ class ResumeUploadResponse(BaseModel):
     filename: str
     parsed_content_preview: str
     message: str
+    classification: Optional[str] = None
@@ -1,59 +1,428 @@
-from app.config import OPENROUTER_AVAILABLE, GEMINI_AVAILABLE
-from app.services.analysis_service import analyze_resume_impl, improve_text_impl
-from app.services.roadmap_service import generate_roadmap_impl, get_career_counseling_impl
-from app.services.gemini_service import analyze_with_gemini
+import asyncio
+import json
+from app.config import OPENROUTER_AVAILABLE, GEMINI_AVAILABLE, OPENROUTER_MODEL, GEMINI_MODEL
+from app.services.analysis_service import improve_text_impl, improve_text_impl_async, request_analysis, request_analysis_async
+from app.services.analysis_service import improve_texts_impl, improve_texts_impl_async
+from app.services.analysis_service import ANALYSIS_PROMPT_VERSION, create_fallback_response
+from app.services.roadmap_service import generate_roadmap_impl, get_career_counseling_impl, generate_roadmap_impl_async, get_career_counseling_impl_async
+from app.services.roadmap_service import stream_roadmap_impl_async, personalize_roadmap_impl, personalize_roadmap_impl_async, learner_summary
+from app.services.roadmap_templates import (
+    ROADMAP_PERSONALIZE, template_key, base_profile, is_usable_base,
+    get_template, get_template_async, store_template, store_template_async, record_personalization
+)
+from app.services.gemini_service import analyze_with_gemini, analyze_with_gemini_async
+from app.services.gemini_service import create_fallback_response as create_gemini_fallback_response
+from app.services.analysis_cache import (
+    make_cache_key, get_cached_analysis, get_cached_analysis_async,
+    lookup_shared_analysis, lookup_shared_analysis_async,
+    store_analysis, store_analysis_async
+)
+from app.services.hedging import hedged_call
+from app.services.circuit_breaker import rank_providers
+from app.services.deadline import DeadlineExceeded, deadline_scope, BUDGET_ANALYZE
+from app.services.roadmap_service import create_fallback_roadmap
+from app.services.counselor_service import get_precomputed_counseling, get_precomputed_counseling_async, record_llm_fallback
+from app.services.near_duplicate import (
+    reuse_near_duplicate, reuse_near_duplicate_async, link_analysis, link_analysis_async,
+    should_audit, record_audit
+)
+from app.services.singleflight import (
+    SingleFlight, AsyncSingleFlight, make_flight_key,
+    cross_worker_lock, cross_worker_lock_async
+)
+
+# Identical concurrent requests (double taps, mobile retries) share one upstream call
+_analysis_flights = SingleFlight()
+_analysis_flights_async = AsyncSingleFlight()
+_roadmap_flights = SingleFlight()
+_roadmap_flights_async = AsyncSingleFlight()
+# Background near-duplicate audits, referenced so they are not garbage collected
+_audit_tasks = set()
+
+CHAT_TIMEOUT_REPLY = "I'm taking longer than usual to respond. Please try again in a moment."
+
+PROVIDERS_CONFIGURED = {"openrouter": OPENROUTER_AVAILABLE, "gemini": GEMINI_AVAILABLE}
+PROVIDER_MODELS = {"openrouter": OPENROUTER_MODEL, "gemini": GEMINI_MODEL}
+
+def route_providers(preferred: list) -> list:
+    """
+    Configured providers from `preferred`, healthiest first; providers whose
+    circuit breaker is open are skipped so requests stop waiting on an outage.
+    """
+    return rank_providers([name for name in preferred if PROVIDERS_CONFIGURED[name]])
+
+def analysis_model() -> str:
+    """
+    Model expected to answer an analysis right now: the first routed
+    provider's. Lookups use it; results are stored under the model that
+    actually produced them, so a failover answer never poses as another model's.
+    """
+    routed = route_providers(["openrouter", "gemini"])
+    if routed:
+        return PROVIDER_MODELS[routed[0]]
+    return OPENROUTER_MODEL if OPENROUTER_AVAILABLE else GEMINI_MODEL
+
+def is_fallback_analysis(result: dict, resume_text: str) -> bool:
+    """
+    True when a provider impl swallowed an error and returned its canned answer.
+    Fallbacks are pure functions of the resume text, so equality is enough.
+    """
+    return result in (create_fallback_response(resume_text), create_gemini_fallback_response(resume_text))
 
 def analyze_resume(resume_text: str) -> dict:
     """
-    Main AI service - tries OpenRouter (DeepSeek) first, then Gemini as backup
+    Main AI service - serves repeat analyses from cache, otherwise
+    tries OpenRouter (DeepSeek) first, then Gemini as backup
+    """
+    model = analysis_model()
+    cache_key = make_cache_key(resume_text, ANALYSIS_PROMPT_VERSION, model)
+    cached = get_cached_analysis(cache_key)
+    if cached is not None:
+        return cached
+
+    def run():
+        with cross_worker_lock(cache_key) as locked:
+            if locked:
+                shared = lookup_shared_analysis(cache_key)
+                if shared is not None:
+                    return shared
+            reused = reuse_near_duplicate(resume_text, ANALYSIS_PROMPT_VERSION, model)
+            if reused is not None:
+                return reused
+            result, produced_by = analyze_resume_uncached(resume_text)
+            if produced_by and not is_fallback_analysis(result, resume_text):
+                produced_key = make_cache_key(resume_text, ANALYSIS_PROMPT_VERSION, produced_by)
+                store_analysis(produced_key, ANALYSIS_PROMPT_VERSION, produced_by, result)
+                link_analysis(resume_text, produced_key, ANALYSIS_PROMPT_VERSION, produced_by)
+            return result
+
+    try:
+        return _analysis_flights.do(cache_key, run)
+    except DeadlineExceeded:
+        print("Analysis ran out of request budget, using fallback")
+        return create_fallback_response(resume_text)
+
+async def analyze_resume_async(resume_text: str) -> dict:
+    """
+    Async variant of analyze_resume - same cache and provider order, no worker thread held
+    """
+    model = analysis_model()
+    cache_key = make_cache_key(resume_text, ANALYSIS_PROMPT_VERSION, model)
+    cached = await get_cached_analysis_async(cache_key)
+    if cached is not None:
+        return cached
+
+    async def run():
+        async with cross_worker_lock_async(cache_key) as locked:
+            if locked:
+                shared = await lookup_shared_analysis_async(cache_key)
+                if shared is not None:
+                    return shared
+            reused = await reuse_near_duplicate_async(resume_text, ANALYSIS_PROMPT_VERSION, model)
+            if reused is not None:
+                if should_audit():
+                    task = asyncio.create_task(audit_near_duplicate(resume_text, reused))
+                    _audit_tasks.add(task)
+                    task.add_done_callback(_audit_tasks.discard)
+                return reused
+            result, produced_by = await analyze_resume_uncached_async(resume_text)
+            if produced_by and not is_fallback_analysis(result, resume_text):
+                produced_key = make_cache_key(resume_text, ANALYSIS_PROMPT_VERSION, produced_by)
+                await store_analysis_async(produced_key, ANALYSIS_PROMPT_VERSION, produced_by, result)
+                await link_analysis_async(resume_text, produced_key, ANALYSIS_PROMPT_VERSION, produced_by)
+            return result
+
+    try:
+        return await _analysis_flights_async.do(cache_key, run)
+    except DeadlineExceeded:
+        print("Analysis ran out of request budget, using fallback")
+        return create_fallback_response(resume_text)
+
+async def audit_near_duplicate(resume_text: str, reused: dict):
+    """
+    Analyzes a resume that was served a near-duplicate's analysis from
+    scratch, records the skill drift between the two, and caches the fresh
+    result so later requests for this resume get it.
+    """
+    try:
+        # Runs after the request has been answered, so it gets its own budget
+        with deadline_scope(BUDGET_ANALYZE):
+            fresh, produced_by = await analyze_resume_uncached_async(resume_text)
+    except Exception as e:
+        print(f"Near-duplicate audit failed: {e}")
+        return
+    if not produced_by or is_fallback_analysis(fresh, resume_text):
+        return
+    record_audit(reused, fresh)
+    produced_key = make_cache_key(resume_text, ANALYSIS_PROMPT_VERSION, produced_by)
+    await store_analysis_async(produced_key, ANALYSIS_PROMPT_VERSION, produced_by, fresh)
+    await link_analysis_async(resume_text, produced_key, ANALYSIS_PROMPT_VERSION, produced_by)
+
+def analyze_resume_uncached(resume_text: str) -> tuple:
+    """
+    Tries providers healthiest first (OpenRouter preferred), then the local fallback.
+    Returns (analysis, model that produced it); the model is None for the fallback.
     """
+    if not any(PROVIDERS_CONFIGURED.values()):
+        raise Exception("AI Service Failure: no provider configured")
+
+    analyzers = {"openrouter": request_analysis, "gemini": analyze_with_gemini}
     errors = []
-    
-    if OPENROUTER_AVAILABLE: 
+    for name in route_providers(["openrouter", "gemini"]):
         try:
-            print("🚀 Analyzing with OpenRouter...")
-            return analyze_resume_impl(resume_text)
+            print(f"🚀 Analyzing with {name}...")
+            return analyzers[name](resume_text), PROVIDER_MODELS[name]
         except Exception as e:
-            errors.append(f"OpenRouter: {str(e)}")
-    
-    if GEMINI_AVAILABLE:
-        try:
-            print("🚀 Fallback to Gemini...")
-            return analyze_with_gemini(resume_text)
-        except Exception as e: 
-            errors.append(f"Gemini: {str(e)}")
-            
-    # If we get here, both failed or returned fallback inside impl
-    # But if impl returns fallback dict, we wouldn't raise exception.
-    # So this raise is only if the impls themselves crash hard without fallback.
-    raise Exception(f"AI Service Failure: {errors}")
+            errors.append(f"{name}: {str(e)}")
+
+    print(f"No provider produced an analysis, using fallback: {errors}")
+    return create_fallback_response(resume_text), None
+
+async def analyze_resume_uncached_async(resume_text: str) -> tuple:
+    """
+    Async variant of analyze_resume_uncached. Providers are hedged: if the
+    routed primary is slower than its usual latency percentile, the next
+    provider is raced against it and the first valid analysis wins.
+    Returns (analysis, model that produced it), like analyze_resume_uncached.
+    """
+    if not any(PROVIDERS_CONFIGURED.values()):
+        raise Exception("AI Service Failure: no provider configured")
+
+    analyzers = {"openrouter": request_analysis_async, "gemini": analyze_with_gemini_async}
+    candidates = [
+        (name, lambda analyze=analyzers[name]: analyze(resume_text))
+        for name in route_providers(["openrouter", "gemini"])
+    ]
+
+    try:
+        if not candidates:
+            raise Exception("every provider circuit is open")
+        name, result = await hedged_call(candidates)
+        return result, PROVIDER_MODELS[name]
+    except Exception as e:
+        print(f"No provider produced an analysis, using fallback: {e}")
+        return create_fallback_response(resume_text), None
 
 def improve_resume_text(text: str) -> str:
-    if OPENROUTER_AVAILABLE:
+    if route_providers(["openrouter"]):
         return improve_text_impl(text)
     return text
 
+async def improve_resume_text_async(text: str) -> str:
+    if route_providers(["openrouter"]):
+        return await improve_text_impl_async(text)
+    return text
+
+def improve_resume_texts(texts: list) -> list:
+    """
+    Rewrites many texts in as few LLM calls as possible. One entry per
+    input, in order; None where a text could not be rewritten.
+    """
+    if route_providers(["openrouter"]):
+        return improve_texts_impl(texts)
+    return [None] * len(texts)
+
+async def improve_resume_texts_async(texts: list) -> list:
+    if route_providers(["openrouter"]):
+        return await improve_texts_impl_async(texts)
+    return [None] * len(texts)
+
+def roadmap_flight_key(profile_data: dict, duration_weeks: int) -> str:
+    return make_flight_key("roadmap", duration_weeks, json.dumps(profile_data, sort_keys=True, default=str))
+
+def build_roadmap_template(key: str, profile_data: dict, duration_weeks: int):
+    """Generates and stores the shared base roadmap for `key`; None if generation failed"""
+    base = generate_roadmap_impl(base_profile(profile_data), duration_weeks)
+    if not is_usable_base(base, duration_weeks):
+        return None
+    store_template(key, profile_data, duration_weeks, base)
+    return base
+
+async def build_roadmap_template_async(key: str, profile_data: dict, duration_weeks: int):
+    base = await generate_roadmap_impl_async(base_profile(profile_data), duration_weeks)
+    if not is_usable_base(base, duration_weeks):
+        return None
+    await store_template_async(key, profile_data, duration_weeks, base)
+    return base
+
+def personalize_roadmap(base: dict, profile_data: dict) -> dict:
+    if ROADMAP_PERSONALIZE and learner_summary(profile_data):
+        record_personalization(True)
+        return personalize_roadmap_impl(base, profile_data)
+    record_personalization(False)
+    return base
+
+async def personalize_roadmap_async(base: dict, profile_data: dict) -> dict:
+    if ROADMAP_PERSONALIZE and learner_summary(profile_data):
+        record_personalization(True)
+        return await personalize_roadmap_impl_async(base, profile_data)
+    record_personalization(False)
+    return base
+
+def templated_roadmap(profile_data: dict, duration_weeks: int):
+    """
+    Roadmap built from the shared template for this goal, level and duration,
+    generating the template on a miss. None when the request has no
+    shareable goal or the template could not be built.
+    """
+    key = template_key(profile_data, duration_weeks)
+    if key is None:
+        return None
+    base = get_template(key)
+    if base is None:
+        # Concurrent misses for one template share a single generation
+        base = _roadmap_flights.do(
+            make_flight_key("roadmap-template", key),
+            lambda: build_roadmap_template(key, profile_data, duration_weeks)
+        )
+        if base is None:
+            return None
+    return personalize_roadmap(base, profile_data)
+
+async def templated_roadmap_async(profile_data: dict, duration_weeks: int):
+    key = template_key(profile_data, duration_weeks)
+    if key is None:
+        return None
+    base = await get_template_async(key)
+    if base is None:
+        base = await _roadmap_flights_async.do(
+            make_flight_key("roadmap-template", key),
+            lambda: build_roadmap_template_async(key, profile_data, duration_weeks)
+        )
+        if base is None:
+            return None
+    return await personalize_roadmap_async(base, profile_data)
+
 def generate_learning_roadmap(profile_data: dict, duration_weeks: int = 8) -> dict:
     if OPENROUTER_AVAILABLE:
-        return generate_roadmap_impl(profile_data, duration_weeks)
+        try:
+            roadmap = templated_roadmap(profile_data, duration_weeks)
+            if roadmap is not None:
+                return roadmap
+            return _roadmap_flights.do(
+                roadmap_flight_key(profile_data, duration_weeks),
+                lambda: generate_roadmap_impl(profile_data, duration_weeks)
+            )
+        except DeadlineExceeded:
+            return create_fallback_roadmap()
     return {"message": "AI service unavailable"}
 
+async def generate_learning_roadmap_async(profile_data: dict, duration_weeks: int = 8) -> dict:
+    if OPENROUTER_AVAILABLE:
+        try:
+            roadmap = await templated_roadmap_async(profile_data, duration_weeks)
+            if roadmap is not None:
+                return roadmap
+            return await _roadmap_flights_async.do(
+                roadmap_flight_key(profile_data, duration_weeks),
+                lambda: generate_roadmap_impl_async(profile_data, duration_weeks)
+            )
+        except DeadlineExceeded:
+            return create_fallback_roadmap()
+    return {"message": "AI service unavailable"}
+
+async def stream_learning_roadmap(profile_data: dict, duration_weeks: int = 8):
+    """
+    Streams the roadmap week by week: yields ("week", week) events, then ("done", roadmap).
+    """
+    if not OPENROUTER_AVAILABLE:
+        yield "done", {"message": "AI service unavailable"}
+        return
+
+    # A stored template is sent at once; a miss streams a fresh generation instead of waiting on one
+    key = template_key(profile_data, duration_weeks)
+    base = await get_template_async(key) if key is not None else None
+    if base is not None:
+        try:
+            roadmap = await personalize_roadmap_async(base, profile_data)
+        except DeadlineExceeded:
+            roadmap = base
+        for week in roadmap.get("weeks", []):
+            yield "week", week
+        yield "done", roadmap
+        return
+
+    stream = stream_roadmap_impl_async(profile_data, duration_weeks)
+    try:
+        async for event in stream:
+            yield event
+    finally:
+        await stream.aclose()
+
 def chat_with_mentor(message: str, history: list, user_context: dict) -> str:
     """
     Chat with the AI Mentor.
     """
-    if GEMINI_AVAILABLE:
+    if route_providers(["gemini"]):
         from app.services.gemini_service import chat_with_gemini
-        return chat_with_gemini(message, history, user_context)
-    
+        try:
+            return chat_with_gemini(message, history, user_context)
+        except DeadlineExceeded:
+            return CHAT_TIMEOUT_REPLY
+
     # Fallback/Primary to OpenRouter if Gemini not preferred (but here we prefer Gemini for chat due to context window)
     if OPENROUTER_AVAILABLE:
          # TODO: Implement OpenRouter Chat if needed
          return "I'm sorry, I can only chat via Gemini right now."
-         
+
     return "AI Service Unavailable"
 
+async def chat_with_mentor_async(message: str, history: list, user_context: dict) -> str:
+    """
+    Async variant of chat_with_mentor.
+    """
+    if route_providers(["gemini"]):
+        from app.services.gemini_service import chat_with_gemini_async
+        try:
+            return await chat_with_gemini_async(message, history, user_context)
+        except DeadlineExceeded:
+            return CHAT_TIMEOUT_REPLY
+
+    if OPENROUTER_AVAILABLE:
+         return "I'm sorry, I can only chat via Gemini right now."
+
+    return "AI Service Unavailable"
+
+async def stream_chat_with_mentor(message: str, history: list, user_context: dict):
+    """
+    Streams the mentor reply chunk by chunk from the healthiest provider (Gemini preferred).
+    """
+    providers = route_providers(["gemini", "openrouter"])
+    if not providers:
+        yield "AI Service Unavailable"
+        return
+
+    if providers[0] == "gemini":
+        from app.services.gemini_service import stream_chat_with_gemini_async
+        stream = stream_chat_with_gemini_async(message, history, user_context)
+    else:
+        from app.services.openrouter_service import stream_chat_with_openrouter_async
+        stream = stream_chat_with_openrouter_async(message, history, user_context)
+
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
+
 def get_career_counseling(answers: dict) -> dict:
+    """
+    Known A/B answer sets are served from the precomputed table; only
+    free-form answers go to the LLM
+    """
+    precomputed = get_precomputed_counseling(answers)
+    if precomputed is not None:
+        return precomputed
     if OPENROUTER_AVAILABLE:
+        record_llm_fallback()
         return get_career_counseling_impl(answers)
-    return {"message": "AI service unavailable"}
\ No newline at end of file
+    return {"message": "AI service unavailable"}
+
+async def get_career_counseling_async(answers: dict) -> dict:
+    precomputed = await get_precomputed_counseling_async(answers)
+    if precomputed is not None:
+        return precomputed
+    if OPENROUTER_AVAILABLE:
+        record_llm_fallback()
+        return await get_career_counseling_impl_async(answers)
+    return {"message": "AI service unavailable"}
@@ -0,0 +1,227 @@
+"""
+Content-addressed cache for resume analysis results.
+
+Tier 1 is an in-process LRU with TTL; tier 2 is the shared `analysis_cache`
+table, which survives restarts and is visible to every gunicorn worker.
+Entries are keyed by a hash of the normalized resume text, the analysis
+prompt version and the model name, so a prompt or model change never serves
+stale results.
+"""
+import os
+import re
+import copy
+import time
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from app.database import SessionLocal
+from app.models.cache import AnalysisCacheEntry
+
+load_dotenv()
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "3600"))
+ANALYSIS_CACHE_DB_TTL_DAYS = int(os.getenv("ANALYSIS_CACHE_DB_TTL_DAYS", "30"))
+ANALYSIS_CACHE_DB_ENABLED = os.getenv("ANALYSIS_CACHE_DB_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory_cache = TTLCache(ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL_SECONDS)
+_stats_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def normalize_resume_text(resume_text: str) -> str:
+    """Unicode-normalizes and collapses whitespace so cosmetic re-extractions hash the same"""
+    text = unicodedata.normalize("NFKC", resume_text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(resume_text: str, prompt_version: str, model: str) -> str:
+    payload = "\x00".join([prompt_version, model, normalize_resume_text(resume_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _load_from_db(cache_key: str):
+    db = SessionLocal()
+    try:
+        entry = db.query(AnalysisCacheEntry).filter(AnalysisCacheEntry.cache_key == cache_key).first()
+        if entry is None:
+            return None
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ANALYSIS_CACHE_DB_TTL_DAYS)
+        if entry.created_at is not None and entry.created_at < cutoff:
+            return None
+        return entry.result
+    except Exception as e:
+        _count("db_errors")
+        print(f"Analysis cache read failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _save_to_db(cache_key: str, prompt_version: str, model: str, result: dict):
+    db = SessionLocal()
+    try:
+        db.merge(AnalysisCacheEntry(
+            cache_key=cache_key,
+            prompt_version=prompt_version,
+            model=model,
+            result=result,
+            created_at=datetime.now(timezone.utc)
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        _count("db_errors")
+        # Fail silent: the cache must never break an analysis
+        print(f"Analysis cache write failed: {e}")
+    finally:
+        db.close()
+
+
+def get_cached_analysis(cache_key: str):
+    """
+    Returns the cached analysis for a key, checking memory then the database.
+    """
+    result = _memory_cache.get(cache_key)
+    if result is not None:
+        _count("memory_hits")
+        return copy.deepcopy(result)
+
+    if ANALYSIS_CACHE_DB_ENABLED:
+        result = _load_from_db(cache_key)
+        if result is not None:
+            _count("db_hits")
+            _memory_cache.set(cache_key, copy.deepcopy(result))
+            return result
+
+    _count("misses")
+    return None
+
+
+async def get_cached_analysis_async(cache_key: str):
+    """
+    Async variant: the memory tier is checked inline, the DB tier off the event loop.
+    """
+    result = _memory_cache.get(cache_key)
+    if result is not None:
+        _count("memory_hits")
+        return copy.deepcopy(result)
+
+    if ANALYSIS_CACHE_DB_ENABLED:
+        result = await asyncio.to_thread(_load_from_db, cache_key)
+        if result is not None:
+            _count("db_hits")
+            _memory_cache.set(cache_key, copy.deepcopy(result))
+            return result
+
+    _count("misses")
+    return None
+
+
+def lookup_shared_analysis(cache_key: str):
+    """
+    Checks only the DB tier. Used after waiting on a cross-worker lock, when
+    another worker may have just stored the result; a miss here is not counted.
+    """
+    if not ANALYSIS_CACHE_DB_ENABLED:
+        return None
+    result = _load_from_db(cache_key)
+    if result is not None:
+        _count("db_hits")
+        _memory_cache.set(cache_key, copy.deepcopy(result))
+    return result
+
+
+async def lookup_shared_analysis_async(cache_key: str):
+    if not ANALYSIS_CACHE_DB_ENABLED:
+        return None
+    result = await asyncio.to_thread(_load_from_db, cache_key)
+    if result is not None:
+        _count("db_hits")
+        _memory_cache.set(cache_key, copy.deepcopy(result))
+    return result
+
+
+def peek_analysis(cache_key: str):
+    """
+    Reads an entry from either tier without touching hit/miss counters.
+    Used to fetch the source analysis for a near-duplicate resume.
+    """
+    result = _memory_cache.get(cache_key)
+    if result is not None:
+        return copy.deepcopy(result)
+    if ANALYSIS_CACHE_DB_ENABLED:
+        return _load_from_db(cache_key)
+    return None
+
+
+def store_analysis(cache_key: str, prompt_version: str, model: str, result: dict):
+    _memory_cache.set(cache_key, copy.deepcopy(result))
+    _count("stores")
+    if ANALYSIS_CACHE_DB_ENABLED:
+        _save_to_db(cache_key, prompt_version, model, result)
+
+
+async def store_analysis_async(cache_key: str, prompt_version: str, model: str, result: dict):
+    _memory_cache.set(cache_key, copy.deepcopy(result))
+    _count("stores")
+    if ANALYSIS_CACHE_DB_ENABLED:
+        await asyncio.to_thread(_save_to_db, cache_key, prompt_version, model, result)
+
+
+def analysis_cache_stats() -> dict:
+    """Hit/miss counters for /health"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+    stats["memory_entries"] = len(_memory_cache)
+    return stats
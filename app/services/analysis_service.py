@@ -1,106 +1,119 @@
-from openai import OpenAI
+import os
 import json
-import re
-from app.config import OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_BASE_URL
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.services.llm_gateway import openrouter_chat, openrouter_chat_async
+from app.services.structured_output import parse_structured, parse_structured_partial, response_format
+from app.services.prompt_budget import compact_resume, count_tokens
+from app.services.prompt_registry import get_prompt, prompt_version
+from app.schemas.ai_output import ANALYSIS_OUTPUT, IMPROVE_BATCH_OUTPUT
+from app.utils.skill_extractor import extract_skills, merge_skills
+
+load_dotenv()
+
+ANALYSIS_PROMPT = get_prompt("analysis")
+# Changes with the template text, so cached analyses from an older prompt are not reused
+ANALYSIS_PROMPT_VERSION = prompt_version("analysis")
 
 def analyze_resume_impl(resume_text: str) -> dict:
     """
     Analyzes resume using DeepSeek via OpenRouter
     """
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
-        )
-        
-        prompt = create_analysis_prompt(resume_text)
-        
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional career counselor. Always respond with valid JSON only."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=2500
-        )
-        
-        if not response.choices or not response.choices[0].message.content:
-             print("OpenRouter returned empty response")
-             return create_fallback_response(resume_text)
+        return request_analysis(resume_text)
+    except Exception as e:
+        print(f"OpenRouter Analysis Error: {str(e)}")
+        return create_fallback_response(resume_text)
 
-        raw_content = response.choices[0].message.content
-        return parse_ai_response(raw_content, resume_text)
-        
+async def analyze_resume_impl_async(resume_text: str) -> dict:
+    """
+    Async variant of analyze_resume_impl
+    """
+    try:
+        return await request_analysis_async(resume_text)
     except Exception as e:
         print(f"OpenRouter Analysis Error: {str(e)}")
         return create_fallback_response(resume_text)
 
-def create_analysis_prompt(resume_text: str) -> str:
-    return f"""You are an expert career counselor. Analyze this resume/profile text and provide detailed career guidance that is STRICTLY based on the user's provided skills and interests.
-
-RESUME/PROFILE TEXT: 
-{resume_text}
-
-YOUR TASK:
-1. Extract ALL skills (technical, vocational, soft, or domain-specific) mentioned.
-2. Determine experience level (Beginner/Intermediate/Advanced) based on the context of their specific field.
-3. RATE the profile (0-100) based on clarity and evidence of expertise in their chosen area.
-4. Identify KEY MISSING skills that the user needs to progress or excel in their specific field of interest.
-5. Recommend 2-3 career paths that ACCURATELY reflect the user's field. 
-   - DO NOT map unrelated careers (e.g., if they are a chef, don't suggest web development).
-   - If they are in a non-technical field (e.g., chef, craftsmen, artist), suggest careers strictly within that domain.
-6. Create a BRIEF summary of next steps tailored to their specific industry.
-
-OUTPUT FORMAT (strict JSON):
-{{
-  "skills": ["skill1", "skill2", "skill3"],
-  "score": 85,
-  "missing_skills": ["Specific Field Skill 1", "Specific Field Skill 2"],
-  "experience_level": "Beginner/Intermediate/Advanced",
-  "top_careers": [
-    {{"title": "Role matching their skills", "match_percent": 85}},
-    {{"title": "Specialized role in their field", "match_percent": 75}}
-  ],
-  "roadmap": "Focus on mastering [Specific Skill] and gaining experience in [Specific Area]. Consider [Industry-specific recommendation]."
-}}
-
-IMPORTANT: Return ONLY valid JSON. Be field-agnostic and honor the user's unique background."""
+def request_analysis(resume_text: str) -> dict:
+    """
+    Strict OpenRouter analysis: raises on any failure instead of returning the
+    canned fallback, so callers can try another provider.
+    """
+    detected = extract_skills(resume_text)
+    raw_content = openrouter_chat(
+        messages=create_analysis_messages(resume_text, detected),
+        temperature=0.7,
+        max_tokens=2500,
+        response_format=response_format(ANALYSIS_OUTPUT, "resume_analysis")
+    )
+    data = parse_analysis_content(raw_content)
+    data["skills"] = merge_skills(detected, data["skills"])
+    return data
+
+async def request_analysis_async(resume_text: str) -> dict:
+    """
+    Async variant of request_analysis
+    """
+    detected = extract_skills(resume_text)
+    raw_content = await openrouter_chat_async(
+        messages=create_analysis_messages(resume_text, detected),
+        temperature=0.7,
+        max_tokens=2500,
+        response_format=response_format(ANALYSIS_OUTPUT, "resume_analysis")
+    )
+    data = parse_analysis_content(raw_content)
+    data["skills"] = merge_skills(detected, data["skills"])
+    return data
+
+def create_analysis_messages(resume_text: str, detected_skills: list = None) -> list:
+    return ANALYSIS_PROMPT.messages(**analysis_prompt_values(resume_text, detected_skills))
+
+def detected_skills_section(detected_skills: list) -> str:
+    """
+    Prompt block listing skills the local extractor already found, so the
+    model only has to report the ones it missed.
+    """
+    if not detected_skills:
+        return ""
+    return f"""
+ALREADY DETECTED SKILLS (added to the result automatically):
+{", ".join(detected_skills)}
+"""
+
+def analysis_prompt_values(resume_text: str, detected_skills: list = None) -> dict:
+    return {
+        "resume_text": compact_resume(resume_text, "analysis"),
+        "detected_skills": detected_skills_section(detected_skills)
+    }
+
+def create_analysis_prompt(resume_text: str, detected_skills: list = None) -> str:
+    return ANALYSIS_PROMPT.text(**analysis_prompt_values(resume_text, detected_skills))
+
+def parse_analysis_content(raw_content: str) -> dict:
+    """
+    Parses a provider reply into an analysis dict, repairing fences, trailing
+    commas and truncation. Raises ValueError when the reply is empty, not
+    JSON, or lacks the fields the app needs.
+    """
+    return parse_structured(raw_content, ANALYSIS_OUTPUT, "analysis")
 
 def parse_ai_response(raw_content: str, resume_text: str) -> dict:
     try:
-        cleaned = re.sub(r'```json\n?|\n?```', '', raw_content).strip()
-        data = json.loads(cleaned)
-        
-        required = ["skills", "experience_level", "top_careers"]
-        for field in required:
-            if field not in data:
-                # If partial data, try to salvage
-                print(f"Missing field {field} in response")
-        
-        return data
-        
-    except json.JSONDecodeError: 
-        print("JSON parse failed, using fallback")
+        return parse_analysis_content(raw_content)
+    except ValueError as e:
+        print(f"Invalid analysis response ({e}), using fallback")
         return create_fallback_response(resume_text)
 
 def create_fallback_response(resume_text: str) -> dict:
-    common_skills = [
-        "Python", "JavaScript", "Java", "React", "Node.js", "SQL",
-        "Machine Learning", "Data Analysis", "Communication", "Leadership"
-    ]
-    found_skills = [s for s in common_skills if s.lower() in resume_text.lower()]
+    found_skills = extract_skills(resume_text, limit=15)
     if not found_skills:
         found_skills = ["Communication", "Problem Solving", "Teamwork"]
     
     return {
-        "skills": found_skills[:8],
+        "skills": found_skills,
         "score": 70,
         "missing_skills": ["Cloud Basics", "System Design"],
         "experience_level": "Intermediate",
@@ -113,17 +126,147 @@ def create_fallback_response(resume_text: str) -> dict:
 
 def improve_text_impl(original_text: str) -> str:
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
+        prompt = f"""Rewrite to be professional and actionable: "{original_text}" """
+        
+        improved = openrouter_chat(
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=500
         )
+        return improved.strip()
+    except Exception:
+        return original_text
+
+async def improve_text_impl_async(original_text: str) -> str:
+    try:
         prompt = f"""Rewrite to be professional and actionable: "{original_text}" """
         
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
+        improved = await openrouter_chat_async(
             messages=[{"role": "user", "content": prompt}],
             max_tokens=500
         )
-        return response.choices[0].message.content.strip()
+        return improved.strip()
     except Exception:
         return original_text
+
+# Batch rewrites: texts are packed into as few calls as these limits allow, and the packs run concurrently
+IMPROVE_BATCH_MAX_TEXTS = int(os.getenv("IMPROVE_BATCH_MAX_TEXTS", "100"))
+IMPROVE_BATCH_PACK_TOKENS = int(os.getenv("IMPROVE_BATCH_PACK_TOKENS", "1500"))
+IMPROVE_BATCH_PACK_ITEMS = int(os.getenv("IMPROVE_BATCH_PACK_ITEMS", "20"))
+IMPROVE_BATCH_CONCURRENCY = int(os.getenv("IMPROVE_BATCH_CONCURRENCY", "4"))
+# Texts shorter than this are returned as they are, like /ai/improve-text rejects them
+MIN_IMPROVE_CHARS = 3
+# JSON framing per item, and room for a rewrite to run longer than its original
+IMPROVE_ITEM_OVERHEAD_TOKENS = 20
+IMPROVE_OUTPUT_RATIO = 2
+IMPROVE_MAX_TOKENS = 4000
+
+def pack_texts(texts: list) -> list:
+    """Splits texts into packs (lists of indexes into `texts`) within the per-call limits"""
+    packs = []
+    current = []
+    used = 0
+    for index, text in enumerate(texts):
+        cost = count_tokens(text) + IMPROVE_ITEM_OVERHEAD_TOKENS
+        if current and (used + cost > IMPROVE_BATCH_PACK_TOKENS or len(current) >= IMPROVE_BATCH_PACK_ITEMS):
+            packs.append(current)
+            current = []
+            used = 0
+        current.append(index)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+def pack_max_tokens(texts: list, pack: list) -> int:
+    needed = sum(count_tokens(texts[i]) * IMPROVE_OUTPUT_RATIO + IMPROVE_ITEM_OVERHEAD_TOKENS for i in pack)
+    return min(IMPROVE_MAX_TOKENS, needed + 50)
+
+def create_improve_batch_messages(texts: list, pack: list) -> list:
+    # Ids are 1-based within the pack; the reply is matched back by id, not by position
+    items = [{"id": number, "text": texts[i]} for number, i in enumerate(pack, 1)]
+    return get_prompt("improve_batch").messages(items=json.dumps(items, ensure_ascii=False))
+
+def parse_improve_batch(raw_content, pack: list) -> dict:
+    """
+    {index into texts: rewritten text} for the items the reply covers.
+    A failed call (raw_content=None), unknown ids and the last item of a
+    truncated reply are left out.
+    """
+    if not raw_content:
+        return {}
+    try:
+        data, truncated = parse_structured_partial(raw_content, IMPROVE_BATCH_OUTPUT, "improve_batch")
+    except ValueError:
+        return {}
+    # A cut-off reply may end mid-rewrite; a merely repaired one (e.g. a trailing comma) is complete
+    items = data["items"][:-1] if truncated else data["items"]
+    return {
+        pack[item["id"] - 1]: item["text"].strip()
+        for item in items
+        if 1 <= item["id"] <= len(pack)
+    }
+
+def _improvable(texts: list) -> list:
+    """Distinct texts worth a rewrite, in first-seen order"""
+    return list(dict.fromkeys(t for t in texts if isinstance(t, str) and len(t.strip()) >= MIN_IMPROVE_CHARS))
+
+def _in_input_order(texts: list, unique: list, improved: dict) -> list:
+    by_text = {unique[i]: rewritten for i, rewritten in improved.items()}
+    return [by_text.get(text) for text in texts]
+
+def improve_texts_impl(texts: list) -> list:
+    """
+    Rewrites many texts in packed calls run on worker threads. Returns one
+    entry per input, in order: the rewrite, or None where it failed.
+    """
+    unique = _improvable(texts)
+    packs = pack_texts(unique)
+    if not packs:
+        return [None] * len(texts)
+
+    def improve_pack(pack: list):
+        try:
+            return openrouter_chat(
+                messages=create_improve_batch_messages(unique, pack),
+                temperature=0.7,
+                max_tokens=pack_max_tokens(unique, pack),
+                response_format=response_format(IMPROVE_BATCH_OUTPUT, "improved_texts")
+            )
+        except Exception as e:
+            print(f"Improve batch error ({len(pack)} texts): {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(IMPROVE_BATCH_CONCURRENCY, len(packs))) as pool:
+        # Each pack runs in a copy of this context so the request deadline applies
+        futures = [pool.submit(contextvars.copy_context().run, improve_pack, pack) for pack in packs]
+        improved = {}
+        for pack, future in zip(packs, futures):
+            improved.update(parse_improve_batch(future.result(), pack))
+    return _in_input_order(texts, unique, improved)
+
+async def improve_texts_impl_async(texts: list) -> list:
+    """
+    Async variant of improve_texts_impl
+    """
+    unique = _improvable(texts)
+    packs = pack_texts(unique)
+    slots = asyncio.Semaphore(IMPROVE_BATCH_CONCURRENCY)
+
+    async def improve_pack(pack: list):
+        try:
+            async with slots:
+                return await openrouter_chat_async(
+                    messages=create_improve_batch_messages(unique, pack),
+                    temperature=0.7,
+                    max_tokens=pack_max_tokens(unique, pack),
+                    response_format=response_format(IMPROVE_BATCH_OUTPUT, "improved_texts")
+                )
+        except Exception as e:
+            print(f"Improve batch error ({len(pack)} texts): {str(e)}")
+            return None
+
+    raw_packs = await asyncio.gather(*(improve_pack(pack) for pack in packs))
+    improved = {}
+    for pack, raw in zip(packs, raw_packs):
+        improved.update(parse_improve_batch(raw, pack))
+    return _in_input_order(texts, unique, improved)
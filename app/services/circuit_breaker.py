@@ -0,0 +1,181 @@
+"""
+Per-provider circuit breakers and health-weighted provider routing.
+
+Every provider call made through the LLM gateway is recorded in a rolling
+time window. When the error rate or the slow-call rate in that window
+crosses its threshold the breaker opens and calls fail fast with
+CircuitOpenError. After a cooldown it half-opens and lets a few probe calls
+through: a success closes it, a failure re-opens it.
+"""
+import os
+import time
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "25"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("LLM_BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Latency at which a provider's health score halves
+ROUTER_LATENCY_REF = float(os.getenv("LLM_ROUTER_LATENCY_REF", "10"))
+# Score bonus for the configured primary, so routing only flips on a clear difference
+ROUTER_PREFERENCE_MARGIN = float(os.getenv("LLM_ROUTER_PREFERENCE_MARGIN", "0.2"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = deque()  # (timestamp, ok, latency)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._times_opened = 0
+
+    def _prune(self, now: float):
+        cutoff = now - BREAKER_WINDOW_SECONDS
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= BREAKER_OPEN_SECONDS:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._times_opened += 1
+        print(f"Circuit breaker OPEN for {self.name}")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def is_available(self) -> bool:
+        """Non-consuming check used for routing"""
+        return self.state != OPEN
+
+    def before_call(self):
+        """
+        Claims permission for one call. Raises CircuitOpenError when open, or
+        when half-open and all probe slots are taken.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == OPEN:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            if state == HALF_OPEN:
+                if self._probes_in_flight >= BREAKER_HALF_OPEN_PROBES:
+                    raise CircuitOpenError(f"{self.name} circuit is half-open, probe in flight")
+                self._probes_in_flight += 1
+
+    def record(self, ok: bool, latency: float):
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if ok:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    print(f"Circuit breaker CLOSED for {self.name}")
+                else:
+                    self._open(now)
+                    return
+
+            self._calls.append((now, ok, latency))
+            self._prune(now)
+            if self._state == CLOSED and len(self._calls) >= BREAKER_MIN_CALLS:
+                errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+                slow = sum(1 for _, _, call_latency in self._calls if call_latency >= BREAKER_SLOW_CALL_SECONDS)
+                if errors / len(self._calls) >= BREAKER_ERROR_RATE or slow / len(self._calls) >= BREAKER_SLOW_CALL_RATE:
+                    self._open(now)
+
+    def record_cancelled(self):
+        """A call abandoned by its caller (e.g. a hedge loser) says nothing about health"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def health_score(self) -> float:
+        """
+        0 (unusable) to 1 (healthy): success rate scaled down by median latency.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._current_state(now) == OPEN:
+                return 0.0
+            self._prune(now)
+            calls = list(self._calls)
+        if not calls:
+            return 1.0
+        success_rate = sum(1 for _, ok, _ in calls if ok) / len(calls)
+        latencies = sorted(latency for _, ok, latency in calls if ok)
+        if not latencies:
+            return 0.0
+        median = latencies[len(latencies) // 2]
+        return success_rate * ROUTER_LATENCY_REF / (ROUTER_LATENCY_REF + median)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._prune(now)
+            calls = list(self._calls)
+            times_opened = self._times_opened
+        errors = sum(1 for _, ok, _ in calls if not ok)
+        return {
+            "state": state,
+            "calls_in_window": len(calls),
+            "error_rate": round(errors / len(calls), 3) if calls else 0.0,
+            "health_score": round(self.health_score(), 3),
+            "times_opened": times_opened
+        }
+
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def rank_providers(preferred: list) -> list:
+    """
+    Orders provider names (given in configured preference order) by health,
+    dropping those whose breaker is open. The first entry gets a score bonus
+    so traffic only moves away from it when another provider is clearly healthier.
+    """
+    available = [name for name in preferred if get_breaker(name).is_available()]
+    if len(available) < 2:
+        return available
+    bonus = {available[0]: ROUTER_PREFERENCE_MARGIN}
+    return sorted(available, key=lambda name: -(get_breaker(name).health_score() + bonus.get(name, 0.0)))
+
+
+def breaker_states() -> dict:
+    """Breaker state per provider for /health"""
+    return {name: breaker.snapshot() for name, breaker in list(_breakers.items())}
@@ -0,0 +1,278 @@
+"""
+Precomputed career-counselor outcomes.
+
+The counselor quiz is three A/B scenarios, so there are only 2^3 possible
+answer sets. One result per combination lives in the `counselor_outcomes`
+table. It is generated offline by `python -m app.services.counselor_service
+refresh` and held in memory, so a request is a dict lookup. Built-in
+defaults cover any combination the table does not have yet. The LLM is only
+called for free-form answers outside the known set.
+"""
+import os
+import re
+import sys
+import copy
+import time
+import asyncio
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from app.database import SessionLocal
+from app.models.counselor import CounselorOutcome
+from app.services.prompt_registry import prompt_version
+
+load_dotenv()
+
+# Stored outcomes from an older counseling prompt are ignored
+COUNSELOR_PROMPT_VERSION = prompt_version("counseling")
+# How often each process re-reads the table to pick up an offline refresh
+COUNSELOR_TABLE_TTL_SECONDS = float(os.getenv("COUNSELOR_TABLE_TTL_SECONDS", "300"))
+
+QUESTIONS = ("q1", "q2", "q3")
+RESULT_FIELDS = ("archetype", "suggested_role", "reasoning", "recommended_path")
+
+# What each choice means, used for the offline generation prompt
+SCENARIOS = {
+    "q1": ("THE BLANK PAGE TEST (Visual vs Logical)", {"A": "Draw Design / Visible", "B": "Write Logic / Invisible"}),
+    "q2": ("THE JELLYBEAN TEST (Intuitive vs Analytical)", {"A": "Gut / Product", "B": "Count / Data"}),
+    "q3": ("THE BROKEN THING TEST (Grit / Depth)", {"A": "Restart / Surface", "B": "Google Error / Deep Dive"}),
+}
+
+DEFAULT_OUTCOMES = {
+    "AAA": {
+        "archetype": "The Creative Explorer",
+        "suggested_role": "UI/UX Designer",
+        "reasoning": "You start from visuals, trust your instincts and prefer a fresh attempt over a long debug session. Fast, user-facing iteration suits you.",
+        "recommended_path": "Learn Figma, design systems and user research, then add HTML/CSS to prototype your ideas."
+    },
+    "AAB": {
+        "archetype": "The Creative Builder",
+        "suggested_role": "Frontend Developer",
+        "reasoning": "You design first and trust your gut, but you dig into problems until they are solved. You like seeing things come to life and making them work properly.",
+        "recommended_path": "Focus on JavaScript, React, accessibility and CSS animations, with browser debugging tools."
+    },
+    "ABA": {
+        "archetype": "The Visual Analyst",
+        "suggested_role": "Data Visualization Specialist",
+        "reasoning": "You think visually but want numbers behind decisions, and you prefer quick iteration. Turning data into clear pictures plays to both strengths.",
+        "recommended_path": "Learn SQL, Python with pandas, and dashboard tools such as Tableau or Power BI, plus visualization design principles."
+    },
+    "ABB": {
+        "archetype": "The Product Engineer",
+        "suggested_role": "Full-Stack Developer",
+        "reasoning": "You care about what users see, measure before deciding and chase problems to the root. That mix fits owning features end to end.",
+        "recommended_path": "Build projects with React and a backend framework (FastAPI or Node.js), databases, and product analytics."
+    },
+    "BAA": {
+        "archetype": "The Intuitive Strategist",
+        "suggested_role": "Product Manager",
+        "reasoning": "You reason about logic and systems but decide from intuition, and you move on quickly instead of getting stuck. You can steer what gets built.",
+        "recommended_path": "Study product management fundamentals, user stories, roadmapping, and enough programming to talk with engineers."
+    },
+    "BAB": {
+        "archetype": "The Logical Builder",
+        "suggested_role": "Backend Developer",
+        "reasoning": "You start from invisible logic, trust your judgement and dig deep when things break. Server-side systems reward exactly that persistence.",
+        "recommended_path": "Learn a backend language (Python, Java or Go), APIs, databases, and testing and debugging practices."
+    },
+    "BBA": {
+        "archetype": "The Systems Optimizer",
+        "suggested_role": "DevOps / Cloud Engineer",
+        "reasoning": "You think in logic and data and prefer restarting and automating over hand-fixing. Reliable, repeatable infrastructure is a natural fit.",
+        "recommended_path": "Learn Linux, scripting, Docker, CI/CD pipelines and a cloud provider such as AWS."
+    },
+    "BBB": {
+        "archetype": "The Analyst",
+        "suggested_role": "Data Scientist",
+        "reasoning": "You prefer logic over visuals, count before you judge and dig into every error. Rigorous, evidence-driven work is your strength.",
+        "recommended_path": "Build foundations in statistics, Python, SQL and machine learning, then practice on real datasets."
+    },
+}
+
+_CHOICE_PATTERN = re.compile(r"^\s*(?:option\s+)?([ab])\s*(?:[).:\-]|$)", re.IGNORECASE)
+
+_table = {}
+_table_loaded_at = None
+_table_lock = threading.Lock()
+_stats = {"precomputed_hits": 0, "llm_fallbacks": 0, "table_errors": 0}
+
+
+def answer_combo(answers: dict) -> Optional[str]:
+    """
+    Maps answers to a combination key like "ABA", or None when any answer is
+    free-form, missing, or extra keys were sent.
+    """
+    if not isinstance(answers, dict) or set(answers) != set(QUESTIONS):
+        return None
+    combo = ""
+    for question in QUESTIONS:
+        match = _CHOICE_PATTERN.match(str(answers[question]))
+        if not match:
+            return None
+        combo += match.group(1).upper()
+    return combo
+
+
+def all_combos() -> list:
+    return [a + b + c for a in "AB" for b in "AB" for c in "AB"]
+
+
+def is_valid_outcome(result) -> bool:
+    return isinstance(result, dict) and all(
+        isinstance(result.get(field), str) and result[field].strip() for field in RESULT_FIELDS
+    )
+
+
+def _load_table() -> dict:
+    db = SessionLocal()
+    try:
+        rows = db.query(CounselorOutcome).filter(CounselorOutcome.prompt_version == COUNSELOR_PROMPT_VERSION).all()
+        return {row.combo: row.result for row in rows if is_valid_outcome(row.result)}
+    finally:
+        db.close()
+
+
+def _table_stale() -> bool:
+    return _table_loaded_at is None or time.monotonic() - _table_loaded_at > COUNSELOR_TABLE_TTL_SECONDS
+
+
+def _reload_table():
+    global _table, _table_loaded_at
+    try:
+        table = _load_table()
+    except Exception as e:
+        _stats["table_errors"] += 1
+        print(f"Counselor table unavailable, using built-in outcomes: {e}")
+        table = _table
+    with _table_lock:
+        _table = table
+        _table_loaded_at = time.monotonic()
+
+
+def _lookup(combo: str) -> dict:
+    _stats["precomputed_hits"] += 1
+    return copy.deepcopy(_table.get(combo) or DEFAULT_OUTCOMES[combo])
+
+
+def get_precomputed_counseling(answers: dict) -> Optional[dict]:
+    """
+    Stored outcome for a known answer combination, or None for free-form answers.
+    """
+    combo = answer_combo(answers)
+    if combo is None:
+        return None
+    if _table_stale():
+        _reload_table()
+    return _lookup(combo)
+
+
+async def get_precomputed_counseling_async(answers: dict) -> Optional[dict]:
+    combo = answer_combo(answers)
+    if combo is None:
+        return None
+    if _table_stale():
+        await asyncio.to_thread(_reload_table)
+    return _lookup(combo)
+
+
+def record_llm_fallback():
+    _stats["llm_fallbacks"] += 1
+
+
+def counselor_stats() -> dict:
+    stats = dict(_stats)
+    stats["stored_outcomes"] = len(_table)
+    return stats
+
+
+def describe_combo(combo: str) -> dict:
+    """Expands a combination into the descriptive answers the LLM prompt needs"""
+    answers = {}
+    for question, choice in zip(QUESTIONS, combo):
+        title, options = SCENARIOS[question]
+        answers[question] = f"{choice} - {options[choice]} ({title})"
+    return answers
+
+
+def refresh_counselor_outcomes(combos: list = None) -> dict:
+    """
+    Regenerates stored outcomes with the LLM. A combination whose response is
+    missing a field or is not valid JSON keeps its current row, or the
+    built-in default. Returns {combo: "updated" | "kept"}.
+    """
+    from app.services.llm_gateway import openrouter_chat
+    from app.services.roadmap_service import create_counseling_messages, parse_json_content
+
+    report = {}
+    db = SessionLocal()
+    try:
+        for combo in combos or all_combos():
+            try:
+                raw_content = openrouter_chat(
+                    messages=create_counseling_messages(describe_combo(combo)),
+                    temperature=0.3,
+                    max_tokens=1000
+                )
+                result = parse_json_content(raw_content)
+            except Exception as e:
+                print(f"Counselor refresh failed for {combo}: {e}")
+                result = None
+
+            if not is_valid_outcome(result):
+                report[combo] = "kept"
+                continue
+
+            result = {field: result[field].strip() for field in RESULT_FIELDS}
+            row = db.query(CounselorOutcome).filter(CounselorOutcome.combo == combo).first()
+            if row is None:
+                row = CounselorOutcome(combo=combo)
+                db.add(row)
+            row.prompt_version = COUNSELOR_PROMPT_VERSION
+            row.result = result
+            row.source = "llm"
+            db.commit()
+            report[combo] = "updated"
+    finally:
+        db.close()
+
+    _reload_table()
+    return report
+
+
+def seed_default_outcomes() -> int:
+    """Stores the built-in outcomes for combinations that have no row yet"""
+    db = SessionLocal()
+    try:
+        existing = {row.combo for row in db.query(CounselorOutcome.combo).all()}
+        added = 0
+        for combo, result in DEFAULT_OUTCOMES.items():
+            if combo not in existing:
+                db.add(CounselorOutcome(
+                    combo=combo,
+                    prompt_version=COUNSELOR_PROMPT_VERSION,
+                    result=result,
+                    source="manual"
+                ))
+                added += 1
+        db.commit()
+        return added
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m app.services.counselor_service refresh [ABA ...] | seed
+    command = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    if command == "seed":
+        print(f"Seeded {seed_default_outcomes()} counselor outcomes")
+    elif command == "refresh":
+        combos = [c.upper() for c in sys.argv[2:]] or None
+        unknown = [c for c in combos or [] if c not in all_combos()]
+        if unknown:
+            print(f"Unknown combinations: {', '.join(unknown)}")
+            sys.exit(1)
+        for combo, outcome in refresh_counselor_outcomes(combos).items():
+            print(f"{combo}: {outcome}")
+    else:
+        print("Usage: python -m app.services.counselor_service [refresh [COMBO ...] | seed]")
+        sys.exit(1)
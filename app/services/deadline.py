@@ -0,0 +1,90 @@
+"""
+Per-request deadlines for the AI call chain.
+
+The API layer sets a deadline once per request (from the X-Request-Timeout
+header or the endpoint's default). It lives in a context variable, so it
+follows the request into ai_service, the hedging and single-flight layers,
+asyncio tasks and asyncio.to_thread workers without threading it through
+every signature. Provider calls size their timeouts from the remaining
+budget, and once the budget is spent callers return the local fallback.
+"""
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bound a client may ask for through the header
+LLM_MAX_REQUEST_TIMEOUT = float(os.getenv("LLM_MAX_REQUEST_TIMEOUT", "120"))
+# Below this much remaining budget a provider call is not worth starting
+LLM_MIN_CALL_BUDGET = float(os.getenv("LLM_MIN_CALL_BUDGET", "0.5"))
+
+# Default budgets (seconds) per endpoint, used when the client sends no header
+BUDGET_ANALYZE = float(os.getenv("LLM_BUDGET_ANALYZE", "25"))
+BUDGET_IMPROVE = float(os.getenv("LLM_BUDGET_IMPROVE", "10"))
+BUDGET_IMPROVE_BATCH = float(os.getenv("LLM_BUDGET_IMPROVE_BATCH", "30"))
+BUDGET_ROADMAP = float(os.getenv("LLM_BUDGET_ROADMAP", "45"))
+BUDGET_COUNSELOR = float(os.getenv("LLM_BUDGET_COUNSELOR", "15"))
+BUDGET_CHAT = float(os.getenv("LLM_BUDGET_CHAT", "30"))
+BUDGET_STREAM = float(os.getenv("LLM_BUDGET_STREAM", "90"))
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the AI chain finished"""
+
+
+def set_deadline(seconds: float):
+    """
+    Starts a budget of `seconds` for the current context and returns the
+    contextvar token.
+    """
+    seconds = max(0.0, min(seconds, LLM_MAX_REQUEST_TIMEOUT))
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None when no deadline is set"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check_deadline():
+    if expired():
+        raise DeadlineExceeded("Request time budget exhausted")
+
+
+def call_timeout(default: float) -> float:
+    """
+    Timeout for the next provider call: the remaining budget capped at
+    `default`. Raises DeadlineExceeded if too little budget is left to try.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left < LLM_MIN_CALL_BUDGET:
+        raise DeadlineExceeded("Request time budget exhausted")
+    return min(default, left)
@@ -0,0 +1,301 @@
+"""
+Resume text extraction off the event loop.
+
+pdfplumber and python-docx are CPU-bound and block for hundreds of
+milliseconds on a multi-page file. Running them inside `async def
+upload_resume` stalled every other request on the worker. Extraction now
+runs in a process pool that is started with the app. Its workers come from
+a forkserver that has already imported both libraries, and each worker
+warms up once before the first upload.
+
+Before extraction, PDFs get a cheap pre-scan (pdf_engine.scan_pdf) that
+classifies them as text, mixed or image_only. Image-only files are not
+extracted, and the analysis endpoints refuse them without calling the LLM.
+
+PDFs are split into page ranges that run on several workers at once (see
+app.utils.pdf_engine). Once the ranges read so far reach the character
+cap, the ranges that have not started are cancelled.
+
+Each task gets a CPU-time cap (a soft RLIMIT_CPU raised just for that
+task) and every worker has a memory cap (RLIMIT_DATA), so a malicious or
+pathological document costs its own upload, not the server. The cap is
+not RLIMIT_AS: pdfium reserves tens of GB of address space on import, and
+an address-space cap would fail every allocation after that.
+Admission is bounded: when the pool's queue is full the upload gets a 503,
+and a user with too many extractions in flight gets a 429. Both carry a
+Retry-After.
+"""
+import os
+import signal
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from app.utils.file_processing import extract_text_from_file, is_pdf
+from app.utils.pdf_engine import (
+    PDF_MAX_CHARS, PDF_PAGES_PER_TASK, TEXT, pdf_page_count, page_ranges, extract_page_range, join_ranges, scan_pdf
+)
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, extraction still runs in the pool
+    resource = None
+
+load_dotenv()
+
+EXTRACTION_POOL_ENABLED = os.getenv("EXTRACTION_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+# Extractions allowed to wait for a worker; beyond this, uploads get a 503
+EXTRACTION_QUEUE_SIZE = int(os.getenv("EXTRACTION_QUEUE_SIZE", "8"))
+# Extractions one user may have in flight; beyond this, their uploads get a 429
+EXTRACTION_PER_USER = int(os.getenv("EXTRACTION_PER_USER", "2"))
+EXTRACTION_CPU_SECONDS = int(os.getenv("EXTRACTION_CPU_SECONDS", "10"))
+EXTRACTION_MEMORY_MB = int(os.getenv("EXTRACTION_MEMORY_MB", "1024"))
+EXTRACTION_RETRY_AFTER = int(os.getenv("EXTRACTION_RETRY_AFTER", "5"))
+
+# Imported by the forkserver once, so forked workers start with them loaded
+PRELOAD_MODULES = ["pypdfium2", "pdfplumber", "docx", "app.utils.file_processing"]
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_flight = {}  # user id -> extractions admitted and not finished
+_stats = {
+    "extracted": 0, "rejected_busy": 0, "rejected_user": 0,
+    "cpu_limited": 0, "worker_crashes": 0, "pdf_ranges_skipped": 0
+}
+_backend_counts = {}  # PDF page ranges read per backend ("none": no text)
+_classifications = {}  # uploads per pre-scan classification ("unknown": scan failed)
+
+
+class ExtractionBusy(Exception):
+    """No room for another extraction; `status_code` is 503 (pool) or 429 (user)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = EXTRACTION_RETRY_AFTER
+
+
+class ExtractionLimitExceeded(Exception):
+    """A task used up its CPU-time cap"""
+
+
+class _CpuBudgetExceeded(BaseException):
+    # BaseException so the extractors' `except Exception` cannot swallow it
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CpuBudgetExceeded()
+
+
+def _init_worker():
+    if resource is None:
+        return
+    if EXTRACTION_MEMORY_MB > 0:
+        # Counts heap and writable mappings, not pdfium's reserved (PROT_NONE) address space
+        cap = EXTRACTION_MEMORY_MB * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+        resource.setrlimit(resource.RLIMIT_DATA, (cap if hard == resource.RLIM_INFINITY else min(cap, hard), hard))
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+
+def _set_cpu_soft_limit(soft):
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = hard if soft == resource.RLIM_INFINITY else min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _limited(fn, *args):
+    """Runs `fn` in a pool worker. RLIMIT_CPU counts the whole process, so the cap is moved up per task."""
+    if resource is None or EXTRACTION_CPU_SECONDS <= 0:
+        return fn(*args)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _set_cpu_soft_limit(int(usage.ru_utime + usage.ru_stime) + 1 + EXTRACTION_CPU_SECONDS)
+    try:
+        return fn(*args)
+    except _CpuBudgetExceeded:
+        raise ExtractionLimitExceeded(f"Extraction exceeded {EXTRACTION_CPU_SECONDS}s of CPU")
+    finally:
+        _set_cpu_soft_limit(resource.RLIM_INFINITY)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _mp_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _new_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=_mp_context(), initializer=_init_worker)
+
+
+async def start_extraction_pool():
+    """Starts the workers now, so the first uploads do not pay for process start-up"""
+    global _pool
+    if not EXTRACTION_POOL_ENABLED or _pool is not None:
+        return
+    _pool = _new_pool()
+    loop = asyncio.get_running_loop()
+    # Concurrent submits make the executor start every worker
+    await asyncio.gather(*(loop.run_in_executor(_pool, _warm_up) for _ in range(EXTRACTION_WORKERS)))
+
+
+async def stop_extraction_pool():
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = _new_pool()
+            # Start its workers now, like start_extraction_pool, not on the next upload
+            for _ in range(EXTRACTION_WORKERS):
+                _pool.submit(_warm_up)
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+@asynccontextmanager
+async def extraction_slot(user_id: int):
+    """
+    Admits one extraction for `user_id` or raises ExtractionBusy. Taken
+    before the upload is written to disk, so rejected uploads cost nothing.
+    """
+    admitted = sum(_in_flight.values())
+    if admitted >= EXTRACTION_WORKERS + EXTRACTION_QUEUE_SIZE:
+        _stats["rejected_busy"] += 1
+        raise ExtractionBusy(503, "Resume processing is busy. Please retry shortly.")
+    if _in_flight.get(user_id, 0) >= EXTRACTION_PER_USER:
+        _stats["rejected_user"] += 1
+        raise ExtractionBusy(429, "Another resume upload is still being processed.")
+    _in_flight[user_id] = _in_flight.get(user_id, 0) + 1
+    try:
+        yield
+    finally:
+        _in_flight[user_id] -= 1
+        if not _in_flight[user_id]:
+            del _in_flight[user_id]
+
+
+async def _extract_pdf(pool: ProcessPoolExecutor, file_path: str) -> str:
+    loop = asyncio.get_running_loop()
+
+    def submit(first: int, last: int):
+        # Executor futures, so cancel() reports whether the range had started
+        return pool.submit(_limited, extract_page_range, file_path, first, last)
+
+    # Most CVs fit in the first range, so it starts alongside the page count
+    first_range = submit(*page_ranges(PDF_PAGES_PER_TASK)[0])
+    try:
+        page_count = await loop.run_in_executor(pool, _limited, pdf_page_count, file_path)
+    except BaseException:
+        first_range.cancel()
+        raise
+    futures = [first_range] + [submit(first, last) for first, last in page_ranges(page_count)[1:]]
+
+    texts = []
+    total = 0
+    try:
+        for future in futures:
+            try:
+                text, backend = await asyncio.wrap_future(future)
+            except ExtractionLimitExceeded as e:
+                _stats["cpu_limited"] += 1
+                print(f"Extraction of a page range of {file_path} stopped: {e}")
+                text, backend = "", None
+            _backend_counts[backend or "none"] = _backend_counts.get(backend or "none", 0) + 1
+            texts.append(text)
+            total += len(text)
+            if total >= PDF_MAX_CHARS:
+                break
+    finally:
+        for future in futures[len(texts):]:
+            if future.cancel():
+                _stats["pdf_ranges_skipped"] += 1
+    return join_ranges(texts, PDF_MAX_CHARS)
+
+
+async def classify_upload_async(file_path: str, content_type: str):
+    """
+    Pre-scan classification of an upload: text, mixed or image_only.
+    Non-PDFs are always text. None when the scan could not finish, in
+    which case the upload is extracted as usual.
+    """
+    if not is_pdf(file_path, content_type):
+        return TEXT
+    pool = _pool
+    try:
+        if pool is None:
+            scan = await asyncio.to_thread(scan_pdf, file_path)
+        else:
+            scan = await asyncio.get_running_loop().run_in_executor(pool, _limited, scan_pdf, file_path)
+    except ExtractionLimitExceeded as e:
+        _stats["cpu_limited"] += 1
+        print(f"Pre-scan of {file_path} stopped: {e}")
+        scan = {"classification": None}
+    except BrokenProcessPool:
+        _stats["worker_crashes"] += 1
+        print(f"Extraction worker crashed scanning {file_path}")
+        _replace_broken_pool(pool)
+        scan = {"classification": None}
+    classification = scan["classification"]
+    key = classification or "unknown"
+    _classifications[key] = _classifications.get(key, 0) + 1
+    return classification
+
+
+async def extract_text_async(file_path: str, content_type: str) -> str:
+    """
+    Extracted text, or "" when the file could not be read within its limits
+    (the same result the extractors give for an unreadable file)
+    """
+    pool = _pool
+    if pool is None:
+        # Pool disabled or not started (e.g. scripts): still keep the loop free
+        return await asyncio.to_thread(extract_text_from_file, file_path, content_type)
+    loop = asyncio.get_running_loop()
+    try:
+        if is_pdf(file_path, content_type):
+            text = await _extract_pdf(pool, file_path)
+        else:
+            text = await loop.run_in_executor(pool, _limited, extract_text_from_file, file_path, content_type)
+    except ExtractionLimitExceeded as e:
+        _stats["cpu_limited"] += 1
+        print(f"Extraction of {file_path} stopped: {e}")
+        return ""
+    except BrokenProcessPool:
+        # A worker died (e.g. killed at the memory cap); the next upload gets a fresh pool
+        _stats["worker_crashes"] += 1
+        print(f"Extraction worker crashed on {file_path}")
+        _replace_broken_pool(pool)
+        return ""
+    _stats["extracted"] += 1
+    return text
+
+
+def extraction_pool_stats() -> dict:
+    stats = dict(_stats)
+    stats["enabled"] = EXTRACTION_POOL_ENABLED
+    stats["running"] = _pool is not None
+    stats["workers"] = EXTRACTION_WORKERS
+    stats["in_flight"] = sum(_in_flight.values())
+    stats["capacity"] = EXTRACTION_WORKERS + EXTRACTION_QUEUE_SIZE
+    stats["pdf_backends"] = dict(_backend_counts)
+    stats["classifications"] = dict(_classifications)
+    return stats
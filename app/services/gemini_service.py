@@ -1,79 +1,103 @@
-import google.generativeai as genai
 import json
-import re
-from app.config import GEMINI_API_KEY, GEMINI_MODEL
+from app.services.llm_gateway import gemini_generate, gemini_generate_async, gemini_chat, gemini_chat_async, gemini_chat_stream_async
+from app.services.analysis_service import create_analysis_prompt, parse_analysis_content
+from app.services.structured_output import LLM_STRUCTURED_OUTPUT
+from app.services.prompt_budget import fit_history
+from app.utils.skill_extractor import extract_skills, merge_skills
 
 def analyze_with_gemini(resume_text: str) -> dict:
     """
     Analyzes resume using Google Gemini (backup service)
     """
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        detected = extract_skills(resume_text)
+        prompt = create_analysis_prompt(resume_text, detected)
         
-        prompt = create_analysis_prompt(resume_text)
+        raw_content = gemini_generate(prompt, json_output=LLM_STRUCTURED_OUTPUT != "off")
         
-        response = model.generate_content(prompt)
-        raw_content = response.text
-        
-        return parse_ai_response(raw_content, resume_text)
+        data = parse_analysis_content(raw_content)
+        data["skills"] = merge_skills(detected, data["skills"])
+        return data
         
     except Exception as e: 
         print(f"Gemini error: {str(e)}")
         raise Exception(f"Gemini failed: {str(e)}")
 
-def create_analysis_prompt(resume_text: str) -> str:
-    """Creates the analysis prompt"""
-    return f"""You are an expert career counselor.  Analyze this resume and provide detailed career guidance.
+async def analyze_with_gemini_async(resume_text: str) -> dict:
+    """
+    Async variant of analyze_with_gemini
+    """
+    try:
+        detected = extract_skills(resume_text)
+        prompt = create_analysis_prompt(resume_text, detected)
+        
+        raw_content = await gemini_generate_async(prompt, json_output=LLM_STRUCTURED_OUTPUT != "off")
+        
+        data = parse_analysis_content(raw_content)
+        data["skills"] = merge_skills(detected, data["skills"])
+        return data
+        
+    except Exception as e: 
+        print(f"Gemini error: {str(e)}")
+        raise Exception(f"Gemini failed: {str(e)}")
 
-RESUME TEXT: 
-{resume_text}
+def chat_with_gemini(message: str, history: list, user_context: dict) -> str:
+    """
+    Continues a mentor conversation on Gemini
+    """
+    return gemini_chat(create_chat_history(history, user_context), message)
 
-YOUR TASK:
-1. Extract ALL technical and soft skills mentioned
-2. Determine experience level (Beginner/Intermediate/Advanced)
-3. Recommend top 2-3 career paths with match percentages
-4. Create a detailed 8-week learning roadmap for the best career match
+async def chat_with_gemini_async(message: str, history: list, user_context: dict) -> str:
+    """
+    Async variant of chat_with_gemini
+    """
+    return await gemini_chat_async(create_chat_history(history, user_context), message)
 
-OUTPUT FORMAT (strict JSON):
-{{
-  "skills": ["skill1", "skill2", "skill3"],
-  "experience_level": "Beginner/Intermediate/Advanced",
-  "top_careers": [
-    {{"title": "Career Title 1", "match_percent": 85}},
-    {{"title": "Career Title 2", "match_percent": 75}}
-  ],
-  "roadmap": "Week 1: [Topic]\\n- Task 1\\n- Task 2\\n\\nWeek 2: [Topic]\\n- Task 1\\n- Task 2\\n\\n[Continue for 8 weeks]"
-}}
+async def stream_chat_with_gemini_async(message: str, history: list, user_context: dict):
+    """
+    Streams the mentor reply from Gemini as text chunks
+    """
+    stream = gemini_chat_stream_async(create_chat_history(history, user_context), message)
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
 
-Return ONLY valid JSON, no extra text."""
+def create_chat_history(history: list, user_context: dict) -> list:
+    """
+    Converts app chat history ({"role": "user"|"model", "content": ...}) to Gemini
+    format, opening with the mentor persona and the user's profile context
+    """
+    context = json.dumps(user_context) if user_context else "No profile available."
+    turns = [
+        {"role": "user", "parts": [f"You are a friendly, practical AI Career Mentor. Keep answers concise and actionable.\nUSER PROFILE: {context}"]},
+        {"role": "model", "parts": ["Understood. I'm ready to help with your career questions."]}
+    ]
+    for item in fit_history(history):
+        content = item.get("content")
+        if not content:
+            continue
+        role = "model" if item.get("role") in ("model", "assistant") else "user"
+        turns.append({"role": role, "parts": [content]})
+    return turns
 
 def parse_ai_response(raw_content: str, resume_text: str) -> dict:
     """Parses AI response and validates JSON"""
     try: 
-        cleaned = re.sub(r'```json\n?|\n?```', '', raw_content)
-        data = json.loads(cleaned)
-        
-        required = ["skills", "experience_level", "top_careers", "roadmap"]
-        for field in required:
-            if field not in data:
-                raise ValueError(f"Missing field: {field}")
-        
-        return data
-        
-    except json.JSONDecodeError:
+        return parse_analysis_content(raw_content)
+    except ValueError:
         return create_fallback_response(resume_text)
 
 def create_fallback_response(resume_text:  str) -> dict:
     """Creates fallback response if AI fails"""
-    common_skills = ["Python", "JavaScript", "Communication", "Leadership"]
-    found_skills = [s for s in common_skills if s.lower() in resume_text.lower()]
+    found_skills = extract_skills(resume_text, limit=15)
     
     if not found_skills:
         found_skills = ["Communication", "Problem Solving"]
     
     return {
-        "skills": found_skills[:8],
+        "skills": found_skills,
         "experience_level":  "Intermediate",
         "top_careers": [
             {"title": "Software Developer", "match_percent": 75}
@@ -0,0 +1,167 @@
+"""
+Hedged provider calls.
+
+The first provider is called immediately. If it has not answered within a
+latency percentile of its own recent successful calls, the next provider is
+launched as a hedge and whichever valid response arrives first wins; the
+loser is cancelled. A failed call promotes the next provider straight away.
+A per-provider cap on in-flight hedges bounds the extra load hedging adds.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from app.services.deadline import DeadlineExceeded, remaining
+
+load_dotenv()
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "6"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "20"))
+LLM_HEDGE_MAX_INFLIGHT = int(os.getenv("LLM_HEDGE_MAX_INFLIGHT", "4"))
+LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one provider.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+_latency = {}
+_hedges_in_flight = {}
+_stats = {"calls": 0, "hedges_launched": 0, "hedge_wins": 0, "hedges_skipped_cap": 0, "failovers": 0}
+
+
+def latency_tracker(provider: str) -> LatencyTracker:
+    tracker = _latency.get(provider)
+    if tracker is None:
+        tracker = _latency.setdefault(provider, LatencyTracker())
+    return tracker
+
+
+def hedge_delay(provider: str) -> float:
+    """
+    Seconds to wait on `provider` before hedging: its latency percentile once
+    enough samples exist, a fixed default until then.
+    """
+    tracker = latency_tracker(provider)
+    delay = None
+    if len(tracker) >= LLM_HEDGE_MIN_SAMPLES:
+        delay = tracker.percentile(LLM_HEDGE_PERCENTILE)
+    if delay is None:
+        delay = LLM_HEDGE_DEFAULT_DELAY
+    return max(LLM_HEDGE_MIN_DELAY, min(LLM_HEDGE_MAX_DELAY, delay))
+
+
+def hedging_stats() -> dict:
+    stats = dict(_stats)
+    stats["hedges_in_flight"] = dict(_hedges_in_flight)
+    stats["p95_latency"] = {
+        name: round(tracker.percentile(95), 3)
+        for name, tracker in _latency.items() if len(tracker)
+    }
+    return stats
+
+
+async def _timed(provider: str, factory):
+    started = time.monotonic()
+    result = await factory()
+    latency_tracker(provider).record(time.monotonic() - started)
+    return result
+
+
+def _release_hedge_slot(provider: str):
+    _hedges_in_flight[provider] = max(0, _hedges_in_flight.get(provider, 0) - 1)
+
+
+async def hedged_call(candidates: list):
+    """
+    Runs `candidates` ([(provider_name, async_factory), ...], in preference
+    order) with hedging and returns (provider_name, result) for the first
+    successful call.
+    Raises if every candidate fails, or DeadlineExceeded when the request
+    budget runs out first.
+    """
+    _stats["calls"] += 1
+    to_launch = list(candidates)
+    pending = {}
+    errors = []
+    hedging_blocked = not LLM_HEDGE_ENABLED
+
+    def launch(hedge: bool):
+        name, factory = to_launch.pop(0)
+        task = asyncio.ensure_future(_timed(name, factory))
+        pending[task] = (name, hedge)
+        if hedge:
+            _stats["hedges_launched"] += 1
+            _hedges_in_flight[name] = _hedges_in_flight.get(name, 0) + 1
+            task.add_done_callback(lambda t: _release_hedge_slot(name))
+
+    launch(hedge=False)
+    try:
+        while pending:
+            timeout = None
+            if to_launch and not hedging_blocked:
+                primary_name = next(iter(pending.values()))[0]
+                timeout = hedge_delay(primary_name)
+            budget = remaining()
+            if budget is not None:
+                timeout = budget if timeout is None else min(timeout, budget)
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                if budget is not None and remaining() <= 0:
+                    raise DeadlineExceeded(f"Request time budget exhausted; errors so far: {errors}")
+                if not to_launch or hedging_blocked:
+                    continue
+                next_name = to_launch[0][0]
+                if _hedges_in_flight.get(next_name, 0) >= LLM_HEDGE_MAX_INFLIGHT:
+                    _stats["hedges_skipped_cap"] += 1
+                    hedging_blocked = True
+                else:
+                    launch(hedge=True)
+                continue
+
+            for task in done:
+                name, hedge = pending.pop(task)
+                if task.exception() is None:
+                    if hedge:
+                        _stats["hedge_wins"] += 1
+                    return name, task.result()
+                errors.append(f"{name}: {task.exception()}")
+
+            if not pending and to_launch:
+                # Everything in flight failed: fail over without waiting
+                _stats["failovers"] += 1
+                launch(hedge=False)
+
+        raise Exception(f"AI Service Failure: {errors}")
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,402 @@
+"""
+Durable background jobs for long-running AI work.
+
+Jobs are rows in ai_jobs, so Postgres is the queue and a job survives a
+restart. Each API process that runs workers keeps an asyncio pool per queue.
+Workers claim the oldest queued job with SELECT ... FOR UPDATE SKIP LOCKED,
+so several processes can share the table without running a job twice.
+Per-queue concurrency limits keep provider traffic under rate limits. The
+limits apply per process. Jobs left running by a process that died are
+requeued at startup and then periodically by every worker process.
+"""
+import os
+import uuid
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.job import AIJob
+from app.services.deadline import deadline_scope
+
+load_dotenv()
+
+# Run worker loops in this process; enqueueing works regardless
+AI_JOB_WORKERS = os.getenv("AI_JOB_WORKERS", "true").lower() in ("1", "true", "yes")
+AI_JOB_POLL_SECONDS = float(os.getenv("AI_JOB_POLL_SECONDS", "2"))
+AI_JOB_TIMEOUT = float(os.getenv("AI_JOB_TIMEOUT", "120"))
+AI_JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "2"))
+# Running jobs older than this are assumed orphaned by a dead process and requeued
+AI_JOB_STALE_SECONDS = float(os.getenv("AI_JOB_STALE_SECONDS", "600"))
+AI_JOB_STALE_CHECK_SECONDS = float(os.getenv("AI_JOB_STALE_CHECK_SECONDS", "60"))
+
+QUEUE_CONCURRENCY = {
+    "analysis": int(os.getenv("AI_JOB_ANALYSIS_CONCURRENCY", "4")),
+    "roadmap": int(os.getenv("AI_JOB_ROADMAP_CONCURRENCY", "2")),
+    # Work nobody is waiting for yet (e.g. analysis started on upload)
+    "speculative": int(os.getenv("AI_JOB_SPECULATIVE_CONCURRENCY", "2")),
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+_handlers = {}  # kind -> (queue, async handler(user_id, payload) -> result dict)
+_listeners = {}  # job id -> set of asyncio.Event, for in-process completion pushes
+_stats = {
+    "enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0, "cancelled": 0,
+    "requeued_stale": 0, "failed_stale": 0
+}
+_pool = None
+
+
+def job_handler(kind: str, queue: str):
+    """
+    Registers an async handler for jobs of `kind`, run on `queue`.
+    The handler's return value is stored as the job result.
+    """
+    if queue not in QUEUE_CONCURRENCY:
+        raise ValueError(f"Unknown job queue: {queue}")
+
+    def register(fn):
+        _handlers[kind] = (queue, fn)
+        return fn
+
+    return register
+
+
+def job_to_dict(job: AIJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def enqueue_job(db: Session, user_id: int, kind: str, payload: dict = None) -> dict:
+    """
+    Stores a new queued job and wakes this process's workers for its queue.
+    Returns the job as a dict.
+    """
+    queue, _ = _handlers[kind]
+    job = AIJob(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        kind=kind,
+        queue=queue,
+        status=QUEUED,
+        payload=payload,
+        attempts=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _stats["enqueued"] += 1
+    if _pool is not None:
+        _pool.wake(queue)
+    return job_to_dict(job)
+
+
+def cancel_jobs(db: Session, user_id: int, kind: str) -> int:
+    """
+    Cancels `user_id`'s unfinished jobs of `kind`. Queued jobs will not
+    start; running ones are cancelled if this process runs them. A job
+    running in another process finishes, so handlers that can be superseded
+    must check before saving. Returns how many jobs were stopped.
+    """
+    now = datetime.now(timezone.utc)
+    unfinished = (AIJob.user_id == user_id, AIJob.kind == kind)
+    cancelled = (
+        db.query(AIJob)
+        .filter(*unfinished, AIJob.status == QUEUED)
+        .update({AIJob.status: CANCELLED, AIJob.finished_at: now}, synchronize_session=False)
+    )
+    running = [row.id for row in db.query(AIJob.id).filter(*unfinished, AIJob.status == RUNNING)]
+    db.commit()
+    if _pool is not None:
+        cancelled += sum(1 for job_id in running if _pool.cancel(job_id))
+    _stats["cancelled"] += cancelled
+    return cancelled
+
+
+def load_job(job_id: str, user_id: int) -> Optional[dict]:
+    """Fetches a job owned by `user_id` with its own session"""
+    db = SessionLocal()
+    try:
+        job = db.query(AIJob).filter(AIJob.id == job_id, AIJob.user_id == user_id).first()
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+
+async def wait_for_job_update(job_id: str, timeout: float):
+    """
+    Waits until this process finishes `job_id` or `timeout` passes. Jobs run
+    by another process are only seen by polling, so callers re-read the row.
+    """
+    event = asyncio.Event()
+    _listeners.setdefault(job_id, set()).add(event)
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        waiting = _listeners.get(job_id)
+        if waiting is not None:
+            waiting.discard(event)
+            if not waiting:
+                del _listeners[job_id]
+
+
+def _notify(job_id: str):
+    for event in _listeners.get(job_id, ()):
+        event.set()
+
+
+def _claim_next(queue: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        job = (
+            db.query(AIJob)
+            .filter(AIJob.queue == queue, AIJob.status == QUEUED)
+            .order_by(AIJob.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.rollback()
+            return None
+        job.status = RUNNING
+        job.started_at = datetime.now(timezone.utc)
+        job.attempts += 1
+        claimed = {
+            "id": job.id,
+            "user_id": job.user_id,
+            "kind": job.kind,
+            "queue": job.queue,
+            "payload": job.payload or {},
+            "attempts": job.attempts
+        }
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def _finish(job_id: str, status: str, result: dict = None, error: str = None):
+    db = SessionLocal()
+    try:
+        job = db.query(AIJob).filter(AIJob.id == job_id).first()
+        if job is None:
+            return
+        job.status = status
+        job.result = result
+        job.error = error
+        if status in TERMINAL_STATES:
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            job.started_at = None
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to update job {job_id}: {e}")
+    finally:
+        db.close()
+
+
+def _requeue_stale(running_here=()) -> int:
+    """
+    Requeues running jobs older than AI_JOB_STALE_SECONDS, whose worker is
+    presumed dead; jobs out of attempts fail instead, so a job that kills
+    its worker is not retried forever. `running_here` are job ids this
+    process is still running. Returns how many jobs were requeued.
+    """
+    now = datetime.now(timezone.utc)
+    stale = [AIJob.status == RUNNING, AIJob.started_at < now - timedelta(seconds=AI_JOB_STALE_SECONDS)]
+    if running_here:
+        stale.append(AIJob.id.notin_(list(running_here)))
+    db = SessionLocal()
+    try:
+        failed = (
+            db.query(AIJob)
+            .filter(*stale, AIJob.attempts >= AI_JOB_MAX_ATTEMPTS)
+            .update({
+                AIJob.status: FAILED,
+                AIJob.finished_at: now,
+                AIJob.error: "The worker running this job stopped"
+            }, synchronize_session=False)
+        )
+        count = (
+            db.query(AIJob)
+            .filter(*stale)
+            .update({AIJob.status: QUEUED, AIJob.started_at: None}, synchronize_session=False)
+        )
+        db.commit()
+        _stats["failed_stale"] += failed
+        return count
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to requeue stale jobs: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+class JobWorkerPool:
+    """
+    One claim loop per queue, each running at most QUEUE_CONCURRENCY[queue]
+    jobs at a time.
+    """
+
+    def __init__(self, concurrency: dict):
+        self._concurrency = dict(concurrency)
+        self._loop = None
+        self._wakeups = {}
+        self._loops = []
+        self._running = {queue: set() for queue in concurrency}
+        self._tasks = {}  # job id -> task, for cancellation
+        self._cancelled = set()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        _stats["requeued_stale"] += await asyncio.to_thread(_requeue_stale)
+        for queue, limit in self._concurrency.items():
+            self._wakeups[queue] = asyncio.Event()
+            self._loops.append(asyncio.create_task(self._claim_loop(queue, limit)))
+        self._loops.append(asyncio.create_task(self._stale_loop()))
+
+    async def stop(self):
+        running = [task for tasks in self._running.values() for task in tasks]
+        for task in self._loops + running:
+            task.cancel()
+        await asyncio.gather(*self._loops, *running, return_exceptions=True)
+
+    def wake(self, queue: str):
+        event = self._wakeups.get(queue)
+        if event is None or self._loop is None:
+            return
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                event.set()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(event.set)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job this process is running; False if it runs elsewhere"""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return False
+        self._cancelled.add(job_id)
+        self._loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def in_flight(self) -> dict:
+        return {queue: len(tasks) for queue, tasks in self._running.items()}
+
+    async def _stale_loop(self):
+        """Requeues jobs orphaned by a crashed worker without waiting for the next deploy"""
+        while True:
+            await asyncio.sleep(AI_JOB_STALE_CHECK_SECONDS)
+            requeued = await asyncio.to_thread(_requeue_stale, set(self._tasks))
+            if requeued:
+                _stats["requeued_stale"] += requeued
+                for queue in self._wakeups:
+                    self.wake(queue)
+
+    async def _claim_loop(self, queue: str, limit: int):
+        slots = asyncio.Semaphore(limit)
+        wakeup = self._wakeups[queue]
+        while True:
+            await slots.acquire()
+            # Cleared before claiming so an enqueue during the claim is not missed
+            wakeup.clear()
+            try:
+                job = await asyncio.to_thread(_claim_next, queue)
+            except Exception as e:
+                print(f"Job claim failed on {queue}: {e}")
+                job = None
+
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), AI_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._execute(job))
+            self._running[queue].add(task)
+            self._tasks[job["id"]] = task
+            task.add_done_callback(lambda t, q=queue, job_id=job["id"]: self._done(q, job_id, t, slots))
+
+    def _done(self, queue: str, job_id: str, task, slots: asyncio.Semaphore):
+        self._running[queue].discard(task)
+        self._tasks.pop(job_id, None)
+        # A cancel that arrived after the job finished
+        self._cancelled.discard(job_id)
+        slots.release()
+
+    async def _execute(self, job: dict):
+        _, handler = _handlers[job["kind"]]
+        try:
+            with deadline_scope(AI_JOB_TIMEOUT):
+                result = await handler(job["user_id"], job["payload"])
+        except asyncio.CancelledError:
+            if job["id"] in self._cancelled:
+                self._cancelled.discard(job["id"])
+                await asyncio.to_thread(_finish, job["id"], CANCELLED)
+                _notify(job["id"])
+                return
+            # Shutting down: hand the job back for the next worker
+            await asyncio.to_thread(_finish, job["id"], QUEUED)
+            raise
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            if job["attempts"] < AI_JOB_MAX_ATTEMPTS:
+                _stats["retried"] += 1
+                await asyncio.to_thread(_finish, job["id"], QUEUED, None, str(e))
+                self.wake(job["queue"])
+            else:
+                _stats["failed"] += 1
+                await asyncio.to_thread(_finish, job["id"], FAILED, None, str(e))
+                _notify(job["id"])
+            return
+
+        _stats["succeeded"] += 1
+        await asyncio.to_thread(_finish, job["id"], SUCCEEDED, result)
+        _notify(job["id"])
+
+
+async def start_job_workers():
+    global _pool
+    if not AI_JOB_WORKERS or _pool is not None:
+        return
+    _pool = JobWorkerPool(QUEUE_CONCURRENCY)
+    await _pool.start()
+
+
+async def stop_job_workers():
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.stop()
+
+
+def job_queue_stats() -> dict:
+    stats = dict(_stats)
+    stats["workers"] = _pool is not None
+    stats["concurrency"] = dict(QUEUE_CONCURRENCY)
+    stats["in_flight"] = _pool.in_flight() if _pool is not None else {}
+    return stats
@@ -0,0 +1,372 @@
+"""
+Process-wide LLM gateway.
+
+Owns one long-lived client per provider (OpenRouter, Gemini) so every call
+reuses the same keep-alive connection pool instead of paying client setup
+and a TLS handshake on each request.
+"""
+import os
+import time
+import asyncio
+import threading
+import httpx
+import google.generativeai as genai
+from openai import OpenAI, AsyncOpenAI, BadRequestError
+from dotenv import load_dotenv
+from app.services.circuit_breaker import get_breaker
+from app.services.deadline import call_timeout, check_deadline, expired, remaining
+from app.config import (
+    OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_BASE_URL,
+    GEMINI_API_KEY, GEMINI_MODEL
+)
+
+load_dotenv()
+
+# Connection pool tuning (shared by every provider client)
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_POOL_KEEPALIVE = int(os.getenv("LLM_POOL_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+# Gemini talks gRPC (HTTP/2 multiplexed) by default; "rest" is available for proxies
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")
+
+_lock = threading.Lock()
+_openrouter_client = None
+_openrouter_async_client = None
+_gemini_configured = False
+_gemini_models = {}
+# Models that rejected a response_format; later calls leave it out
+_no_response_format = set()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_POOL_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        LLM_READ_TIMEOUT,
+        connect=LLM_CONNECT_TIMEOUT,
+        read=LLM_READ_TIMEOUT
+    )
+
+
+def get_openrouter_client() -> OpenAI:
+    """
+    Returns the shared OpenRouter client, creating it on first use.
+    """
+    global _openrouter_client
+    if _openrouter_client is None:
+        with _lock:
+            if _openrouter_client is None:
+                _openrouter_client = OpenAI(
+                    api_key=OPENROUTER_API_KEY,
+                    base_url=OPENROUTER_BASE_URL,
+                    max_retries=LLM_MAX_RETRIES,
+                    http_client=httpx.Client(
+                        limits=_http_limits(),
+                        timeout=_http_timeout(),
+                        http2=LLM_HTTP2
+                    )
+                )
+    return _openrouter_client
+
+
+def get_openrouter_async_client() -> AsyncOpenAI:
+    """
+    Returns the shared async OpenRouter client used by the async endpoints.
+    Lives on the worker's event loop, so it is only touched from async code.
+    """
+    global _openrouter_async_client
+    if _openrouter_async_client is None:
+        _openrouter_async_client = AsyncOpenAI(
+            api_key=OPENROUTER_API_KEY,
+            base_url=OPENROUTER_BASE_URL,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=_http_limits(),
+                timeout=_http_timeout(),
+                http2=LLM_HTTP2
+            )
+        )
+    return _openrouter_async_client
+
+
+def get_gemini_model(model_name: str = GEMINI_MODEL):
+    """
+    Returns a cached GenerativeModel. genai.configure runs once per process.
+    """
+    global _gemini_configured
+    model = _gemini_models.get(model_name)
+    if model is not None:
+        return model
+
+    with _lock:
+        if not _gemini_configured:
+            genai.configure(api_key=GEMINI_API_KEY, transport=GEMINI_TRANSPORT)
+            _gemini_configured = True
+        if model_name not in _gemini_models:
+            _gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return _gemini_models[model_name]
+
+
+def _chat_params(messages: list, max_tokens: int, temperature: float, model: str, response_format: dict = None) -> dict:
+    params = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens
+    }
+    if temperature is not None:
+        params["temperature"] = temperature
+    if response_format is not None and model not in _no_response_format:
+        params["response_format"] = response_format
+    return params
+
+
+def _drop_response_format(params: dict, error: BadRequestError) -> bool:
+    """
+    True if `error` is the provider rejecting response_format. The model is
+    then remembered as unsupported and the parameter removed for a retry.
+    """
+    if "response_format" not in params:
+        return False
+    message = str(error).lower()
+    if "response_format" not in message and "json_schema" not in message and "structured" not in message:
+        return False
+    print(f"{params['model']} does not support response_format, falling back to prompt-only JSON")
+    _no_response_format.add(params["model"])
+    del params["response_format"]
+    return True
+
+
+def _record_failure(breaker, started: float):
+    # A timeout caused by the caller's own budget says nothing about the provider
+    if expired():
+        breaker.record_cancelled()
+    else:
+        breaker.record(False, time.monotonic() - started)
+
+
+def _call_guarded(provider: str, fn):
+    """
+    Runs one provider call through that provider's circuit breaker, passing
+    it a timeout sized from the request's remaining budget.
+    Raises CircuitOpenError without calling out when the breaker is open,
+    and DeadlineExceeded when the budget is already spent.
+    """
+    timeout = call_timeout(LLM_READ_TIMEOUT)
+    breaker = get_breaker(provider)
+    breaker.before_call()
+    started = time.monotonic()
+    try:
+        result = fn(timeout)
+    except Exception:
+        _record_failure(breaker, started)
+        raise
+    breaker.record(True, time.monotonic() - started)
+    return result
+
+
+async def _call_guarded_async(provider: str, coro_fn):
+    timeout = call_timeout(LLM_READ_TIMEOUT)
+    breaker = get_breaker(provider)
+    breaker.before_call()
+    started = time.monotonic()
+    try:
+        result = await coro_fn(timeout)
+    except asyncio.CancelledError:
+        breaker.record_cancelled()
+        raise
+    except Exception:
+        _record_failure(breaker, started)
+        raise
+    breaker.record(True, time.monotonic() - started)
+    return result
+
+
+async def _stream_guarded(provider: str, stream_fn):
+    """
+    Guards a streaming call: the outcome is recorded when the stream ends,
+    fails, or is abandoned by the consumer. The stream is cut off with
+    DeadlineExceeded once the request budget runs out.
+    """
+    timeout = call_timeout(LLM_READ_TIMEOUT)
+    breaker = get_breaker(provider)
+    breaker.before_call()
+    started = time.monotonic()
+    stream = stream_fn(timeout)
+    try:
+        async for chunk in stream:
+            check_deadline()
+            yield chunk
+    except Exception:
+        _record_failure(breaker, started)
+        raise
+    except BaseException:
+        # GeneratorExit / CancelledError: the client went away
+        breaker.record_cancelled()
+        raise
+    finally:
+        await stream.aclose()
+    breaker.record(True, time.monotonic() - started)
+
+
+def _budgeted(client):
+    """
+    Under a request deadline the fallback chain is the retry policy, so the
+    SDK must not retry on its own past the budget.
+    """
+    if remaining() is not None:
+        return client.with_options(max_retries=0)
+    return client
+
+
+def _first_choice(response):
+    if not response.choices:
+        return None
+    return response.choices[0].message.content
+
+
+def openrouter_chat(messages: list, max_tokens: int, temperature: float = None, model: str = OPENROUTER_MODEL,
+                    response_format: dict = None):
+    """
+    Runs a chat completion on the pooled OpenRouter client.
+    Returns the message content, or None if the provider sent no choices.
+    `response_format` requests structured output; models that reject it are
+    retried once without it.
+    """
+    params = _chat_params(messages, max_tokens, temperature, model, response_format)
+    create = lambda timeout: _budgeted(get_openrouter_client()).chat.completions.create(timeout=timeout, **params)
+    try:
+        response = _call_guarded("openrouter", create)
+    except BadRequestError as e:
+        if not _drop_response_format(params, e):
+            raise
+        response = _call_guarded("openrouter", create)
+    return _first_choice(response)
+
+
+async def openrouter_chat_async(messages: list, max_tokens: int, temperature: float = None, model: str = OPENROUTER_MODEL,
+                                response_format: dict = None):
+    """
+    Async counterpart of openrouter_chat.
+    """
+    params = _chat_params(messages, max_tokens, temperature, model, response_format)
+    create = lambda timeout: _budgeted(get_openrouter_async_client()).chat.completions.create(timeout=timeout, **params)
+    try:
+        response = await _call_guarded_async("openrouter", create)
+    except BadRequestError as e:
+        if not _drop_response_format(params, e):
+            raise
+        response = await _call_guarded_async("openrouter", create)
+    return _first_choice(response)
+
+
+def openrouter_chat_stream_async(messages: list, max_tokens: int, temperature: float = None, model: str = OPENROUTER_MODEL):
+    """
+    Streams a chat completion, yielding content deltas as they arrive.
+    Closing the generator (e.g. on client disconnect) closes the upstream
+    response, which stops generation on the provider side.
+    """
+    params = _chat_params(messages, max_tokens, temperature, model)
+
+    async def stream_deltas(timeout: float):
+        client = _budgeted(get_openrouter_async_client())
+        stream = await client.chat.completions.create(stream=True, timeout=timeout, **params)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.response.aclose()
+
+    return _stream_guarded("openrouter", stream_deltas)
+
+
+def _generation_config(json_output: bool):
+    return {"response_mime_type": "application/json"} if json_output else None
+
+
+def gemini_generate(prompt: str, model_name: str = GEMINI_MODEL, json_output: bool = False) -> str:
+    """
+    Runs a single-turn generation on the cached Gemini model. `json_output`
+    turns on Gemini's JSON mode.
+    """
+    response = _call_guarded(
+        "gemini",
+        lambda timeout: get_gemini_model(model_name).generate_content(
+            prompt, generation_config=_generation_config(json_output), request_options={"timeout": timeout}
+        )
+    )
+    return response.text
+
+
+async def gemini_generate_async(prompt: str, model_name: str = GEMINI_MODEL, json_output: bool = False) -> str:
+    """
+    Async counterpart of gemini_generate.
+    """
+    response = await _call_guarded_async(
+        "gemini",
+        lambda timeout: get_gemini_model(model_name).generate_content_async(
+            prompt, generation_config=_generation_config(json_output), request_options={"timeout": timeout}
+        )
+    )
+    return response.text
+
+
+def gemini_chat(history: list, message: str, model_name: str = GEMINI_MODEL) -> str:
+    """
+    Sends `message` on a chat session seeded with Gemini-format `history`.
+    """
+    chat = get_gemini_model(model_name).start_chat(history=history)
+    response = _call_guarded(
+        "gemini",
+        lambda timeout: chat.send_message(message, request_options={"timeout": timeout})
+    )
+    return response.text
+
+
+async def gemini_chat_async(history: list, message: str, model_name: str = GEMINI_MODEL) -> str:
+    chat = get_gemini_model(model_name).start_chat(history=history)
+    response = await _call_guarded_async(
+        "gemini",
+        lambda timeout: chat.send_message_async(message, request_options={"timeout": timeout})
+    )
+    return response.text
+
+
+def gemini_chat_stream_async(history: list, message: str, model_name: str = GEMINI_MODEL):
+    """
+    Streams the chat reply as text chunks.
+    """
+    async def stream_text(timeout: float):
+        chat = get_gemini_model(model_name).start_chat(history=history)
+        response = await chat.send_message_async(message, stream=True, request_options={"timeout": timeout})
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    return _stream_guarded("gemini", stream_text)
+
+
+async def close_gateway():
+    """
+    Releases pooled connections. Called on application shutdown.
+    """
+    global _openrouter_client, _openrouter_async_client
+    with _lock:
+        if _openrouter_client is not None:
+            _openrouter_client.close()
+            _openrouter_client = None
+        _gemini_models.clear()
+    if _openrouter_async_client is not None:
+        await _openrouter_async_client.close()
+        _openrouter_async_client = None
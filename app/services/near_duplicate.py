@@ -0,0 +1,330 @@
+"""
+Near-duplicate reuse of resume analyses.
+
+Many uploads are the same template with a few words changed. Each resume is
+reduced to a MinHash signature of its word shingles and stored in the
+`resume_signatures` table. Resumes that already have an analysis are held in
+an in-memory LSH index (banded MinHash), which is refreshed from the table so
+every worker sees the others' analyses. A new resume whose estimated Jaccard
+similarity to an indexed one reaches NEAR_DUP_THRESHOLD reuses that analysis.
+Skills the local extractor finds in only one of the two resumes are patched
+in or out.
+
+Opt-in with NEAR_DUP_ENABLED. A sample of reuses (NEAR_DUP_AUDIT_RATE) is
+also analyzed from scratch, and the skill overlap between the reused and the
+fresh analysis is tracked as quality drift.
+"""
+import os
+import re
+import copy
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from dotenv import load_dotenv
+from app.database import SessionLocal
+from app.models.cache import ResumeSignature
+from app.services.analysis_cache import normalize_resume_text, peek_analysis, ANALYSIS_CACHE_DB_TTL_DAYS
+from app.utils.skill_extractor import extract_skills, merge_skills
+
+load_dotenv()
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "false").lower() in ("1", "true", "yes")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_AUDIT_RATE = float(os.getenv("NEAR_DUP_AUDIT_RATE", "0.05"))
+# How often each process pulls signatures linked by other workers
+NEAR_DUP_REFRESH_SECONDS = float(os.getenv("NEAR_DUP_REFRESH_SECONDS", "60"))
+
+# Changing any of these invalidates stored signatures
+NUM_PERM = 128
+BANDS = 16  # 16 bands of 8 rows: pairs become candidates from about 0.7 similarity
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+_WORD = re.compile(r"\w+")
+
+_stats_lock = threading.Lock()
+_stats = {
+    "lookups": 0, "reuses": 0, "misses": 0, "stale_sources": 0, "errors": 0,
+    "similarity_total": 0.0, "audits": 0, "drift_total": 0.0
+}
+
+
+def _count(name: str, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def content_hash(resume_text: str) -> str:
+    return hashlib.sha256(normalize_resume_text(resume_text).encode("utf-8")).hexdigest()
+
+
+def shingles(resume_text: str) -> set:
+    """Lowercased word n-grams of the normalized text"""
+    words = _WORD.findall(normalize_resume_text(resume_text).lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(resume_text: str) -> list:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles(resume_text)
+    ]
+    if not hashes:
+        return []
+    return [min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimated_similarity(first: list, second: list) -> float:
+    """Fraction of agreeing MinHash values, an estimate of Jaccard similarity"""
+    if len(first) != len(second) or not first:
+        return 0.0
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+class LSHIndex:
+    """
+    Banded MinHash index: signatures that agree on every value of at least
+    one band are candidates, and candidates are ranked by estimated similarity.
+    """
+
+    def __init__(self):
+        self._buckets = [{} for _ in range(BANDS)]
+        self._entries = {}  # content hash -> (signature, skills, analysis key)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _band_keys(signature: list) -> list:
+        return [hash(tuple(signature[i * ROWS:(i + 1) * ROWS])) for i in range(BANDS)]
+
+    def add(self, key: str, signature: list, skills: list, analysis_key: str):
+        if len(signature) != NUM_PERM:
+            return
+        with self._lock:
+            self._entries[key] = (signature, skills, analysis_key)
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                bucket.setdefault(band_key, set()).add(key)
+
+    def best_match(self, signature: list) -> Optional[tuple]:
+        """(similarity, skills, analysis key) of the closest candidate, or None"""
+        with self._lock:
+            candidates = set()
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                candidates.update(bucket.get(band_key, ()))
+            best = None
+            for key in candidates:
+                stored, skills, analysis_key = self._entries[key]
+                similarity = estimated_similarity(signature, stored)
+                if best is None or similarity > best[0]:
+                    best = (similarity, skills, analysis_key)
+            return best
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _IndexState:
+    def __init__(self):
+        self.index = LSHIndex()
+        self.loaded_until = None
+        self.refreshed_at = None
+
+
+_indexes = {}  # (prompt version, model) -> _IndexState
+_indexes_lock = threading.Lock()
+
+
+def _state_for(prompt_version: str, model: str) -> _IndexState:
+    with _indexes_lock:
+        return _indexes.setdefault((prompt_version, model), _IndexState())
+
+
+def _refresh(state: _IndexState, prompt_version: str, model: str):
+    """Adds signatures linked since the last refresh, possibly by another worker"""
+    since = state.loaded_until
+    if since is None:
+        since = datetime.now(timezone.utc) - timedelta(days=ANALYSIS_CACHE_DB_TTL_DAYS)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ResumeSignature)
+            .filter(
+                ResumeSignature.prompt_version == prompt_version,
+                ResumeSignature.model == model,
+                ResumeSignature.analyzed_at > since
+            )
+            .all()
+        )
+        for row in rows:
+            state.index.add(row.content_hash, row.signature, row.skills, row.analysis_key)
+            if state.loaded_until is None or row.analyzed_at > state.loaded_until:
+                state.loaded_until = row.analyzed_at
+        if state.loaded_until is None:
+            state.loaded_until = since
+    finally:
+        db.close()
+    state.refreshed_at = time.monotonic()
+
+
+def _upsert_signature(db, resume_text: str) -> ResumeSignature:
+    key = content_hash(resume_text)
+    row = db.query(ResumeSignature).filter(ResumeSignature.content_hash == key).first()
+    if row is None:
+        row = ResumeSignature(
+            content_hash=key,
+            signature=minhash_signature(resume_text),
+            skills=extract_skills(resume_text)
+        )
+        db.add(row)
+    return row
+
+
+def record_resume_signature(resume_text: str):
+    """
+    Stores the signature of an uploaded resume, so the analysis that follows
+    only has to link it. Never raises: an upload must not fail over this.
+    """
+    if not NEAR_DUP_ENABLED or not resume_text or not resume_text.strip():
+        return
+    db = SessionLocal()
+    try:
+        _upsert_signature(db, resume_text)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        print(f"Failed to store resume signature: {e}")
+    finally:
+        db.close()
+
+
+def link_analysis(resume_text: str, analysis_key: str, prompt_version: str, model: str):
+    """
+    Marks a freshly analyzed resume as a reuse source, in the table and in
+    this process's index.
+    """
+    if not NEAR_DUP_ENABLED:
+        return
+    db = SessionLocal()
+    try:
+        row = _upsert_signature(db, resume_text)
+        row.analysis_key = analysis_key
+        row.prompt_version = prompt_version
+        row.model = model
+        row.analyzed_at = datetime.now(timezone.utc)
+        db.commit()
+        _state_for(prompt_version, model).index.add(row.content_hash, row.signature, row.skills, analysis_key)
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        print(f"Failed to link resume signature: {e}")
+    finally:
+        db.close()
+
+
+async def link_analysis_async(resume_text: str, analysis_key: str, prompt_version: str, model: str):
+    if NEAR_DUP_ENABLED:
+        await asyncio.to_thread(link_analysis, resume_text, analysis_key, prompt_version, model)
+
+
+def patch_skills(analysis: dict, source_skills: list, target_skills: list) -> dict:
+    """
+    Adapts a near-duplicate's analysis: drops skills only the source resume
+    had, adds skills only the target has, and removes newly present skills
+    from missing_skills.
+    """
+    result = copy.deepcopy(analysis)
+    target = {skill.lower() for skill in target_skills}
+    gone = {skill.lower() for skill in source_skills} - target
+    kept = [
+        skill for skill in result.get("skills") or []
+        if not (isinstance(skill, str) and skill.lower() in gone)
+    ]
+    result["skills"] = merge_skills(kept, target_skills)
+    if isinstance(result.get("missing_skills"), list):
+        present = {skill.lower() for skill in result["skills"]}
+        result["missing_skills"] = [
+            skill for skill in result["missing_skills"]
+            if not (isinstance(skill, str) and skill.lower() in present)
+        ]
+    return result
+
+
+def reuse_near_duplicate(resume_text: str, prompt_version: str, model: str) -> Optional[dict]:
+    """
+    Returns a patched copy of the analysis of a sufficiently similar resume,
+    or None. Never raises.
+    """
+    if not NEAR_DUP_ENABLED:
+        return None
+    _count("lookups")
+    try:
+        state = _state_for(prompt_version, model)
+        if state.refreshed_at is None or time.monotonic() - state.refreshed_at > NEAR_DUP_REFRESH_SECONDS:
+            _refresh(state, prompt_version, model)
+        signature = minhash_signature(resume_text)
+        match = state.index.best_match(signature) if signature else None
+        if match is None or match[0] < NEAR_DUP_THRESHOLD:
+            _count("misses")
+            return None
+        similarity, source_skills, analysis_key = match
+        source = peek_analysis(analysis_key)
+        if source is None:
+            # The source analysis expired from the cache
+            _count("stale_sources")
+            return None
+    except Exception as e:
+        _count("errors")
+        print(f"Near-duplicate lookup failed: {e}")
+        return None
+
+    _count("reuses")
+    _count("similarity_total", similarity)
+    return patch_skills(source, source_skills, extract_skills(resume_text))
+
+
+async def reuse_near_duplicate_async(resume_text: str, prompt_version: str, model: str) -> Optional[dict]:
+    if not NEAR_DUP_ENABLED:
+        return None
+    # Signature hashing is CPU work and the refresh is a DB read; keep both off the loop
+    return await asyncio.to_thread(reuse_near_duplicate, resume_text, prompt_version, model)
+
+
+def should_audit() -> bool:
+    return random.random() < NEAR_DUP_AUDIT_RATE
+
+
+def record_audit(reused: dict, fresh: dict):
+    """
+    Compares a reused analysis against a fresh one for the same resume.
+    Drift is 1 - Jaccard similarity of their skill sets.
+    """
+    reused_skills = {s.lower() for s in reused.get("skills") or [] if isinstance(s, str)}
+    fresh_skills = {s.lower() for s in fresh.get("skills") or [] if isinstance(s, str)}
+    union = reused_skills | fresh_skills
+    drift = 1 - len(reused_skills & fresh_skills) / len(union) if union else 0.0
+    _count("audits")
+    _count("drift_total", drift)
+
+
+def near_duplicate_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    similarity_total = stats.pop("similarity_total")
+    drift_total = stats.pop("drift_total")
+    stats["enabled"] = NEAR_DUP_ENABLED
+    stats["threshold"] = NEAR_DUP_THRESHOLD
+    stats["reuse_rate"] = round(stats["reuses"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+    stats["avg_similarity"] = round(similarity_total / stats["reuses"], 4) if stats["reuses"] else None
+    stats["avg_skill_drift"] = round(drift_total / stats["audits"], 4) if stats["audits"] else None
+    with _indexes_lock:
+        stats["indexed"] = sum(len(state.index) for state in _indexes.values())
+    return stats
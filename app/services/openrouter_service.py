@@ -1,22 +1,18 @@
-from openai import OpenAI
 import json
-import re
-from app.config import OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_BASE_URL
+from app.services.llm_gateway import openrouter_chat, openrouter_chat_stream_async
+from app.services.structured_output import parse_structured, response_format
+from app.services.prompt_budget import compact_resume, fit_history
+from app.schemas.ai_output import ANALYSIS_OUTPUT, ROADMAP_OUTPUT, COUNSELING_OUTPUT
+from app.utils.skill_extractor import extract_skills
 
 def analyze_with_openrouter(resume_text: str) -> dict:
     """
     Analyzes resume using DeepSeek via OpenRouter
     """
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
-        )
-        
         prompt = create_analysis_prompt(resume_text)
         
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
+        raw_content = openrouter_chat(
             messages=[
                 {
                     "role": "system",
@@ -28,10 +24,10 @@ def analyze_with_openrouter(resume_text: str) -> dict:
                 }
             ],
             temperature=0.7,
-            max_tokens=2500
+            max_tokens=2500,
+            response_format=response_format(ANALYSIS_OUTPUT, "resume_analysis")
         )
         
-        raw_content = response.choices[0].message.content
         return parse_ai_response(raw_content, resume_text)
         
     except Exception as e:
@@ -43,7 +39,7 @@ def create_analysis_prompt(resume_text: str) -> str:
     return f"""You are an expert career counselor.  Analyze this resume and provide detailed career guidance.
 
 RESUME TEXT: 
-{resume_text}
+{compact_resume(resume_text, "analysis")}
 
 YOUR TASK:
 1. Extract ALL technical and soft skills mentioned
@@ -72,36 +68,20 @@ IMPORTANT:
 def parse_ai_response(raw_content: str, resume_text: str) -> dict:
     """Parses AI response and validates JSON"""
     try:
-        # Remove markdown code blocks if present
-        cleaned = re.sub(r'```json\n? |\n?```', '', raw_content)
-        data = json.loads(cleaned)
-        
-        # Validate required fields
-        required = ["skills", "experience_level", "top_careers", "roadmap"]
-        for field in required:
-            if field not in data:
-                raise ValueError(f"Missing field: {field}")
-        
-        return data
-        
-    except json. JSONDecodeError: 
-        print("JSON parse failed, using fallback")
+        return parse_structured(raw_content, ANALYSIS_OUTPUT, "analysis")
+    except ValueError as e:
+        print(f"JSON parse failed ({e}), using fallback")
         return create_fallback_response(resume_text)
 
 def create_fallback_response(resume_text: str) -> dict:
     """Creates fallback response if AI fails"""
-    common_skills = [
-        "Python", "JavaScript", "Java", "React", "Node.js", "SQL",
-        "Machine Learning", "Data Analysis", "Communication", "Leadership"
-    ]
-    
-    found_skills = [s for s in common_skills if s. lower() in resume_text.lower()]
+    found_skills = extract_skills(resume_text, limit=15)
     
     if not found_skills:
         found_skills = ["Communication", "Problem Solving", "Teamwork"]
     
     return {
-        "skills": found_skills[: 8],
+        "skills": found_skills,
         "experience_level":  "Intermediate",
         "top_careers":  [
             {"title": "Software Developer", "match_percent": 75},
@@ -115,19 +95,13 @@ def improve_text_with_openrouter(original_text: str) -> str:
     Improves resume text to be more professional and impact-oriented
     """
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
-        )
-        
         prompt = f"""You are a professional resume writer. Rewrite the following text to be more professional, actionable, and result-oriented. Use strong action verbs.
         
         Original Text: "{original_text}"
         
         Rewritten Text (Return ONLY the rewritten text, nothing else):"""
         
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
+        raw_content = openrouter_chat(
             messages=[
                 {"role": "system", "content": "You are a professional resume editor."},
                 {"role": "user", "content": prompt}
@@ -136,7 +110,7 @@ def improve_text_with_openrouter(original_text: str) -> str:
             max_tokens=500
         )
         
-        return response.choices[0].message.content.strip()
+        return raw_content.strip()
         
     except Exception as e:
         print(f"OpenRouter Improve Text Error: {str(e)}")
@@ -148,11 +122,6 @@ def generate_roadmap_with_openrouter(profile_data: dict, duration_weeks: int = 8
     Generates a personalized learning roadmap based on user profile
     """
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
-        )
-        
         prompt = f"""Create a highly detailed {duration_weeks}-week learning roadmap for this student to become a "{profile_data.get('careerGoals', 'Tech Professional')}".
         Profile: {json.dumps(profile_data)}
         
@@ -177,19 +146,17 @@ def generate_roadmap_with_openrouter(profile_data: dict, duration_weeks: int = 8
         }}
         """
         
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
+        raw_content = openrouter_chat(
             messages=[
                 {"role": "system", "content": "You are a senior technical mentor. Provide concrete, clickable resource names. Return valid JSON only."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=3000
+            max_tokens=3000,
+            response_format=response_format(ROADMAP_OUTPUT, "learning_roadmap")
         )
         
-        raw_content = response.choices[0].message.content
-        cleaned = re.sub(r'```json\n?|\n?```', '', raw_content)
-        return json.loads(cleaned)
+        return parse_structured(raw_content, ROADMAP_OUTPUT, "roadmap")
         
     except Exception as e:
         print(f"OpenRouter Roadmap Error: {str(e)}")
@@ -207,11 +174,6 @@ def get_career_counseling_with_openrouter(answers: dict) -> dict:
     Analyzes user's 'Simulation' answers to suggest a career.
     """
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
-        )
-        
         prompt = f"""Analyze this student's thinking style based on these 3 scenarios to suggest the PERFECT tech career.
         
         1. THE BLANK PAGE TEST (Visual vs Logical):
@@ -240,19 +202,17 @@ def get_career_counseling_with_openrouter(answers: dict) -> dict:
         }}
         """
         
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
+        raw_content = openrouter_chat(
             messages=[
                 {"role": "system", "content": "You are a career psychologist. Return valid JSON only."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            response_format=response_format(COUNSELING_OUTPUT, "career_counseling")
         )
         
-        raw_content = response.choices[0].message.content
-        cleaned = re.sub(r'```json\n?|\n?```', '', raw_content)
-        return json.loads(cleaned)
+        return parse_structured(raw_content, COUNSELING_OUTPUT, "counseling")
         
     except Exception as e:
         print(f"OpenRouter Counselor Error: {str(e)}")
@@ -262,4 +222,26 @@ def get_career_counseling_with_openrouter(answers: dict) -> dict:
             "suggested_role": "Software Engineer",
             "reasoning": "You show a balance of logic and problem solving.",
             "recommended_path": "General Computer Science Foundation"
-        }
\ No newline at end of file
+        }
+
+async def stream_chat_with_openrouter_async(message: str, history: list, user_context: dict):
+    """
+    Streams the mentor reply from OpenRouter as text chunks
+    """
+    context = json.dumps(user_context) if user_context else "No profile available."
+    messages = [
+        {"role": "system", "content": f"You are a friendly, practical AI Career Mentor. Keep answers concise and actionable.\nUSER PROFILE: {context}"}
+    ]
+    for item in fit_history(history):
+        if not item.get("content"):
+            continue
+        role = "assistant" if item.get("role") in ("model", "assistant") else "user"
+        messages.append({"role": role, "content": item["content"]})
+    messages.append({"role": "user", "content": message})
+
+    stream = openrouter_chat_stream_async(messages=messages, temperature=0.7, max_tokens=1500)
+    try:
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()
@@ -0,0 +1,173 @@
+"""
+Prompt budgets.
+
+Resume and profile text is the bulk of every prompt's input tokens. Before it
+is embedded, it is compacted: whitespace is normalized, contact details,
+page furniture and repeated header/footer lines are stripped, and the result
+is cut to the endpoint's token budget at a line boundary. Chat history is
+trimmed from the oldest turn. Tokens are estimated locally. The estimate
+tracks BPE tokenizers closely enough for budgeting English text. Every call
+logs the tokens it saved, and per-endpoint totals are on /health.
+"""
+import os
+import re
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROMPT_BUDGETS = {
+    "analysis": int(os.getenv("PROMPT_BUDGET_ANALYSIS", "3000")),
+    "roadmap": int(os.getenv("PROMPT_BUDGET_ROADMAP", "600")),
+    "chat_context": int(os.getenv("PROMPT_BUDGET_CHAT_CONTEXT", "600")),
+    "chat_history": int(os.getenv("PROMPT_BUDGET_CHAT_HISTORY", "2000")),
+}
+PROMPT_BUDGET_LOG = os.getenv("PROMPT_BUDGET_LOG", "true").lower() in ("1", "true", "yes")
+
+TRUNCATION_MARK = "[...]"
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_URL = re.compile(r"(?:https?://|www\.)\S+|\b(?:linkedin|github|gitlab|behance|dribbble)\.com/\S*", re.IGNORECASE)
+_PHONE = re.compile(r"(?<!\w)\+?\(?\d[\d\s().-]{7,}\d(?!\w)")
+# Fewer digits than this is a number in the text, not a phone number
+MIN_PHONE_DIGITS = 10
+# Employment dates ("06.2019 - 08.2021", "2016 - 2018 2018 - 2020") have the
+# phone pattern's shape and digit count; they are kept for the experience level
+_DATE = r"(?:(?:0?[1-9]|1[0-2])[./])?(?:19|20)\d{2}"
+_DATE_RUN = re.compile(rf"^[\s().-]*{_DATE}(?:[\s().-]+{_DATE})*[\s().-]*$")
+_PAGE_LINE = re.compile(r"^(?:page\s*\d+(?:\s*(?:of|/)\s*\d+)?|-\s*\d+\s*-|\d+\s*/\s*\d+)$", re.IGNORECASE)
+_BOILERPLATE_LINE = re.compile(
+    r"^(?:references?\s+(?:are\s+)?available(?:\s+up)?on\s+request\.?|curriculum\s+vitae|resume|r[eé]sum[eé]|cv)$",
+    re.IGNORECASE
+)
+_SEPARATORS_ONLY = re.compile(r"^[\s|•·,;:/\\-]*$")
+_BULLET = re.compile(r"^[•●▪◦■►✓*]+\s*")
+# Repeats of lines at least this long are page headers/footers or copy-paste duplicates
+MIN_DEDUPE_LINE = 20
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local token estimate: a word is one token plus one per 8 letters, a
+    number one per 3 digits, and each symbol one.
+    """
+    if not text:
+        return 0
+    total = 0
+    for piece in _TOKEN.findall(text):
+        if piece[0].isalpha():
+            total += 1 + len(piece) // 8
+        elif piece[0].isdigit():
+            total += 1 + (len(piece) - 1) // 3
+        else:
+            total += 1
+    return total
+
+
+def _record(endpoint: str, before: int, after: int):
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, {"calls": 0, "tokens_before": 0, "tokens_after": 0})
+        stats["calls"] += 1
+        stats["tokens_before"] += before
+        stats["tokens_after"] += after
+    if PROMPT_BUDGET_LOG and before > after:
+        print(f"Prompt budget [{endpoint}]: {before} -> {after} input tokens (saved {before - after})")
+
+
+def _drop_phone(match) -> str:
+    text = match.group(0)
+    if _DATE_RUN.match(text):
+        return text
+    digits = sum(ch.isdigit() for ch in text)
+    return "" if digits >= MIN_PHONE_DIGITS else text
+
+
+def strip_boilerplate(text: str) -> list:
+    """
+    Normalized, non-boilerplate lines of a resume, repeated lines dropped
+
+    >>> strip_boilerplate("Call +1 (555) 123-4567 or jane@example.com")
+    ['Call or']
+    >>> strip_boilerplate("Backend Developer, Acme GmbH 06.2019 - 08.2021")
+    ['Backend Developer, Acme GmbH 06.2019 - 08.2021']
+    >>> strip_boilerplate("Data Analyst (01.2017 - 05.2019)")
+    ['Data Analyst (01.2017 - 05.2019)']
+    >>> strip_boilerplate("Experience 2016 - 2018 2018 - 2020")
+    ['Experience 2016 - 2018 2018 - 2020']
+    """
+    lines = []
+    seen = set()
+    for raw in (text or "").splitlines():
+        line = _EMAIL.sub("", raw)
+        line = _URL.sub("", line)
+        line = _PHONE.sub(_drop_phone, line)
+        line = _BULLET.sub("- ", line.strip())
+        line = re.sub(r"\s+", " ", line).strip()
+        if _SEPARATORS_ONLY.match(line) or _PAGE_LINE.match(line) or _BOILERPLATE_LINE.match(line):
+            continue
+        if len(line) >= MIN_DEDUPE_LINE:
+            key = line.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def fit_lines(lines: list, budget: int) -> str:
+    """Joins lines in order until the next one would exceed `budget` tokens"""
+    kept = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            kept.append(TRUNCATION_MARK)
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def compact_resume(text: str, endpoint: str) -> str:
+    """
+    Resume text ready to embed in `endpoint`'s prompt, within its budget.
+    """
+    if not text:
+        return text
+    compacted = fit_lines(strip_boilerplate(text), PROMPT_BUDGETS[endpoint])
+    _record(endpoint, count_tokens(text), count_tokens(compacted))
+    return compacted
+
+
+def fit_history(history: list, endpoint: str = "chat_history") -> list:
+    """
+    The most recent chat turns ({"role", "content"}) that fit the budget,
+    oldest first as given.
+    """
+    history = history or []
+    budget = PROMPT_BUDGETS[endpoint]
+    kept = []
+    used = 0
+    for item in reversed(history):
+        cost = count_tokens(item.get("content") or "")
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    kept.reverse()
+    if len(kept) < len(history):
+        before = used + sum(count_tokens(item.get("content") or "") for item in history[:len(history) - len(kept)])
+        _record(endpoint, before, used)
+    return kept
+
+
+def prompt_budget_stats() -> dict:
+    with _stats_lock:
+        stats = {endpoint: dict(values) for endpoint, values in _stats.items()}
+    for values in stats.values():
+        values["tokens_saved"] = values["tokens_before"] - values["tokens_after"]
+    return {"budgets": dict(PROMPT_BUDGETS), "endpoints": stats}
@@ -0,0 +1,254 @@
+"""
+Prompt registry.
+
+Every LLM prompt is a versioned template in two parts. The system block holds
+all the static instructions, rules and output format, and never changes
+between requests. The user block holds only the request data and comes
+last. Providers that cache prompt prefixes (OpenRouter routes to OpenAI,
+DeepSeek and Anthropic models; Gemini implicit caching) can then reuse the
+instructions across users. That only works while the system block is
+byte-for-byte stable, so it is never formatted.
+
+Templates are compiled once at import: the user block's placeholders are
+parsed and checked, and the system block is hashed. prompt_version() joins
+the declared version with that hash, so analysis caches and roadmap
+templates keyed on it stop matching whenever the wording changes, even if
+nobody bumps the declared version.
+"""
+import hashlib
+import string
+from app.services.prompt_budget import count_tokens
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:8]
+
+
+class PromptTemplate:
+    def __init__(self, name: str, version: str, system: str, user: str):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+        self.fields = frozenset(
+            field for _, field, _, _ in string.Formatter().parse(user) if field is not None
+        )
+        if any(not field.isidentifier() for field in self.fields):
+            raise ValueError(f"Prompt {name}: placeholders must be plain names, got {sorted(self.fields)}")
+        self.digest = _digest(system, user)
+        self.full_version = f"{version}+{self.digest}"
+        self.prefix_tokens = count_tokens(system)
+
+    def render_user(self, values: dict) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise ValueError(f"Prompt {self.name} is missing values for {sorted(missing)}")
+        return self.user.format_map(values)
+
+    def messages(self, **values) -> list:
+        """Chat messages: the static system block, then the request data"""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.render_user(values)}
+        ]
+
+    def text(self, **values) -> str:
+        """Single-string form for providers called with one prompt (Gemini)"""
+        return f"{self.system}\n\n{self.render_user(values)}"
+
+
+_registry = {}
+
+
+def register(name: str, version: str, system: str, user: str) -> PromptTemplate:
+    if name in _registry:
+        raise ValueError(f"Prompt {name} is already registered")
+    template = PromptTemplate(name, version, system.strip(), user.strip())
+    _registry[name] = template
+    return template
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return _registry[name]
+
+
+def prompt_version(*names: str) -> str:
+    """
+    Cache-key version for one prompt, or for a group of prompts that
+    produce the same kind of result (e.g. the single-call and chunked
+    roadmap prompts). Short enough for the prompt_version columns.
+    """
+    templates = [_registry[name] for name in names]
+    if len(templates) == 1:
+        return templates[0].full_version
+    return f"{templates[0].version}+{_digest(*(t.full_version for t in templates))}"
+
+
+def prompt_registry_stats() -> dict:
+    return {
+        name: {"version": template.full_version, "prefix_tokens": template.prefix_tokens}
+        for name, template in _registry.items()
+    }
+
+
+# ===== Templates =====
+# System blocks are static; anything that varies per request goes in the user block.
+
+register(
+    "analysis", "analysis-v4",
+    system="""You are an expert career counselor. Analyze the resume/profile text the user sends and provide detailed career guidance that is STRICTLY based on the user's provided skills and interests.
+
+YOUR TASK:
+1. Extract ALL skills (technical, vocational, soft, or domain-specific) mentioned. If the message lists ALREADY DETECTED SKILLS, those are added to the result automatically: report only the ones it missed.
+2. Determine experience level (Beginner/Intermediate/Advanced) based on the context of their specific field.
+3. RATE the profile (0-100) based on clarity and evidence of expertise in their chosen area.
+4. Identify KEY MISSING skills that the user needs to progress or excel in their specific field of interest.
+5. Recommend 2-3 career paths that ACCURATELY reflect the user's field.
+   - DO NOT map unrelated careers (e.g., if they are a chef, don't suggest web development).
+   - If they are in a non-technical field (e.g., chef, craftsmen, artist), suggest careers strictly within that domain.
+6. Create a BRIEF summary of next steps tailored to their specific industry.
+
+OUTPUT FORMAT (strict JSON):
+{
+  "skills": ["skill1", "skill2", "skill3"],
+  "score": 85,
+  "missing_skills": ["Specific Field Skill 1", "Specific Field Skill 2"],
+  "experience_level": "Beginner/Intermediate/Advanced",
+  "top_careers": [
+    {"title": "Role matching their skills", "match_percent": 85},
+    {"title": "Specialized role in their field", "match_percent": 75}
+  ],
+  "roadmap": "Focus on mastering [Specific Skill] and gaining experience in [Specific Area]. Consider [Industry-specific recommendation]."
+}
+
+IMPORTANT: Return ONLY valid JSON. Be field-agnostic and honor the user's unique background.""",
+    user="""RESUME/PROFILE TEXT:
+{resume_text}
+{detected_skills}"""
+)
+
+_ROADMAP_FIELD_RULE = "Do NOT assume the user is in the tech/computer field unless their data explicitly says so."
+
+register(
+    "roadmap", "roadmap-v4",
+    system=f"""You are a senior technical mentor. Create a highly detailed learning roadmap aimed at the target goal and duration the user sends. Return valid JSON only.
+
+REQUIREMENTS:
+1. Career Goal: Identify the specific role and industry based STRICTLY on the user's provided skills and interests (e.g., if they mentioned 'knife skills' and 'cooking', they are in the Culinary field).
+2. For EACH WEEK of the requested duration, provide:
+   - Topic: Main theme relevant to THEIR field.
+   - Tasks: 3 actionable steps (e.g., practice a craft, master a specific tool, study a domain concept).
+   - Resources: 2 SPECIFIC learning resources (titles or clickable-style search queries).
+3. {_ROADMAP_FIELD_RULE}
+4. If RESUME CONTEXT is given, tailor the roadmap level to the skills it shows.
+
+OUTPUT JSON:
+{{
+    "career_goal": "The Specific Role Identified",
+    "weeks": [
+        {{
+            "week": 1,
+            "topic": "Topic relevant to THEIR specific field",
+            "tasks": ["Actionable step 1", "Actionable step 2", "Actionable step 3"],
+            "resources": ["Specific Resource 1", "Specific Resource 2"]
+        }}
+    ]
+}}""",
+    user="""TARGET GOAL: "{career_goal}"
+DURATION: {duration_weeks} weeks
+
+USER PROFILE DATA:
+{profile}
+{resume_context}"""
+)
+
+register(
+    "roadmap_outline", "roadmap-outline-v2",
+    system=f"""You are a senior technical mentor. Plan a learning roadmap aimed at the target goal and duration the user sends. Return valid JSON only.
+
+REQUIREMENTS:
+1. Career Goal: Identify the specific role and industry based STRICTLY on the user's provided skills and interests.
+2. Split the roadmap into exactly the consecutive phases the user lists, one per week range, in order. Each phase builds on the previous one.
+3. {_ROADMAP_FIELD_RULE}
+
+OUTPUT JSON:
+{{
+    "career_goal": "The Specific Role Identified",
+    "phases": [
+        {{"weeks": "1-6", "title": "Phase title", "focus": "One sentence on what this phase covers"}}
+    ]
+}}""",
+    user="""TARGET GOAL: "{career_goal}"
+DURATION: {duration_weeks} weeks
+PHASES: {phase_count}, covering weeks {ranges}
+
+USER PROFILE DATA:
+{profile}"""
+)
+
+register(
+    "roadmap_block", "roadmap-block-v2",
+    system="""You are a senior technical mentor writing one phase of a longer learning roadmap. Return valid JSON only.
+
+Write ONLY the weeks of the phase the user asks for, numbered within that range.
+For EACH WEEK, provide:
+- Topic: Main theme of the week, building on earlier phases without repeating them.
+- Tasks: 3 actionable steps.
+- Resources: 2 SPECIFIC learning resources (titles or clickable-style search queries).
+
+OUTPUT JSON:
+{
+    "weeks": [
+        {
+            "week": 1,
+            "topic": "Topic",
+            "tasks": ["Actionable step 1", "Actionable step 2", "Actionable step 3"],
+            "resources": ["Specific Resource 1", "Specific Resource 2"]
+        }
+    ]
+}""",
+    user="""CAREER GOAL: "{career_goal}" ({duration_weeks}-week roadmap)
+
+FULL PLAN:
+{plan}
+
+USER PROFILE DATA:
+{profile}
+
+WRITE: weeks {start}-{end} ({week_count} weeks), the phase "{title}": {focus}"""
+)
+
+register(
+    "roadmap_personalize", "roadmap-personalize-v2",
+    system="""You are a senior technical mentor. The user sends a standard learning roadmap outline and a learner profile. Adapt the roadmap to this learner. Return valid JSON only.
+
+Replace the tasks of any week that covers what the learner already knows with 3 deeper tasks on the same topic, or tie tasks to their background where that helps. Leave other weeks out.
+
+OUTPUT JSON:
+{"weeks": [{"week": 2, "tasks": ["Task 1", "Task 2", "Task 3"]}]}
+Return {"weeks": []} if no week needs to change.""",
+    user="""CAREER GOAL: "{career_goal}"
+
+LEARNER:
+{learner}
+
+ROADMAP OUTLINE:
+{outline}"""
+)
+
+register(
+    "counseling", "counselor-v2",
+    system="""Career psychologist. Analyze the career archetype from the quiz answers the user sends. JSON only.
+Output JSON: { "archetype": "...", "suggested_role": "...", "reasoning": "...", "recommended_path": "..." }""",
+    user="""ANSWERS: {answers}"""
+)
+
+register(
+    "improve_batch", "improve-batch-v1",
+    system="""You are a professional resume writer. Rewrite each of the texts the user sends to be more professional, actionable, and result-oriented. Use strong action verbs. Keep each rewrite about as long as its original and do not invent facts.
+
+Return valid JSON only, with exactly one entry per input text, using its id:
+{"items": [{"id": 1, "text": "Rewritten text"}]}""",
+    user="""TEXTS:
+{items}"""
+)
@@ -1,90 +1,494 @@
-from openai import OpenAI
-import json
+import os
 import re
-from app.config import OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_BASE_URL
+import json
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.services.llm_gateway import openrouter_chat, openrouter_chat_async, openrouter_chat_stream_async
+from app.services.structured_output import (
+    parse_structured, parse_structured_partial, parse_json_reply, parse_json_reply_partial, response_format, json_mode
+)
+from app.schemas.ai_output import ROADMAP_OUTPUT, COUNSELING_OUTPUT
+from app.utils.json_stream import JsonArrayItemStream
+from app.utils.json_repair import parse_llm_json
+from app.utils.skill_extractor import extract_skills
+from app.services.prompt_budget import compact_resume
+from app.services.prompt_registry import get_prompt, prompt_version
+
+load_dotenv()
+
+# Changes with any roadmap prompt's text; stored roadmap templates are keyed on it
+ROADMAP_PROMPT_VERSION = prompt_version("roadmap", "roadmap_outline", "roadmap_block")
+
+# Longer roadmaps are planned as a phase outline plus week blocks generated in parallel
+ROADMAP_SINGLE_CALL_MAX_WEEKS = int(os.getenv("ROADMAP_SINGLE_CALL_MAX_WEEKS", "8"))
+ROADMAP_CHUNK_WEEKS = int(os.getenv("ROADMAP_CHUNK_WEEKS", "6"))
+ROADMAP_CHUNK_CONCURRENCY = int(os.getenv("ROADMAP_CHUNK_CONCURRENCY", "6"))
 
 def generate_roadmap_impl(profile_data: dict, duration_weeks: int = 8) -> dict:
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
+        if duration_weeks > ROADMAP_SINGLE_CALL_MAX_WEEKS:
+            return generate_chunked_roadmap(profile_data, duration_weeks)
+        raw_content = openrouter_chat(
+            messages=create_roadmap_messages(profile_data, duration_weeks),
+            temperature=0.7,
+            max_tokens=3000,
+            response_format=response_format(ROADMAP_OUTPUT, "learning_roadmap")
         )
-        
-        resume_context = ""
-        if profile_data.get('resume_content'):
-             resume_context = f"\nRESUME CONTEXT:\n{profile_data['resume_content'][:2000]}...\n(Tailor the roadmap level based on these existing skills)"
-
-        prompt = f"""Create a highly detailed {duration_weeks}-week learning roadmap aimed at achieving the following target goal: "{profile_data.get('careerGoals', 'the user-defined field')}".
-
-USER PROFILE DATA: 
-{json.dumps(profile_data)}
-{resume_context}
-
-REQUIREMENTS:
-1. Career Goal: Identify the specific role and industry based STRICTLY on the user's provided skills and interests (e.g., if they mentioned 'knife skills' and 'cooking', they are in the Culinary field).
-2. For EACH WEEK ({duration_weeks} total), provide:
-   - Topic: Main theme relevant to THEIR field.
-   - Tasks: 3 actionable steps (e.g., practice a craft, master a specific tool, study a domain concept).
-   - Resources: 2 SPECIFIC learning resources (titles or clickable-style search queries).
-3. Do NOT assume the user is in the tech/computer field unless their data explicitly says so.
-
-OUTPUT JSON:
-{{
-    "career_goal": "The Specific Role Identified",
-    "weeks": [
-        {{
-            "week": 1, 
-            "topic": "Topic relevant to THEIR specific field", 
-            "tasks": ["Actionable step 1", "Actionable step 2", "Actionable step 3"],
-            "resources": ["Specific Resource 1", "Specific Resource 2"]
-        }}
-    ]
-}}
-"""
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a senior technical mentor. Return valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
+        return parse_roadmap_reply(raw_content, duration_weeks)
+
+    except Exception as e:
+        print(f"Roadmap Error: {str(e)}")
+        return create_fallback_roadmap()
+
+async def generate_roadmap_impl_async(profile_data: dict, duration_weeks: int = 8) -> dict:
+    try:
+        if duration_weeks > ROADMAP_SINGLE_CALL_MAX_WEEKS:
+            return await generate_chunked_roadmap_async(profile_data, duration_weeks)
+        raw_content = await openrouter_chat_async(
+            messages=create_roadmap_messages(profile_data, duration_weeks),
             temperature=0.7,
-            max_tokens=3000
+            max_tokens=3000,
+            response_format=response_format(ROADMAP_OUTPUT, "learning_roadmap")
         )
-        
-        raw_content = response.choices[0].message.content
-        cleaned = re.sub(r'```json\n?|\n?```', '', raw_content).strip()
-        return json.loads(cleaned)
-        
+        return parse_roadmap_reply(raw_content, duration_weeks)
+
     except Exception as e:
         print(f"Roadmap Error: {str(e)}")
-        return {
-            "career_goal": "Software Engineering",
-            "weeks": [
-                {"week": 1, "topic": "Foundations", "tasks": ["Review Core Concepts"], "resources": ["Official Documentation"]}
-            ]
+        return create_fallback_roadmap()
+
+def parse_roadmap_reply(raw_content: str, duration_weeks: int) -> dict:
+    """
+    Single-call roadmap reply. One cut off at max_tokens loses its last,
+    partial week, and the weeks it never reached are listed in
+    `incomplete_weeks`, as merge_blocks does for padded weeks.
+    """
+    roadmap, truncated = parse_structured_partial(raw_content, ROADMAP_OUTPUT, "roadmap")
+    if not truncated:
+        return roadmap
+    weeks = roadmap["weeks"][:-1]
+    if not weeks:
+        raise ValueError("Truncated roadmap output has no complete week")
+    roadmap["weeks"] = weeks
+    roadmap["incomplete_weeks"] = list(range(len(weeks) + 1, max(duration_weeks, len(weeks) + 1) + 1))
+    return roadmap
+
+async def stream_roadmap_impl_async(profile_data: dict, duration_weeks: int = 8):
+    """
+    Streams roadmap generation. Yields ("week", week) for each weeks[i] object
+    as soon as the model closes it, then ("done", roadmap) with the full document.
+    If the reply is cut off or fails, the roadmap has only the weeks already
+    sent, and the rest are listed in `incomplete_weeks`, like merge_blocks.
+    """
+    if duration_weeks > ROADMAP_SINGLE_CALL_MAX_WEEKS:
+        async for event in stream_chunked_roadmap_async(profile_data, duration_weeks):
+            yield event
+        return
+
+    scanner = JsonArrayItemStream("weeks")
+    streamed = []
+    complete = True
+    try:
+        async for delta in openrouter_chat_stream_async(
+            messages=create_roadmap_messages(profile_data, duration_weeks),
+            temperature=0.7,
+            max_tokens=3000
+        ):
+            for week in scanner.feed(delta):
+                if is_model_week(week):
+                    streamed.append(week)
+                    yield "week", week
+    except Exception as e:
+        print(f"Roadmap Stream Error: {str(e)}")
+        complete = False
+
+    roadmap = None
+    if complete:
+        try:
+            roadmap = parse_structured(scanner.text, ROADMAP_OUTPUT, "roadmap")
+        except ValueError:
+            pass
+    if roadmap is None:
+        # Cut off, failed or malformed: only the weeks the client already has count
+        if not streamed:
+            roadmap = create_fallback_roadmap()
+            for week in roadmap["weeks"]:
+                yield "week", week
+        else:
+            goal = re.search(r'"career_goal"\s*:\s*("(?:[^"\\]|\\.)*")', scanner.text)
+            roadmap = {
+                "career_goal": json.loads(goal.group(1)) if goal else create_fallback_roadmap()["career_goal"],
+                "weeks": streamed,
+                "incomplete_weeks": list(range(len(streamed) + 1, max(duration_weeks, len(streamed) + 1) + 1))
+            }
+    yield "done", roadmap
+
+def create_roadmap_messages(profile_data: dict, duration_weeks: int) -> list:
+    # The resume goes in once, compacted, rather than also inside the profile JSON
+    profile_fields = {key: value for key, value in profile_data.items() if key != "resume_content"}
+    resume_context = ""
+    if profile_data.get('resume_content'):
+         resume_context = f"\nRESUME CONTEXT:\n{compact_resume(profile_data['resume_content'], 'roadmap')}"
+
+    return get_prompt("roadmap").messages(
+        career_goal=profile_data.get('careerGoals', 'the user-defined field'),
+        duration_weeks=duration_weeks,
+        profile=json.dumps(profile_fields),
+        resume_context=resume_context
+    )
+
+def week_blocks(duration_weeks: int) -> list:
+    """[(first_week, last_week), ...] covering the roadmap in ROADMAP_CHUNK_WEEKS steps"""
+    return [
+        (start, min(start + ROADMAP_CHUNK_WEEKS - 1, duration_weeks))
+        for start in range(1, duration_weeks + 1, ROADMAP_CHUNK_WEEKS)
+    ]
+
+def chunk_profile(profile_data: dict) -> dict:
+    """
+    Profile data for the outline and block prompts: the resume is reduced to
+    its detected skills, since every block would otherwise repeat it.
+    """
+    data = {key: value for key, value in profile_data.items() if key != "resume_content"}
+    if profile_data.get("resume_content"):
+        data["resume_skills"] = extract_skills(profile_data["resume_content"], limit=30)
+    return data
+
+def create_outline_messages(profile_data: dict, duration_weeks: int, blocks: list) -> list:
+    return get_prompt("roadmap_outline").messages(
+        career_goal=profile_data.get('careerGoals', 'the user-defined field'),
+        duration_weeks=duration_weeks,
+        phase_count=len(blocks),
+        ranges=", ".join(f"{start}-{end}" for start, end in blocks),
+        profile=json.dumps(chunk_profile(profile_data))
+    )
+
+def create_block_messages(profile_data: dict, outline: dict, blocks: list, index: int) -> list:
+    start, end = blocks[index]
+    phase = outline["phases"][index]
+    plan = "\n".join(
+        f"Weeks {s}-{e}: {p['title']} - {p['focus']}"
+        for (s, e), p in zip(blocks, outline["phases"])
+    )
+    return get_prompt("roadmap_block").messages(
+        career_goal=outline['career_goal'],
+        duration_weeks=blocks[-1][1],
+        plan=plan,
+        profile=json.dumps(chunk_profile(profile_data)),
+        start=start,
+        end=end,
+        week_count=end - start + 1,
+        title=phase['title'],
+        focus=phase['focus']
+    )
+
+def outline_max_tokens(blocks: list) -> int:
+    return 200 + 120 * len(blocks)
+
+def block_max_tokens(block: tuple) -> int:
+    return min(3000, 300 + 300 * (block[1] - block[0] + 1))
+
+def parse_outline(raw_content, profile_data: dict, blocks: list) -> dict:
+    """
+    Validated outline with exactly one phase per block. Missing or malformed
+    parts (or a failed outline call, raw_content=None) get generic phases.
+    """
+    try:
+        data, truncated = parse_json_reply_partial(raw_content, "roadmap_outline") if raw_content else ({}, False)
+    except ValueError:
+        data, truncated = {}, False
+    if not isinstance(data, dict):
+        data = {}
+    goal = data.get("career_goal")
+    if not isinstance(goal, str) or not goal.strip():
+        goal = profile_data.get("careerGoals") or profile_data.get("goals") or create_fallback_roadmap()["career_goal"]
+    phases = data.get("phases") if isinstance(data.get("phases"), list) else []
+    if truncated:
+        # The last phase may end mid-sentence; it gets a generic one instead
+        phases = phases[:-1]
+
+    outline = {"career_goal": goal, "phases": []}
+    for i, (start, end) in enumerate(blocks):
+        phase = phases[i] if i < len(phases) and isinstance(phases[i], dict) else {}
+        title = phase.get("title") if isinstance(phase.get("title"), str) and phase["title"].strip() else f"Weeks {start}-{end}"
+        focus = phase.get("focus") if isinstance(phase.get("focus"), str) and phase["focus"].strip() else f"Continue building toward {goal}"
+        outline["phases"].append({"title": title, "focus": focus})
+    return outline
+
+def clean_week(item, number: int, phase: dict) -> dict:
+    item = item if isinstance(item, dict) else {}
+    topic = item.get("topic")
+    if not isinstance(topic, str) or not topic.strip():
+        topic = phase["title"]
+    tasks = [t for t in item.get("tasks") or [] if isinstance(t, str) and t.strip()] or [phase["focus"]]
+    resources = [r for r in item.get("resources") or [] if isinstance(r, str) and r.strip()]
+    return {"week": number, "topic": topic, "tasks": tasks, "resources": resources}
+
+def is_model_week(item) -> bool:
+    """A week the model actually wrote: a topic and at least one task"""
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("topic"), str) and bool(item["topic"].strip())
+        and any(isinstance(t, str) and t.strip() for t in item.get("tasks") or [])
+    )
+
+def parse_block(raw_content, block: tuple, phase: dict) -> tuple:
+    """
+    Exactly the block's weeks, renumbered in order, and the numbers of the
+    weeks that had to be padded. A failed block (raw_content=None), an
+    unparseable or truncated reply, or missing weeks are filled from the
+    phase outline so one bad chunk never invalidates the whole roadmap.
+    """
+    try:
+        data, truncated = parse_json_reply_partial(raw_content, "roadmap_block") if raw_content else ({}, False)
+    except ValueError:
+        data, truncated = {}, False
+    items = data.get("weeks") if isinstance(data, dict) and isinstance(data.get("weeks"), list) else []
+    if truncated and items:
+        # The reply was cut off inside its last week
+        items = items[:-1]
+    start, end = block
+    weeks = []
+    padded = []
+    for i, number in enumerate(range(start, end + 1)):
+        item = items[i] if i < len(items) else None
+        if not is_model_week(item):
+            padded.append(number)
+        weeks.append(clean_week(item, number, phase))
+    return weeks, padded
+
+def merge_blocks(outline: dict, blocks: list, raw_blocks: list) -> dict:
+    """
+    Joins block results into one roadmap. Every week filled from the
+    outline is listed in `incomplete_weeks`; raises if the model wrote none.
+    """
+    weeks = []
+    incomplete = []
+    for block, phase, raw in zip(blocks, outline["phases"], raw_blocks):
+        block_weeks, padded = parse_block(raw, block, phase)
+        weeks.extend(block_weeks)
+        incomplete.extend(padded)
+    if len(incomplete) == len(weeks):
+        raise ValueError("No roadmap block produced usable weeks")
+    roadmap = {"career_goal": outline["career_goal"], "weeks": weeks}
+    if incomplete:
+        roadmap["incomplete_weeks"] = incomplete
+    return roadmap
+
+def generate_chunked_roadmap(profile_data: dict, duration_weeks: int) -> dict:
+    """
+    Outline first, then every week block concurrently on worker threads.
+    Total latency is about one outline call plus the slowest block.
+    """
+    blocks = week_blocks(duration_weeks)
+    try:
+        raw_outline = openrouter_chat(
+            messages=create_outline_messages(profile_data, duration_weeks, blocks),
+            temperature=0.5,
+            max_tokens=outline_max_tokens(blocks),
+            response_format=json_mode()
+        )
+    except Exception as e:
+        print(f"Roadmap outline error: {str(e)}")
+        raw_outline = None
+    outline = parse_outline(raw_outline, profile_data, blocks)
+
+    def generate_block(index: int):
+        try:
+            return openrouter_chat(
+                messages=create_block_messages(profile_data, outline, blocks, index),
+                temperature=0.7,
+                max_tokens=block_max_tokens(blocks[index]),
+                response_format=json_mode()
+            )
+        except Exception as e:
+            print(f"Roadmap block {blocks[index]} error: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(ROADMAP_CHUNK_CONCURRENCY, len(blocks))) as pool:
+        # Each block runs in a copy of this context so the request deadline applies
+        futures = [pool.submit(contextvars.copy_context().run, generate_block, i) for i in range(len(blocks))]
+        raw_blocks = [future.result() for future in futures]
+    return merge_blocks(outline, blocks, raw_blocks)
+
+async def _outline_async(profile_data: dict, duration_weeks: int, blocks: list) -> dict:
+    try:
+        raw_outline = await openrouter_chat_async(
+            messages=create_outline_messages(profile_data, duration_weeks, blocks),
+            temperature=0.5,
+            max_tokens=outline_max_tokens(blocks),
+            response_format=json_mode()
+        )
+    except Exception as e:
+        print(f"Roadmap outline error: {str(e)}")
+        raw_outline = None
+    return parse_outline(raw_outline, profile_data, blocks)
+
+def _start_blocks(profile_data: dict, outline: dict, blocks: list) -> list:
+    slots = asyncio.Semaphore(ROADMAP_CHUNK_CONCURRENCY)
+
+    async def generate_block(index: int):
+        try:
+            async with slots:
+                return await openrouter_chat_async(
+                    messages=create_block_messages(profile_data, outline, blocks, index),
+                    temperature=0.7,
+                    max_tokens=block_max_tokens(blocks[index]),
+                    response_format=json_mode()
+                )
+        except Exception as e:
+            print(f"Roadmap block {blocks[index]} error: {str(e)}")
+            return None
+
+    return [asyncio.create_task(generate_block(i)) for i in range(len(blocks))]
+
+async def generate_chunked_roadmap_async(profile_data: dict, duration_weeks: int) -> dict:
+    blocks = week_blocks(duration_weeks)
+    outline = await _outline_async(profile_data, duration_weeks, blocks)
+    tasks = _start_blocks(profile_data, outline, blocks)
+    try:
+        raw_blocks = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return merge_blocks(outline, blocks, raw_blocks)
+
+async def stream_chunked_roadmap_async(profile_data: dict, duration_weeks: int):
+    """
+    Chunked variant of stream_roadmap_impl_async: all blocks run at once and
+    their weeks are yielded in order as each block completes.
+    """
+    blocks = week_blocks(duration_weeks)
+    outline = await _outline_async(profile_data, duration_weeks, blocks)
+    tasks = _start_blocks(profile_data, outline, blocks)
+    raw_blocks = []
+    try:
+        for index, task in enumerate(tasks):
+            raw = await task
+            raw_blocks.append(raw)
+            for week in parse_block(raw, blocks[index], outline["phases"][index])[0]:
+                yield "week", week
+    finally:
+        for task in tasks:
+            task.cancel()
+    try:
+        roadmap = merge_blocks(outline, blocks, raw_blocks)
+    except ValueError:
+        # No block produced usable weeks; the outline-based weeks already sent are all there is
+        roadmap = {
+            "career_goal": outline["career_goal"],
+            "weeks": [week for i, raw in enumerate(raw_blocks) for week in parse_block(raw, blocks[i], outline["phases"][i])[0]],
+            "incomplete_weeks": list(range(1, duration_weeks + 1))
         }
+    yield "done", roadmap
+
+def personalize_roadmap_impl(base: dict, profile_data: dict) -> dict:
+    """
+    Short LLM pass adapting a template roadmap to one learner. Returns the
+    base roadmap unchanged if the pass fails.
+    """
+    try:
+        raw_content = openrouter_chat(
+            messages=create_personalization_messages(base, profile_data),
+            temperature=0.4,
+            max_tokens=800,
+            response_format=json_mode()
+        )
+        return apply_personalization(base, parse_json_reply(raw_content, "roadmap_personalization"))
+    except Exception as e:
+        print(f"Roadmap personalization error: {str(e)}")
+        return base
+
+async def personalize_roadmap_impl_async(base: dict, profile_data: dict) -> dict:
+    try:
+        raw_content = await openrouter_chat_async(
+            messages=create_personalization_messages(base, profile_data),
+            temperature=0.4,
+            max_tokens=800,
+            response_format=json_mode()
+        )
+        return apply_personalization(base, parse_json_reply(raw_content, "roadmap_personalization"))
+    except Exception as e:
+        print(f"Roadmap personalization error: {str(e)}")
+        return base
+
+def learner_summary(profile_data: dict) -> dict:
+    """The parts of a profile that personalization uses; empty when there is nothing to tailor to"""
+    summary = {
+        key: profile_data.get(key)
+        for key in ("education", "major", "interests")
+        if profile_data.get(key)
+    }
+    if profile_data.get("resume_content"):
+        skills = extract_skills(profile_data["resume_content"], limit=30)
+        if skills:
+            summary["known_skills"] = skills
+    return summary
+
+def create_personalization_messages(base: dict, profile_data: dict) -> list:
+    outline = [
+        {"week": week.get("week"), "topic": week.get("topic"), "tasks": week.get("tasks")}
+        for week in base.get("weeks", [])
+    ]
+    return get_prompt("roadmap_personalize").messages(
+        career_goal=base.get('career_goal'),
+        learner=json.dumps(learner_summary(profile_data)),
+        outline=json.dumps(outline)
+    )
+
+def apply_personalization(base: dict, changes: dict) -> dict:
+    roadmap = json.loads(json.dumps(base))
+    weeks = {week.get("week"): week for week in roadmap.get("weeks", [])}
+    for change in changes.get("weeks") or []:
+        week = weeks.get(change.get("week")) if isinstance(change, dict) else None
+        tasks = change.get("tasks") if week is not None else None
+        if isinstance(tasks, list) and tasks and all(isinstance(t, str) for t in tasks):
+            week["tasks"] = tasks
+    return roadmap
+
+def create_fallback_roadmap() -> dict:
+    return {
+        "career_goal": "Software Engineering",
+        "weeks": [
+            {"week": 1, "topic": "Foundations", "tasks": ["Review Core Concepts"], "resources": ["Official Documentation"]}
+        ]
+    }
+
+def parse_json_content(raw_content: str) -> dict:
+    return parse_llm_json(raw_content)[0]
 
 def get_career_counseling_impl(answers: dict) -> dict:
     try:
-        client = OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
+        raw_content = openrouter_chat(
+            messages=create_counseling_messages(answers),
+            max_tokens=1000,
+            response_format=response_format(COUNSELING_OUTPUT, "career_counseling")
         )
-        prompt = f"""Analyze career archetype based on: {json.dumps(answers)}
-        Output JSON: {{ "archetype": "...", "suggested_role": "...", "reasoning": "...", "recommended_path": "..." }}"""
-        
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[{"role": "system", "content": "Career psychologist. JSON only."},{"role": "user", "content": prompt}],
-            max_tokens=1000
+        return parse_structured(raw_content, COUNSELING_OUTPUT, "counseling")
+    except Exception as e:
+        print(f"Counselor Error: {str(e)}")
+        return create_fallback_counseling()
+
+async def get_career_counseling_impl_async(answers: dict) -> dict:
+    try:
+        raw_content = await openrouter_chat_async(
+            messages=create_counseling_messages(answers),
+            max_tokens=1000,
+            response_format=response_format(COUNSELING_OUTPUT, "career_counseling")
         )
-        cleaned = re.sub(r'```json\n?|\n?```', '', response.choices[0].message.content).strip()
-        return json.loads(cleaned)
+        return parse_structured(raw_content, COUNSELING_OUTPUT, "counseling")
     except Exception as e:
         print(f"Counselor Error: {str(e)}")
-        return {
-             "archetype": "The Builder",
-             "suggested_role": "Software Engineer",
-             "reasoning": "Standard fallback due to error.",
-             "recommended_path": "CS Fundamentals"
-        }
+        return create_fallback_counseling()
+
+def create_counseling_messages(answers: dict) -> list:
+    return get_prompt("counseling").messages(answers=json.dumps(answers))
+
+def create_fallback_counseling() -> dict:
+    return {
+         "archetype": "The Builder",
+         "suggested_role": "Software Engineer",
+         "reasoning": "Standard fallback due to error.",
+         "recommended_path": "CS Fundamentals"
+    }
@@ -0,0 +1,223 @@
+"""
+Reusable roadmap templates.
+
+Most roadmap requests are variations of a few goals ("Full Stack Developer,
+Beginner, 8 weeks"). A base roadmap for each normalized goal, experience level
+and duration is generated once, stored in `roadmap_templates` and served to
+every matching user. A short personalization pass follows when the profile
+has something to tailor to. Base roadmaps are generated from the goal and
+level alone, so they never contain profile data. Keys include
+ROADMAP_PROMPT_VERSION, so a prompt change starts a fresh set of templates.
+"""
+import os
+import re
+import copy
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from dotenv import load_dotenv
+from app.database import SessionLocal
+from app.models.roadmap_template import RoadmapTemplate
+from app.services.analysis_cache import TTLCache
+from app.services.roadmap_service import ROADMAP_PROMPT_VERSION, create_fallback_roadmap
+
+load_dotenv()
+
+ROADMAP_TEMPLATES_ENABLED = os.getenv("ROADMAP_TEMPLATES_ENABLED", "true").lower() in ("1", "true", "yes")
+ROADMAP_PERSONALIZE = os.getenv("ROADMAP_PERSONALIZE", "true").lower() in ("1", "true", "yes")
+ROADMAP_TEMPLATE_TTL_DAYS = int(os.getenv("ROADMAP_TEMPLATE_TTL_DAYS", "30"))
+ROADMAP_TEMPLATE_CACHE_SIZE = int(os.getenv("ROADMAP_TEMPLATE_CACHE_SIZE", "256"))
+
+LEVELS = ("beginner", "intermediate", "advanced")
+# Longer goals are free-text descriptions too specific to share
+MAX_GOAL_LENGTH = 100
+
+_memory = TTLCache(ROADMAP_TEMPLATE_CACHE_SIZE, 3600)
+_stats_lock = threading.Lock()
+_stats = {
+    "memory_hits": 0, "db_hits": 0, "misses": 0, "bypassed": 0, "stored": 0,
+    "personalized": 0, "served_unpersonalized": 0, "db_errors": 0,
+    "age_seconds_total": 0.0, "max_age_seconds": 0.0
+}
+
+
+def _count(name: str, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _record_age(created_at: datetime):
+    if created_at is None:
+        return
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    age = max(0.0, (datetime.now(timezone.utc) - created_at).total_seconds())
+    with _stats_lock:
+        _stats["age_seconds_total"] += age
+        _stats["max_age_seconds"] = max(_stats["max_age_seconds"], age)
+
+
+def normalize_goal(goal) -> Optional[str]:
+    if not isinstance(goal, str):
+        return None
+    text = unicodedata.normalize("NFKC", goal).lower()
+    # Keep the punctuation skills are spelled with (C++, C#, .NET)
+    text = re.sub(r"[^\w+#.]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip(" .")
+    if not text or len(text) > MAX_GOAL_LENGTH:
+        return None
+    return text
+
+
+def normalize_level(level) -> str:
+    if isinstance(level, str):
+        for known in LEVELS:
+            if known in level.lower():
+                return known
+    return "any"
+
+
+def _goal(profile_data: dict):
+    return profile_data.get("careerGoals") or profile_data.get("goals")
+
+
+def template_key(profile_data: dict, duration_weeks: int) -> Optional[str]:
+    """Template key for a request, or None when it has no shareable goal"""
+    if not ROADMAP_TEMPLATES_ENABLED:
+        return None
+    goal = normalize_goal(_goal(profile_data))
+    if goal is None:
+        _count("bypassed")
+        return None
+    parts = [ROADMAP_PROMPT_VERSION, goal, normalize_level(profile_data.get("experience_level")), str(duration_weeks)]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def base_profile(profile_data: dict) -> dict:
+    """The only profile data a shared base roadmap is generated from"""
+    return {
+        "careerGoals": _goal(profile_data).strip(),
+        "experience_level": normalize_level(profile_data.get("experience_level"))
+    }
+
+
+def is_usable_base(roadmap: dict, duration_weeks: int) -> bool:
+    weeks = roadmap.get("weeks") if isinstance(roadmap, dict) else None
+    return (
+        isinstance(weeks, list)
+        and len(weeks) >= duration_weeks
+        and not roadmap.get("incomplete_weeks")
+        and roadmap != create_fallback_roadmap()
+    )
+
+
+def _load_from_db(key: str):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ROADMAP_TEMPLATE_TTL_DAYS)
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(RoadmapTemplate)
+            .filter(
+                RoadmapTemplate.template_key == key,
+                RoadmapTemplate.prompt_version == ROADMAP_PROMPT_VERSION,
+                RoadmapTemplate.created_at >= cutoff
+            )
+            .first()
+        )
+        return (row.created_at, row.roadmap) if row else None
+    except Exception as e:
+        _count("db_errors")
+        print(f"Roadmap template read failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _save_to_db(key: str, profile_data: dict, duration_weeks: int, roadmap: dict):
+    db = SessionLocal()
+    try:
+        db.merge(RoadmapTemplate(
+            template_key=key,
+            prompt_version=ROADMAP_PROMPT_VERSION,
+            career_goal=normalize_goal(_goal(profile_data)),
+            experience_level=normalize_level(profile_data.get("experience_level")),
+            duration_weeks=duration_weeks,
+            roadmap=roadmap,
+            created_at=datetime.now(timezone.utc)
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        _count("db_errors")
+        print(f"Roadmap template write failed: {e}")
+    finally:
+        db.close()
+
+
+def _served(entry) -> dict:
+    created_at, roadmap = entry
+    _record_age(created_at)
+    return copy.deepcopy(roadmap)
+
+
+def get_template(key: str) -> Optional[dict]:
+    """Base roadmap for `key` from memory or the database, or None"""
+    entry = _memory.get(key)
+    if entry is not None:
+        _count("memory_hits")
+        return _served(entry)
+    entry = _load_from_db(key)
+    if entry is not None:
+        _count("db_hits")
+        _memory.set(key, entry)
+        return _served(entry)
+    _count("misses")
+    return None
+
+
+async def get_template_async(key: str) -> Optional[dict]:
+    entry = _memory.get(key)
+    if entry is not None:
+        _count("memory_hits")
+        return _served(entry)
+    entry = await asyncio.to_thread(_load_from_db, key)
+    if entry is not None:
+        _count("db_hits")
+        _memory.set(key, entry)
+        return _served(entry)
+    _count("misses")
+    return None
+
+
+def store_template(key: str, profile_data: dict, duration_weeks: int, roadmap: dict):
+    _memory.set(key, (datetime.now(timezone.utc), copy.deepcopy(roadmap)))
+    _count("stored")
+    _save_to_db(key, profile_data, duration_weeks, roadmap)
+
+
+async def store_template_async(key: str, profile_data: dict, duration_weeks: int, roadmap: dict):
+    _memory.set(key, (datetime.now(timezone.utc), copy.deepcopy(roadmap)))
+    _count("stored")
+    await asyncio.to_thread(_save_to_db, key, profile_data, duration_weeks, roadmap)
+
+
+def record_personalization(personalized: bool):
+    _count("personalized" if personalized else "served_unpersonalized")
+
+
+def roadmap_template_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    hits = stats["memory_hits"] + stats["db_hits"]
+    lookups = hits + stats["misses"]
+    age_total = stats.pop("age_seconds_total")
+    stats["enabled"] = ROADMAP_TEMPLATES_ENABLED
+    stats["prompt_version"] = ROADMAP_PROMPT_VERSION
+    stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+    stats["avg_age_seconds"] = round(age_total / hits, 1) if hits else None
+    stats["max_age_seconds"] = round(stats["max_age_seconds"], 1)
+    stats["memory_entries"] = len(_memory)
+    return stats
@@ -0,0 +1,237 @@
+"""
+Single-flight request coalescing.
+
+Concurrent calls that share a key wait on one upstream call instead of each
+issuing their own. SingleFlight covers the sync (thread) path, AsyncSingleFlight
+the async path. Optionally, a Postgres advisory lock extends this across
+gunicorn workers: the leader in each worker takes the lock, and whoever gets
+it second finds the first worker's result in the shared cache.
+
+A session-level advisory lock lives on one connection, held for the whole
+LLM call. Those connections come from a small engine of their own, never
+from the main pool, so a burst of distinct resumes cannot starve ordinary
+queries. Waiters poll with pg_try_advisory_lock and hand their connection
+back between tries. When the lock pool is exhausted, calls go ahead
+without the lock.
+"""
+import os
+import copy
+import time
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from app.database import engine
+from app.services.deadline import DeadlineExceeded, remaining
+
+load_dotenv()
+
+LLM_SINGLEFLIGHT_PG = os.getenv("LLM_SINGLEFLIGHT_PG", "false").lower() in ("1", "true", "yes")
+LLM_SINGLEFLIGHT_PG_WAIT_MS = int(os.getenv("LLM_SINGLEFLIGHT_PG_WAIT_MS", "60000"))
+# Connections (so locks held at once) per worker, separate from the main pool
+LLM_SINGLEFLIGHT_PG_POOL = int(os.getenv("LLM_SINGLEFLIGHT_PG_POOL", "4"))
+LLM_SINGLEFLIGHT_PG_POLL_MS = int(os.getenv("LLM_SINGLEFLIGHT_PG_POLL_MS", "200"))
+
+_stats_lock = threading.Lock()
+_stats = {"leaders": 0, "coalesced": 0, "pg_locks": 0, "pg_lock_failures": 0, "pg_lock_timeouts": 0, "pg_pool_full": 0}
+_lock_engine = None
+_lock_engine_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def singleflight_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent sync calls with the same key onto one execution.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            _count("coalesced")
+            # Followers stop waiting when their own request budget runs out
+            if not call.done.wait(timeout=remaining()):
+                raise DeadlineExceeded("Request time budget exhausted waiting on a coalesced call")
+            if call.error is not None:
+                raise call.error
+            # Followers get their own copy so callers can mutate freely
+            return copy.deepcopy(call.result)
+
+        _count("leaders")
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls with the same key onto one task.
+    The shared task is shielded, so one caller disconnecting does not cancel
+    the upstream call for the others.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+    async def do(self, key: str, factory):
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            _count("leaders")
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            _count("coalesced")
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout=remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request time budget exhausted waiting on a coalesced call")
+        return result if leader else copy.deepcopy(result)
+
+
+def make_flight_key(*parts) -> str:
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _lock_id(key: str) -> int:
+    # pg advisory locks take a signed bigint
+    return int.from_bytes(bytes.fromhex(key[:16]), "big", signed=True)
+
+
+def _get_lock_engine():
+    global _lock_engine
+    if _lock_engine is None:
+        with _lock_engine_lock:
+            if _lock_engine is None:
+                _lock_engine = create_engine(
+                    engine.url,
+                    pool_pre_ping=True,
+                    pool_recycle=300,
+                    pool_size=LLM_SINGLEFLIGHT_PG_POOL,
+                    max_overflow=0,
+                    # A full lock pool means running unlocked, not queueing behind it
+                    pool_timeout=LLM_SINGLEFLIGHT_PG_POLL_MS / 1000
+                )
+    return _lock_engine
+
+
+def _acquire_pg_lock(key: str):
+    """A connection holding the advisory lock for `key`, or None to go ahead without it"""
+    wait = LLM_SINGLEFLIGHT_PG_WAIT_MS / 1000
+    budget = remaining()
+    if budget is not None:
+        wait = min(wait, budget)
+    give_up_at = time.monotonic() + wait
+    while True:
+        try:
+            conn = _get_lock_engine().connect()
+        except Exception as e:
+            _count("pg_pool_full")
+            print(f"No connection for the advisory lock, continuing without it: {e}")
+            return None
+        try:
+            locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _lock_id(key)}).scalar()
+            conn.commit()
+        except Exception as e:
+            _count("pg_lock_failures")
+            print(f"Advisory lock failed, continuing without it: {e}")
+            conn.invalidate()
+            conn.close()
+            return None
+        if locked:
+            _count("pg_locks")
+            return conn
+        # Held by another worker: wait without keeping a connection
+        conn.close()
+        left = give_up_at - time.monotonic()
+        if left <= 0:
+            _count("pg_lock_timeouts")
+            print("Advisory lock wait timed out, continuing without it")
+            return None
+        time.sleep(min(LLM_SINGLEFLIGHT_PG_POLL_MS / 1000, left))
+
+
+def _release_pg_lock(conn, key: str):
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _lock_id(key)})
+        conn.commit()
+    except Exception as e:
+        print(f"Advisory unlock failed, dropping connection: {e}")
+        # A session-level lock dies with its connection
+        conn.invalidate()
+    finally:
+        conn.close()
+
+
+def _pg_enabled() -> bool:
+    return LLM_SINGLEFLIGHT_PG and engine.dialect.name == "postgresql"
+
+
+@contextmanager
+def cross_worker_lock(key: str):
+    """
+    Holds a Postgres advisory lock for `key` when LLM_SINGLEFLIGHT_PG is on.
+    Yields True if the lock is held. Never raises for lock problems.
+    """
+    conn = _acquire_pg_lock(key) if _pg_enabled() else None
+    try:
+        yield conn is not None
+    finally:
+        if conn is not None:
+            _release_pg_lock(conn, key)
+
+
+@asynccontextmanager
+async def cross_worker_lock_async(key: str):
+    """
+    Async variant of cross_worker_lock; lock calls run off the event loop.
+    """
+    conn = await asyncio.to_thread(_acquire_pg_lock, key) if _pg_enabled() else None
+    try:
+        yield conn is not None
+    finally:
+        if conn is not None:
+            await asyncio.to_thread(_release_pg_lock, conn, key)
@@ -0,0 +1,95 @@
+"""
+Speculative resume analysis.
+
+An upload enqueues the analysis on the `speculative` job queue straight
+away, so `StudentProfile.skill_analysis` is usually filled by the time the
+user opens the analysis screen, and /ai/analyze-resume returns it without
+calling the LLM. A newer upload cancels the previous speculation. A
+speculation that already ran past that point will not save, because the
+stored analysis carries the hash of the resume text it was made from
+(`skill_analysis_hash`).
+
+The hit rate counts analyze requests whose speculation had finished in time
+against those where it was still queued or running, or had failed.
+"""
+import os
+import hashlib
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from app.models.job import AIJob
+from app.services.job_queue import enqueue_job, cancel_jobs, SUCCEEDED, QUEUED, RUNNING
+
+load_dotenv()
+
+SPECULATIVE_ANALYSIS_ENABLED = os.getenv("SPECULATIVE_ANALYSIS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Uploads with less text than this are image-only PDFs and the like; nothing to analyze
+SPECULATIVE_MIN_CHARS = 50
+
+SPECULATIVE_JOB = "speculative_analysis"
+
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "superseded": 0, "hits": 0, "pending": 0, "failed": 0, "not_speculated": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def resume_hash(resume_text: str) -> str:
+    return hashlib.sha256((resume_text or "").encode("utf-8")).hexdigest()
+
+
+def start_speculative_analysis(db: Session, user_id: int, resume_text: str) -> Optional[dict]:
+    """
+    Cancels the user's earlier speculation and queues one for `resume_text`.
+    Returns the job, or None when speculation is off or there is no text.
+    """
+    if not SPECULATIVE_ANALYSIS_ENABLED or not resume_text or len(resume_text.strip()) < SPECULATIVE_MIN_CHARS:
+        return None
+    try:
+        if cancel_jobs(db, user_id, SPECULATIVE_JOB):
+            _count("superseded")
+        job = enqueue_job(db, user_id, SPECULATIVE_JOB, {"resume_hash": resume_hash(resume_text)})
+    except Exception as e:
+        # The upload already succeeded; the analysis will simply run on request
+        db.rollback()
+        print(f"Speculative analysis not started: {e}")
+        return None
+    _count("started")
+    return job
+
+
+def record_speculation_outcome(db: Session, user_id: int, current_hash: str, ready: bool) -> str:
+    """
+    Counts an analyze request against the latest speculation for the
+    user's current resume. Returns the outcome: hits, pending, failed or
+    not_speculated.
+    """
+    job = (
+        db.query(AIJob)
+        .filter(AIJob.user_id == user_id, AIJob.kind == SPECULATIVE_JOB)
+        .order_by(AIJob.created_at.desc())
+        .first()
+    )
+    if job is None or (job.payload or {}).get("resume_hash") != current_hash:
+        outcome = "not_speculated"
+    elif ready and job.status == SUCCEEDED:
+        outcome = "hits"
+    elif job.status in (QUEUED, RUNNING):
+        outcome = "pending"
+    else:
+        outcome = "failed"
+    _count(outcome)
+    return outcome
+
+
+def speculative_analysis_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    speculated = stats["hits"] + stats["pending"] + stats["failed"]
+    stats["enabled"] = SPECULATIVE_ANALYSIS_ENABLED
+    stats["hit_rate"] = round(stats["hits"] / speculated, 4) if speculated else 0.0
+    return stats
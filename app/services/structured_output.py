@@ -0,0 +1,111 @@
+"""
+Structured LLM output.
+
+Prompts that expect JSON send a `response_format` (JSON schema or JSON mode,
+per LLM_STRUCTURED_OUTPUT) to providers that support it. Every reply is then
+parsed with the tolerant repair parser and validated with a TypeAdapter
+from app.schemas.ai_output. Outcomes are counted per output kind, so the
+parse-failure rate is visible on /health.
+"""
+import os
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from app.utils.json_repair import parse_llm_json_state, CLEAN, TRUNCATED
+
+load_dotenv()
+
+# json_schema | json_object | off
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "json_schema").lower()
+
+_schemas = {}
+_stats_lock = threading.Lock()
+_stats = {}  # kind -> {"clean", "repaired", "truncated", "failed"}
+
+
+def _count(kind: str, outcome: str):
+    with _stats_lock:
+        counters = _stats.setdefault(kind, {"clean": 0, "repaired": 0, "truncated": 0, "failed": 0})
+        counters[outcome] += 1
+
+
+def response_format(adapter, name: str) -> Optional[dict]:
+    """
+    The `response_format` parameter for a reply validated by `adapter`, or
+    None when structured output is turned off.
+    """
+    if LLM_STRUCTURED_OUTPUT == "json_schema":
+        schema = _schemas.get(name)
+        if schema is None:
+            schema = _schemas.setdefault(name, adapter.json_schema())
+        return {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}
+    if LLM_STRUCTURED_OUTPUT == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def json_mode() -> Optional[dict]:
+    """`response_format` for JSON replies that have no schema of their own"""
+    return {"type": "json_object"} if LLM_STRUCTURED_OUTPUT != "off" else None
+
+
+def _outcome(state: str) -> str:
+    if state == CLEAN:
+        return "clean"
+    return "truncated" if state == TRUNCATED else "repaired"
+
+
+def parse_structured(raw_content: str, adapter, kind: str) -> dict:
+    """
+    Repairs, parses and validates a reply. Returns plain JSON-compatible data;
+    raises ValueError when the reply is unusable, which includes a reply cut
+    off at max_tokens: its last value may be half written.
+    """
+    value, truncated = parse_structured_partial(raw_content, adapter, kind)
+    if truncated:
+        raise ValueError(f"Truncated {kind} output")
+    return value
+
+
+def parse_structured_partial(raw_content: str, adapter, kind: str):
+    """
+    parse_structured that also returns whether the reply was truncated, for
+    callers that must distrust its last item
+    """
+    try:
+        data, state = parse_llm_json_state(raw_content)
+        value = adapter.validate_python(data)
+    except ValueError as e:
+        # Covers JsonRepairError and pydantic's ValidationError
+        _count(kind, "failed")
+        raise ValueError(f"Invalid {kind} output: {e}")
+    _count(kind, _outcome(state))
+    return adapter.dump_python(value, mode="json", exclude_none=True), state == TRUNCATED
+
+
+def parse_json_reply(raw_content: str, kind: str):
+    """parse_structured for replies without a schema; any complete JSON document is accepted"""
+    data, truncated = parse_json_reply_partial(raw_content, kind)
+    if truncated:
+        raise ValueError(f"Truncated {kind} output")
+    return data
+
+
+def parse_json_reply_partial(raw_content: str, kind: str):
+    """parse_json_reply that also returns whether the reply was truncated"""
+    try:
+        data, state = parse_llm_json_state(raw_content)
+    except ValueError:
+        _count(kind, "failed")
+        raise
+    _count(kind, _outcome(state))
+    return data, state == TRUNCATED
+
+
+def structured_output_stats() -> dict:
+    with _stats_lock:
+        stats = {kind: dict(counters) for kind, counters in _stats.items()}
+    for counters in stats.values():
+        total = sum(counters.values())
+        counters["failure_rate"] = round(counters["failed"] / total, 4) if total else 0.0
+    return {"mode": LLM_STRUCTURED_OUTPUT, "outputs": stats}
@@ -0,0 +1,264 @@
+"""
+Content-addressed resume storage.
+
+Users re-upload the same CV again and again. Each upload is hashed
+(SHA-256) from the request's spooled file before anything is written, and
+stored once as uploads/blobs/<2 hex>/<hash><ext>. A re-upload of
+byte-identical content skips the disk write. Its extracted text and
+image-only classification are cached on the `upload_blobs` row, so it
+skips the pre-scan and extraction too. The cache is tied to the
+extraction settings (EXTRACTION_VERSION) and is refilled once they change.
+
+Blobs are reference-counted. An upload takes a reference as soon as the
+hash is known. The profile then keeps that reference, releases it (it
+already held the blob), or releases it because the upload failed. A
+profile that moves to a different blob releases the old one, and a blob
+whose count drops to 0 is deleted with its file. The same content may be
+uploaded again while that file is being removed, so an upload that
+creates a blob's row always writes its file, and the file is only
+removed when no row points at it any more.
+"""
+import os
+import shutil
+import hashlib
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.database import SessionLocal
+from app.models.upload import UploadBlob
+from app.utils.pdf_engine import PDF_BACKEND, PDF_MAX_PAGES, PDF_MAX_CHARS, IMAGE_ONLY
+from app.utils.docx_engine import DOCX_MAX_CHARS
+
+load_dotenv()
+
+UPLOAD_BLOB_DIR = os.getenv("UPLOAD_BLOB_DIR", "uploads/blobs")
+CHUNK_SIZE = 1024 * 1024
+
+# Cached extractions made under other settings are redone
+EXTRACTION_VERSION = "extract-v1+" + hashlib.sha256(
+    f"{PDF_BACKEND}|{PDF_MAX_PAGES}|{PDF_MAX_CHARS}|{DOCX_MAX_CHARS}".encode("utf-8")
+).hexdigest()[:8]
+
+_stats_lock = threading.Lock()
+_stats = {"uploads": 0, "written": 0, "deduplicated": 0, "extraction_hits": 0, "blobs_deleted": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def hash_file(fileobj) -> tuple:
+    """(sha256 hex, size) of a seekable file, left rewound"""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_path(content_hash: str, filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()[:10]
+    return os.path.join(UPLOAD_BLOB_DIR, content_hash[:2], content_hash + extension)
+
+
+def _write_blob(fileobj, file_path: str):
+    """Writes to a temporary name first, so a blob path never holds a partial file"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as buffer:
+            shutil.copyfileobj(fileobj, buffer, CHUNK_SIZE)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _acquire(db: Session, content_hash: str, file_path: str, size: int, content_type: str) -> tuple:
+    """Takes one reference on the blob, creating its row if needed. Returns (blob, created)"""
+    updated = (
+        db.query(UploadBlob)
+        .filter(UploadBlob.content_hash == content_hash)
+        .update({UploadBlob.ref_count: UploadBlob.ref_count + 1, UploadBlob.last_used_at: func.now()},
+                synchronize_session=False)
+    )
+    if not updated:
+        db.add(UploadBlob(
+            content_hash=content_hash, file_path=file_path, size=size,
+            content_type=content_type, ref_count=1
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            # The same file was uploaded concurrently and its row won
+            db.rollback()
+            return _acquire(db, content_hash, file_path, size, content_type)
+    else:
+        db.commit()
+    return db.query(UploadBlob).filter(UploadBlob.content_hash == content_hash).first(), not updated
+
+
+def store_upload(upload_file, content_type: str) -> dict:
+    """
+    Stores `upload_file` by content and takes a reference on it, which the
+    caller must hand to a profile (keep_blob) or give back (give_back_blob).
+    Returns content_hash, file_path, and the cached extracted_text and
+    classification (None when the blob has not been extracted under the
+    current settings).
+    """
+    _count("uploads")
+    content_hash, size = hash_file(upload_file.file)
+    db = SessionLocal()
+    try:
+        blob, created = _acquire(db, content_hash, blob_path(content_hash, upload_file.filename), size, content_type)
+        cached = blob.extraction_version == EXTRACTION_VERSION
+        stored = {
+            "content_hash": content_hash,
+            "file_path": blob.file_path,
+            "extracted_text": blob.extracted_text if cached else None,
+            "classification": blob.classification if cached else None
+        }
+    finally:
+        db.close()
+
+    # A file left by a deleted row may be removed any moment: a new row gets its own copy
+    if not created and os.path.exists(stored["file_path"]):
+        _count("deduplicated")
+    else:
+        try:
+            _write_blob(upload_file.file, stored["file_path"])
+        except Exception:
+            give_back_blob(content_hash)
+            raise
+        _count("written")
+    if stored["extracted_text"] is not None:
+        _count("extraction_hits")
+    return stored
+
+
+def save_extraction(content_hash: str, extracted_text: str, classification: Optional[str]):
+    """
+    Caches an extraction on its blob. Empty text is only cached for
+    image-only files: otherwise it may be a worker hitting its limits.
+    """
+    if classification != IMAGE_ONLY and not (extracted_text or "").strip():
+        return
+    db = SessionLocal()
+    try:
+        db.query(UploadBlob).filter(UploadBlob.content_hash == content_hash).update({
+            UploadBlob.extracted_text: extracted_text,
+            UploadBlob.classification: classification,
+            UploadBlob.extraction_version: EXTRACTION_VERSION
+        }, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Extraction for blob {content_hash[:12]} not cached: {e}")
+    finally:
+        db.close()
+
+
+def release_blob(db: Session, content_hash: str) -> Optional[str]:
+    """
+    Drops one reference in the caller's transaction. Returns the file to
+    remove (remove_blob_file) once that transaction commits, or None while
+    the blob is still referenced.
+    """
+    if not content_hash:
+        return None
+    db.query(UploadBlob).filter(UploadBlob.content_hash == content_hash).update(
+        {UploadBlob.ref_count: UploadBlob.ref_count - 1}, synchronize_session=False
+    )
+    blob = (
+        db.query(UploadBlob)
+        .filter(UploadBlob.content_hash == content_hash, UploadBlob.ref_count <= 0)
+        .first()
+    )
+    if blob is None:
+        return None
+    file_path = blob.file_path
+    db.delete(blob)
+    return file_path
+
+
+def remove_blob_file(file_path: Optional[str]):
+    """
+    Removes a released blob's file. It is moved aside first and only deleted
+    if no row took the path again meanwhile; otherwise it is put back. An
+    upload that recreated the row after the check writes the file itself.
+    """
+    if not file_path:
+        return
+    doomed_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.deleted"
+    try:
+        os.replace(file_path, doomed_path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        print(f"Could not remove blob {file_path}: {e}")
+        return
+
+    db = SessionLocal()
+    try:
+        in_use = db.query(UploadBlob.content_hash).filter(UploadBlob.file_path == file_path).first() is not None
+    except Exception as e:
+        # Keeping an unreferenced file is harmless, losing a referenced one is not
+        print(f"Could not check blob {file_path}, keeping it: {e}")
+        in_use = True
+    finally:
+        db.close()
+
+    try:
+        if in_use:
+            # Same content either way, so this may replace a fresh copy
+            os.replace(doomed_path, file_path)
+        else:
+            os.remove(doomed_path)
+            _count("blobs_deleted")
+    except OSError as e:
+        print(f"Could not remove blob {file_path}: {e}")
+
+
+def give_back_blob(content_hash: str):
+    """Releases an upload's reference when the upload did not reach the profile"""
+    db = SessionLocal()
+    try:
+        file_path = release_blob(db, content_hash)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Could not release blob {content_hash[:12]}: {e}")
+        return
+    finally:
+        db.close()
+    remove_blob_file(file_path)
+
+
+def keep_blob(db: Session, profile, content_hash: str, file_path: str) -> Optional[str]:
+    """
+    Points `profile` at the blob, in the caller's transaction. The upload's
+    reference becomes the profile's. If the profile already held this blob,
+    the extra reference is dropped instead, and if it held another one,
+    that one is released. Returns the file to remove after commit, if any.
+    """
+    previous = profile.resume_blob_hash
+    profile.resume_blob_hash = content_hash
+    profile.resume_file_path = file_path
+    # The profile must point away before its old blob can be deleted
+    db.flush()
+    return release_blob(db, previous)
+
+
+def upload_store_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["dedup_rate"] = round(stats["deduplicated"] / stats["uploads"], 4) if stats["uploads"] else 0.0
+    stats["extraction_version"] = EXTRACTION_VERSION
+    return stats
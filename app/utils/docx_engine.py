@@ -0,0 +1,229 @@
+"""
+DOCX text extraction engine.
+
+python-docx builds the whole document DOM and `doc.paragraphs` only covers
+body paragraphs. Tables, text boxes, headers and footers are dropped, and
+resumes often keep their skills there. This engine streams the XML parts
+straight out of the zip with iterparse:
+
+- header parts, then word/document.xml, then footer parts;
+- body paragraphs and table rows in document order (a row's cells are
+  joined with " | ", and nested tables are kept inside their cell);
+- text boxes (each box's paragraphs come just before the paragraph that
+  anchors it; the VML fallback copy of the box is skipped);
+- lines repeated across header/footer parts (first-page and default
+  headers) kept once.
+
+Elements are discarded as soon as they close, so memory stays flat however
+long the document is, and reading stops at DOCX_MAX_CHARS. If a file
+cannot be streamed (a broken zip or malformed XML), python-docx is tried as
+the fallback.
+
+Benchmark against python-docx on a folder of DOCX files:
+    python -m app.utils.docx_engine benchmark path/to/docx [repeat]
+"""
+import os
+import re
+import sys
+import time
+import zipfile
+from xml.etree.ElementTree import iterparse
+from dotenv import load_dotenv
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+load_dotenv()
+
+DOCX_MAX_CHARS = int(os.getenv("DOCX_MAX_CHARS", "20000"))
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_P, _R, _T, _TAB, _BR, _CR = _W + "p", _W + "r", _W + "t", _W + "tab", _W + "br", _W + "cr"
+_TBL, _TR, _TC = _W + "tbl", _W + "tr", _W + "tc"
+_NO_BREAK_HYPHEN = _W + "noBreakHyphen"
+_PART = re.compile(r"^word/(header|footer)(\d*)\.xml$")
+
+CELL_SEPARATOR = " | "
+
+
+def docx_parts(archive: zipfile.ZipFile) -> list:
+    """XML parts in reading order: headers, body, footers"""
+    headers, footers = [], []
+    for name in archive.namelist():
+        match = _PART.match(name)
+        if match:
+            kind, number = match.groups()
+            (headers if kind == "header" else footers).append((int(number or 0), name))
+    return [name for _, name in sorted(headers)] + ["word/document.xml"] + [name for _, name in sorted(footers)]
+
+
+def _part_lines(stream):
+    """
+    Yields the text lines of one WordprocessingML part. Each closed element
+    is cleared and detached from its parent, so only the open path is kept.
+    """
+    path = []       # open elements, root first
+    paragraphs = []  # text buffers of open paragraphs (text boxes nest them)
+    cells = []      # paragraph texts of open table cells (nested tables nest them)
+    rows = []       # cell texts of open table rows
+    fallback = 0    # depth inside mc:Fallback (duplicate VML text boxes)
+
+    def emit(line):
+        if cells:
+            cells[-1].append(line)
+            return None
+        return line
+
+    for event, elem in iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            path.append(elem)
+            if tag == _MC_FALLBACK:
+                fallback += 1
+            elif fallback:
+                continue
+            elif tag == _P:
+                paragraphs.append([])
+            elif tag == _TR:
+                rows.append([])
+            elif tag == _TC:
+                cells.append([])
+            continue
+
+        path.pop()
+        line = None
+        if tag == _MC_FALLBACK:
+            fallback -= 1
+        elif fallback:
+            pass
+        elif tag == _T and paragraphs:
+            paragraphs[-1].append(elem.text or "")
+        elif tag in (_TAB, _BR, _CR, _NO_BREAK_HYPHEN) and paragraphs and path and path[-1].tag == _R:
+            # Only inside runs: w:tab also appears in paragraph properties as a tab stop
+            paragraphs[-1].append("-" if tag == _NO_BREAK_HYPHEN else "\t" if tag == _TAB else "\n")
+        elif tag == _P and paragraphs:
+            text = "".join(paragraphs.pop()).strip()
+            if text:
+                line = emit(text)
+        elif tag == _TC and cells:
+            text = " ".join(cells.pop())
+            if rows:
+                rows[-1].append(text)
+        elif tag == _TR and rows:
+            text = CELL_SEPARATOR.join(cell for cell in rows.pop() if cell)
+            if text:
+                line = emit(text)
+
+        elem.clear()
+        if path:
+            path[-1].remove(elem)
+        if line is not None:
+            yield line
+
+
+def iter_docx_lines(file_path: str):
+    """Text lines of the document in reading order, header/footer repeats dropped"""
+    with zipfile.ZipFile(file_path) as archive:
+        names = set(archive.namelist())
+        seen = set()
+        for name in docx_parts(archive):
+            if name not in names:
+                continue
+            body = name == "word/document.xml"
+            with archive.open(name) as stream:
+                for line in _part_lines(stream):
+                    if not body:
+                        if line in seen:
+                            continue
+                        seen.add(line)
+                    yield line
+
+
+def _stream_text(file_path: str, max_chars: int) -> str:
+    lines = []
+    total = 0
+    generator = iter_docx_lines(file_path)
+    try:
+        for line in generator:
+            lines.append(line)
+            total += len(line) + 1
+            if total >= max_chars:
+                break
+    finally:
+        generator.close()
+    return "\n".join(lines)[:max_chars]
+
+
+def _python_docx_text(file_path: str, max_chars: int) -> str:
+    doc = docx.Document(file_path)
+    return "\n".join(para.text for para in doc.paragraphs)[:max_chars]
+
+
+def extract_docx_text(file_path: str, max_chars: int = None) -> str:
+    """Streaming extraction, with python-docx as the fallback"""
+    max_chars = max_chars or DOCX_MAX_CHARS
+    try:
+        return _stream_text(file_path, max_chars)
+    except Exception as e:
+        if docx is None:
+            raise
+        print(f"Streaming DOCX extraction failed on {file_path}, trying python-docx: {e}")
+    return _python_docx_text(file_path, max_chars)
+
+
+EXTRACTORS = {"stream": _stream_text, "python-docx": _python_docx_text}
+
+
+def _benchmark_extractor(name: str, files: list, repeat: int) -> dict:
+    """Runs in a fresh process so peak RSS belongs to this extractor alone"""
+    import resource
+    started = time.perf_counter()
+    chars = 0
+    failed = 0
+    for _ in range(repeat):
+        for file_path in files:
+            try:
+                chars += len(EXTRACTORS[name](file_path, DOCX_MAX_CHARS))
+            except Exception:
+                failed += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "ms_per_file": 1000 * elapsed / (len(files) * repeat),
+        "files_per_second": len(files) * repeat / elapsed if elapsed else 0.0,
+        "chars": chars // repeat,
+        "failed": failed // repeat,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def run_benchmark(folder: str, repeat: int = 3):
+    from concurrent.futures import ProcessPoolExecutor
+    files = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(".docx")
+    )
+    if not files:
+        print(f"No DOCX files in {folder}")
+        return
+    print(f"{len(files)} DOCX files, {repeat} passes, cap: {DOCX_MAX_CHARS} chars")
+    print(f"{'extractor':<13}{'ms/file':>10}{'files/s':>10}{'chars':>10}{'failed':>8}{'peak MB':>9}")
+    for name in EXTRACTORS:
+        if name == "python-docx" and docx is None:
+            print(f"{name:<13}not installed")
+            continue
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(_benchmark_extractor, name, files, repeat).result()
+        print(
+            f"{name:<13}{result['ms_per_file']:>10.1f}{result['files_per_second']:>10.1f}"
+            f"{result['chars']:>10}{result['failed']:>8}{result['peak_rss_mb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    # python -m app.utils.docx_engine benchmark FOLDER [REPEAT]
+    if len(sys.argv) < 3 or sys.argv[1] != "benchmark":
+        print("Usage: python -m app.utils.docx_engine benchmark FOLDER [REPEAT]")
+        sys.exit(1)
+    run_benchmark(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 3)
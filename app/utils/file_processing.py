@@ -1,9 +1,9 @@
 import os
 import shutil
-import pdfplumber
-import docx
 from fastapi import UploadFile, HTTPException
 from datetime import datetime
+from app.utils.pdf_engine import extract_pdf_text
+from app.utils.docx_engine import extract_docx_text
 
 UPLOAD_DIR = "uploads/resumes"
 
@@ -35,34 +35,27 @@ def save_upload_file(upload_file: UploadFile, user_id: int, sub_folder: str = ""
         raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
 
 def extract_text_from_pdf(file_path: str) -> str:
-    """Extracts text from a PDF file using pdfplumber"""
+    """Extracts text from a PDF file with the PDF engine (pypdfium2, falling back to pdfplumber)"""
     try:
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-        return text
+        return extract_pdf_text(file_path)
     except Exception as e:
         print(f"Error extracting PDF text: {e}")
         return ""
 
 def extract_text_from_docx(file_path: str) -> str:
-    """Extracts text from a DOCX file using python-docx"""
+    """Extracts text from a DOCX file, tables, text boxes and headers/footers included"""
     try:
-        doc = docx.Document(file_path)
-        full_text = []
-        for para in doc.paragraphs:
-            full_text.append(para.text)
-        return "\n".join(full_text)
+        return extract_docx_text(file_path)
     except Exception as e:
         print(f"Error extracting DOCX text: {e}")
         return ""
 
+def is_pdf(file_path: str, content_type: str) -> bool:
+    return "pdf" in content_type.lower() or file_path.lower().endswith(".pdf")
+
 def extract_text_from_file(file_path: str, content_type: str) -> str:
     """Router to choose correct extraction method"""
-    if "pdf" in content_type.lower() or file_path.lower().endswith(".pdf"):
+    if is_pdf(file_path, content_type):
         return extract_text_from_pdf(file_path)
     elif "word" in content_type.lower() or "document" in content_type.lower() or file_path.lower().endswith(".docx"):
         return extract_text_from_docx(file_path)
@@ -0,0 +1,131 @@
+"""
+Tolerant JSON parsing for LLM output.
+
+Models wrap JSON in markdown fences or prose, leave trailing commas, and get
+cut off at max_tokens. parse_llm_json makes one pass over the text that
+skips anything before the first bracket or after the document closes, drops
+trailing commas, and, for a truncated document, closes the open string and
+brackets. If closing alone does not give valid JSON, it cuts back to the
+last complete value. Because it only needs a prefix, it can parse a
+streamed response at any point.
+
+parse_llm_json_state tells a complete document that only needed cleanup
+("repaired") apart from one that was cut off ("truncated"), whose last
+value may be incomplete.
+"""
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Truncated documents are cut back at most this many times before giving up
+MAX_CUTBACKS = 50
+
+# Parse states
+CLEAN = "clean"
+REPAIRED = "repaired"
+TRUNCATED = "truncated"
+
+
+class JsonRepairError(ValueError):
+    """The text holds no JSON document that can be recovered"""
+
+
+def _strip_trailing(chars: list, junk: str):
+    while chars and chars[-1] in junk:
+        chars.pop()
+
+
+def _close(chars: list, stack: list, in_string: bool) -> str:
+    tail = list(chars)
+    if in_string:
+        if tail and tail[-1] == "\\":
+            tail.pop()
+        tail.append('"')
+    _strip_trailing(tail, " \t\r\n,:")
+    return "".join(tail) + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def parse_llm_json(text: str):
+    """
+    Parses the first JSON object or array in `text`, repairing it where
+    possible. Returns (value, repaired), where `repaired` means the document
+    itself had to be fixed. Raises JsonRepairError.
+    """
+    value, state = parse_llm_json_state(text)
+    return value, state != CLEAN
+
+
+def parse_llm_json_state(text: str):
+    """
+    parse_llm_json returning (value, state): CLEAN, REPAIRED (complete but
+    fixed, e.g. a trailing comma) or TRUNCATED (closed or cut back because
+    the text ended inside the document).
+    """
+    if not text:
+        raise JsonRepairError("Empty response")
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise JsonRepairError("No JSON object or array in response")
+    body = text[min(starts):]
+
+    # Fast path: valid once fences or surrounding prose are ignored
+    try:
+        return json.JSONDecoder(strict=False).raw_decode(body)[0], CLEAN
+    except ValueError:
+        pass
+
+    out = []
+    stack = []
+    cut_points = []  # (output length, stack) where the document can be closed
+    in_string = False
+    escape = False
+    closed = False
+
+    for ch in body:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            out.append(ch)
+            cut_points.append((len(out), list(stack)))
+        elif ch in "}]":
+            _strip_trailing(out, " \t\r\n,")
+            if not stack:
+                break
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                closed = True
+                break
+        elif ch == ",":
+            _strip_trailing(out, " \t\r\n,")
+            cut_points.append((len(out), list(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    if closed:
+        try:
+            return json.loads("".join(out), strict=False), REPAIRED
+        except ValueError as e:
+            raise JsonRepairError(f"Unrecoverable JSON: {e}")
+
+    # Truncated: close what is open, then cut back to earlier complete members
+    attempts = [(out, stack, in_string)]
+    attempts += [(out[:length], saved, False) for length, saved in reversed(cut_points[-MAX_CUTBACKS:])]
+    for chars, open_stack, open_string in attempts:
+        try:
+            return json.loads(_close(chars, open_stack, open_string), strict=False), TRUNCATED
+        except ValueError:
+            continue
+    raise JsonRepairError("Truncated JSON could not be closed")
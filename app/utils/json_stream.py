@@ -0,0 +1,105 @@
+"""
+Incremental JSON scanning for streamed LLM output
+"""
+import json
+
+
+class JsonArrayItemStream:
+    """
+    Emits each element object of a top-level array (e.g. "weeks") as soon as
+    its closing brace arrives, while the rest of the document is still being
+    generated. Text before the first '{' (such as a ```json fence) is ignored.
+
+    Usage:
+        scanner = JsonArrayItemStream("weeks")
+        for chunk in chunks:
+            for week in scanner.feed(chunk):
+                ...
+    """
+
+    def __init__(self, array_key: str):
+        self.array_key = array_key
+        self.buffer = []
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._colon_after_key = False
+        self._array_depth = None
+        self._item_start = None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._text
+
+    def feed(self, chunk: str) -> list:
+        self._text += chunk
+        items = []
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start:i + 1]
+                        self._colon_after_key = False
+            elif not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                if self._depth == 1 and self._last_key is not None:
+                    self._colon_after_key = True
+            elif ch == "{" or ch == "[":
+                if (
+                    ch == "[" and self._depth == 1 and self._colon_after_key
+                    and self._decode_key() == self.array_key
+                ):
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif ch == "}" or ch == "]":
+                self._depth -= 1
+                if ch == "}" and self._item_start is not None and self._depth == self._array_depth:
+                    item = self._parse_item(text[self._item_start:i + 1])
+                    self._item_start = None
+                    if item is not None:
+                        items.append(item)
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self._array_depth = None
+                if self._depth == 1:
+                    self._last_key = None
+                    self._colon_after_key = False
+            i += 1
+        self._pos = i
+        self.buffer.extend(items)
+        return items
+
+    def _decode_key(self):
+        try:
+            return json.loads(self._last_key)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_item(raw: str):
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
@@ -0,0 +1,331 @@
+"""
+PDF text extraction engine.
+
+Backends share one small interface: page_count(path), and pages(path,
+first, last), which yields page texts one at a time.
+
+- "pdfium" (pypdfium2) reads the PDF's text layer through PDFium's C code
+  without layout analysis. It is the fast path.
+- "pdfplumber" does full layout analysis. It gives higher fidelity on
+  multi-column layouts and tables, but is many times slower. It is the
+  fallback when pypdfium2 is missing, fails on a file, or finds no text in
+  a page range, and it is the only backend with PDF_BACKEND=pdfplumber.
+
+Only the first PDF_MAX_PAGES pages are read, and reading stops once
+PDF_MAX_CHARS characters are collected. The analysis prompt keeps a few
+thousand tokens at most, so the rest of a long CV was never used. Pages are
+released as soon as their text is taken, so memory stays at about one page
+on top of the document. The hard memory ceiling is the extraction pool's
+RLIMIT_DATA. The pool also splits larger documents into page ranges of
+PDF_PAGES_PER_TASK and extracts them in parallel (see
+app.services.extraction_pool).
+
+scan_pdf() is the cheap pre-scan run before extraction. It only checks
+whether each page has text objects (font/glyph runs) or images, without
+decoding any text, and classifies the file as text, mixed or image_only.
+Image-only files (scans without an OCR layer) skip extraction and analysis.
+
+Benchmark the backends on a folder of PDFs:
+    python -m app.utils.pdf_engine benchmark path/to/pdfs [repeat]
+"""
+import os
+import sys
+import time
+from contextlib import closing
+from dotenv import load_dotenv
+
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = None
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+load_dotenv()
+
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pdfium").lower()
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "10"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "20000"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "3"))
+
+# Upload classifications stored on StudentProfile.resume_classification
+TEXT = "text"
+MIXED = "mixed"
+IMAGE_ONLY = "image_only"
+
+
+class PdfiumBackend:
+    name = "pdfium"
+
+    def available(self) -> bool:
+        return pdfium is not None
+
+    def page_count(self, file_path: str) -> int:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def pages(self, file_path: str, first: int, last: int):
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for index in range(first, min(last, len(pdf))):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                try:
+                    yield textpage.get_text_range().replace("\r\n", "\n")
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+    def scan(self, file_path: str, max_pages: int) -> list:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            pages = []
+            for index in range(min(len(pdf), max_pages)):
+                page = pdf[index]
+                try:
+                    has_text = has_images = False
+                    # Walks the page's object list only; no text page is built
+                    for obj in page.get_objects(max_depth=2):
+                        if obj.type == pdfium_c.FPDF_PAGEOBJ_TEXT:
+                            has_text = True
+                            break
+                        if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+                            has_images = True
+                    pages.append((has_text, has_images))
+                finally:
+                    page.close()
+            return pages
+        finally:
+            pdf.close()
+
+
+class PdfplumberBackend:
+    name = "pdfplumber"
+
+    def available(self) -> bool:
+        return pdfplumber is not None
+
+    def page_count(self, file_path: str) -> int:
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+    def pages(self, file_path: str, first: int, last: int):
+        with pdfplumber.open(file_path) as pdf:
+            for page in pdf.pages[first:last]:
+                try:
+                    yield page.extract_text() or ""
+                finally:
+                    # Drops the page's parsed layout objects
+                    page.flush_cache()
+
+    def scan(self, file_path: str, max_pages: int) -> list:
+        with pdfplumber.open(file_path) as pdf:
+            pages = []
+            for page in pdf.pages[:max_pages]:
+                try:
+                    # Parses the page's objects but skips layout analysis
+                    pages.append((bool(page.chars), bool(page.images)))
+                finally:
+                    page.flush_cache()
+            return pages
+
+
+BACKENDS = {backend.name: backend for backend in (PdfiumBackend(), PdfplumberBackend())}
+# High-fidelity fallback after the configured backend
+FALLBACK_BACKEND = "pdfplumber"
+
+
+def backend_order(preferred: str = None) -> list:
+    """Available backends to try, the preferred (or configured) one first"""
+    names = [preferred or PDF_BACKEND, FALLBACK_BACKEND]
+    order = []
+    for name in names:
+        backend = BACKENDS.get(name)
+        if backend is not None and backend.available() and backend not in order:
+            order.append(backend)
+    return order
+
+
+def pdf_page_count(file_path: str, preferred: str = None) -> int:
+    """Pages in the document, or 0 if no backend can open it"""
+    for backend in backend_order(preferred):
+        try:
+            return backend.page_count(file_path)
+        except Exception as e:
+            print(f"{backend.name} could not open {file_path}: {e}")
+    return 0
+
+
+def page_ranges(page_count: int, per_task: int = None) -> list:
+    """[(first, last), ...] 0-based, end-exclusive, covering at most PDF_MAX_PAGES pages"""
+    per_task = per_task or PDF_PAGES_PER_TASK
+    pages = min(page_count, PDF_MAX_PAGES)
+    return [(first, min(first + per_task, pages)) for first in range(0, pages, per_task)]
+
+
+def _read_pages(backend, file_path: str, first: int, last: int, max_chars: int) -> list:
+    texts = []
+    total = 0
+    with closing(backend.pages(file_path, first, last)) as pages:
+        for text in pages:
+            texts.append(text)
+            total += len(text)
+            if total >= max_chars:
+                break
+    return texts
+
+
+def extract_page_range(file_path: str, first: int, last: int, max_chars: int = None, preferred: str = None):
+    """
+    Text of pages [first, last), stopping early at `max_chars`. Returns
+    (text, backend name); the backend name is None when nothing could be read.
+    """
+    max_chars = max_chars or PDF_MAX_CHARS
+    for backend in backend_order(preferred):
+        try:
+            texts = _read_pages(backend, file_path, first, last, max_chars)
+        except Exception as e:
+            print(f"{backend.name} failed on {file_path} pages {first + 1}-{last}: {e}")
+            continue
+        text = "\n".join(t for t in texts if t)
+        if text.strip():
+            return text[:max_chars], backend.name
+    return "", None
+
+
+def join_ranges(texts: list, max_chars: int = None) -> str:
+    """Joins page-range texts in order, stopping at the character cap"""
+    max_chars = max_chars or PDF_MAX_CHARS
+    parts = []
+    total = 0
+    for text in texts:
+        if not text:
+            continue
+        parts.append(text)
+        total += len(text) + 1
+        if total >= max_chars:
+            break
+    return "\n".join(parts)[:max_chars]
+
+
+def classify_pages(pages: list) -> str:
+    """text / mixed / image_only from [(has_text, has_images), ...]"""
+    text_pages = sum(1 for has_text, _ in pages if has_text)
+    if not text_pages:
+        return IMAGE_ONLY
+    if text_pages == len(pages):
+        return TEXT
+    return MIXED
+
+
+def scan_pdf(file_path: str, preferred: str = None) -> dict:
+    """
+    Pre-scan of the first PDF_MAX_PAGES pages. `classification` is None if
+    no backend could open the file, in which case extraction decides.
+    """
+    for backend in backend_order(preferred):
+        try:
+            pages = backend.scan(file_path, PDF_MAX_PAGES)
+        except Exception as e:
+            print(f"{backend.name} could not scan {file_path}: {e}")
+            continue
+        return {
+            "classification": classify_pages(pages),
+            "pages": len(pages),
+            "text_pages": sum(1 for has_text, _ in pages if has_text),
+            "image_pages": sum(1 for _, has_images in pages if has_images)
+        }
+    return {"classification": None, "pages": 0, "text_pages": 0, "image_pages": 0}
+
+
+def extract_pdf_text(file_path: str, preferred: str = None) -> str:
+    """Sequential extraction of the whole (capped) document in this process"""
+    page_count = pdf_page_count(file_path, preferred)
+    if not page_count:
+        return ""
+    return extract_page_range(file_path, 0, min(page_count, PDF_MAX_PAGES), preferred=preferred)[0]
+
+
+def _benchmark_backend(name: str, files: list, repeat: int) -> dict:
+    """Runs in a fresh process so peak RSS belongs to this backend alone"""
+    import resource
+    started = time.perf_counter()
+    chars = 0
+    pages = 0
+    empty = 0
+    for _ in range(repeat):
+        for file_path in files:
+            try:
+                count = min(BACKENDS[name].page_count(file_path), PDF_MAX_PAGES)
+                text = "\n".join(_read_pages(BACKENDS[name], file_path, 0, count, PDF_MAX_CHARS))
+            except Exception:
+                count, text = 0, ""
+            pages += count
+            chars += len(text)
+            empty += 0 if text.strip() else 1
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": elapsed,
+        "ms_per_file": 1000 * elapsed / (len(files) * repeat),
+        "pages_per_second": pages / elapsed if elapsed else 0.0,
+        "chars": chars // repeat,
+        "empty_files": empty // repeat,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def _benchmark_parallel(files: list, workers: int, repeat: int) -> float:
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Start the workers before timing
+        list(pool.map(pdf_page_count, files[:workers]))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for file_path in files:
+                ranges = page_ranges(pdf_page_count(file_path))
+                futures = [pool.submit(extract_page_range, file_path, first, last) for first, last in ranges]
+                join_ranges([future.result()[0] for future in futures])
+        return time.perf_counter() - started
+
+
+def run_benchmark(folder: str, repeat: int = 3):
+    from concurrent.futures import ProcessPoolExecutor
+    files = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(".pdf")
+    )
+    if not files:
+        print(f"No PDFs in {folder}")
+        return
+    print(f"{len(files)} PDFs, {repeat} passes, caps: {PDF_MAX_PAGES} pages / {PDF_MAX_CHARS} chars")
+    print(f"{'backend':<12}{'ms/file':>10}{'pages/s':>10}{'chars':>10}{'empty':>7}{'peak MB':>9}")
+    for name, backend in BACKENDS.items():
+        if not backend.available():
+            print(f"{name:<12}not installed")
+            continue
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(_benchmark_backend, name, files, repeat).result()
+        print(
+            f"{name:<12}{result['ms_per_file']:>10.1f}{result['pages_per_second']:>10.1f}"
+            f"{result['chars']:>10}{result['empty_files']:>7}{result['peak_rss_mb']:>9.1f}"
+        )
+    workers = min(4, os.cpu_count() or 1)
+    elapsed = _benchmark_parallel(files, workers, repeat)
+    print(f"engine ({PDF_BACKEND}, {workers} workers, {PDF_PAGES_PER_TASK} pages/task): "
+          f"{1000 * elapsed / (len(files) * repeat):.1f} ms/file")
+
+
+if __name__ == "__main__":
+    # python -m app.utils.pdf_engine benchmark FOLDER [REPEAT]
+    if len(sys.argv) < 3 or sys.argv[1] != "benchmark":
+        print("Usage: python -m app.utils.pdf_engine benchmark FOLDER [REPEAT]")
+        sys.exit(1)
+    run_benchmark(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 3)
@@ -0,0 +1,231 @@
+"""
+Local skill extraction.
+
+The curated taxonomy in skills_taxonomy.txt (canonical skills plus their
+aliases) is compiled once into an Aho-Corasick automaton over word tokens.
+A resume is then matched against every alias in a single linear pass.
+Matching whole tokens also gives word boundaries for free, so "Java" never
+matches inside "JavaScript".
+
+Taxonomy format: `[Category]` starts a section. Each other line is
+`Canonical | alias | alias`, where the canonical name also counts as an
+alias. Prefix an alias with `=` to match it case-sensitively, for terms
+that are only a skill when written that way (`=TS`, `=LoRA`). Prefix it
+with `~` for ordinary words and single letters (`~R`, `~Swift`, `~React`):
+they also match case-sensitively, and only as an item of a list of
+skills: not glued to a neighbour ("R&D", "C-suite"), followed by a list
+separator, "and"/"or" or another skill, and in a run of adjacent skills
+that has an unambiguous one or at least three items. So "Python, R, SQL"
+finds R, but "Vitamin C" and "Swift response" find nothing. Lines
+starting with `#` are comments.
+"""
+import os
+import re
+import threading
+from typing import List, Optional
+
+TAXONOMY_PATH = os.path.join(os.path.dirname(__file__), "skills_taxonomy.txt")
+
+# Words, plus the punctuation skills are spelled with: C++, C#, Node.js, .NET
+_TOKEN = re.compile(r"\.?[\w+#]+(?:\.[\w+#]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text)
+
+
+# Words that may join the items of a skill list
+_LIST_CONNECTORS = frozenset(["and", "or"])
+# A run of list-only aliases without an unambiguous skill needs this many items
+_MIN_LIST_RUN = 3
+# Characters that make a word part of a larger term: R&D, C-suite, Swift's
+_GLUE = "&-'’"
+_LIST_SEPARATOR = re.compile(r"[,;:|/•·.()\n]")
+
+
+def _lower_all(tokens: List[str]) -> List[str]:
+    # One str.lower over the joined text instead of one call per token
+    return "\n".join(tokens).lower().split("\n") if tokens else []
+
+
+class SkillExtractor:
+    """
+    Aho-Corasick automaton whose alphabet is lowercased word tokens.
+    """
+
+    def __init__(self, entries: list):
+        """
+        Args:
+            entries: [(canonical, category, [(alias, case_sensitive, list_only), ...]), ...]
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self.categories = {}
+
+        for canonical, category, aliases in entries:
+            self.categories.setdefault(canonical, category)
+            for alias, case_sensitive, list_only in aliases:
+                tokens = tokenize(alias)
+                if tokens:
+                    exact = tuple(tokens) if case_sensitive or list_only else None
+                    self._add(_lower_all(tokens), (len(tokens), canonical, exact, list_only))
+        self._link()
+        # Tokens that appear in any alias; everything else resets the automaton
+        self._alphabet = frozenset(token for state in self._goto for token in state)
+
+    def _add(self, tokens: List[str], output: tuple):
+        state = 0
+        for token in tokens:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        if output not in self._out[state]:
+            self._out[state].append(output)
+
+    def _link(self):
+        # Breadth-first failure links; each state also inherits its fallback's outputs
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(token, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    @classmethod
+    def from_file(cls, path: str = TAXONOMY_PATH) -> "SkillExtractor":
+        entries = []
+        category = "General"
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("[") and line.endswith("]"):
+                    category = line[1:-1].strip()
+                    continue
+                terms = [term.strip() for term in line.split("|") if term.strip()]
+                aliases = [(term.lstrip("=~"), term.startswith("="), term.startswith("~")) for term in terms]
+                entries.append((aliases[0][0], category, aliases))
+        return cls(entries)
+
+    def find(self, text: str) -> List[tuple]:
+        """
+        Returns (start_token, end_token, canonical) for every match, keeping
+        the longest where matches overlap ("React Native" over "React"), and
+        list-only aliases only where they stand in a list of skills.
+        """
+        spans = [m.span() for m in _TOKEN.finditer(text)]
+        tokens = [text[start:end] for start, end in spans]
+        lowered = _lower_all(tokens)
+        alphabet = self._alphabet
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        previous = -2
+
+        # Only tokens in the alphabet can advance a match, so walk just those;
+        # a gap means an unknown token in between, which sends us back to the root
+        for i in [i for i, token in enumerate(lowered) if token in alphabet]:
+            token = lowered[i]
+            if i != previous + 1:
+                state = 0
+            previous = i
+            nxt = goto[state].get(token)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(token)
+            state = nxt or 0
+            for length, canonical, exact, list_only in out[state]:
+                start = i - length + 1
+                if exact is not None and tuple(tokens[start:i + 1]) != exact:
+                    continue
+                matches.append((start, i + 1, canonical, list_only))
+
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        kept = []
+        last_end = 0
+        for match in matches:
+            if match[0] >= last_end:
+                kept.append(match)
+                last_end = match[1]
+        return self._in_lists(kept, text, spans, lowered)
+
+    @staticmethod
+    def _is_list_item(match: tuple, starts: set, text: str, spans: list, lowered: List[str]) -> bool:
+        first = spans[match[0]][0]
+        last = spans[match[1] - 1][1]
+        if (first and text[first - 1] in _GLUE) or (last < len(text) and text[last] in _GLUE):
+            return False
+        if match[1] == len(spans):
+            return True
+        between = text[last:spans[match[1]][0]]
+        return bool(_LIST_SEPARATOR.search(between)) or lowered[match[1]] in _LIST_CONNECTORS or match[1] in starts
+
+    @classmethod
+    def _in_lists(cls, matches: List[tuple], text: str, spans: list, lowered: List[str]) -> List[tuple]:
+        """Drops list-only matches that do not stand as items of a list of skills"""
+        starts = {m[0] for m in matches}
+        matches = [m for m in matches if not m[3] or cls._is_list_item(m, starts, text, spans, lowered)]
+        result = []
+        run = []
+
+        def close_run():
+            confirmed = len(run) >= _MIN_LIST_RUN or any(not list_only for *_, list_only in run)
+            result.extend(m[:3] for m in run if confirmed or not m[3])
+
+        for match in matches:
+            if run:
+                gap = lowered[run[-1][1]:match[0]]
+                if len(gap) > 1 or (gap and gap[0] not in _LIST_CONNECTORS):
+                    close_run()
+                    run = []
+            run.append(match)
+        if run:
+            close_run()
+        return result
+
+    def extract(self, text: str, limit: Optional[int] = None) -> List[str]:
+        """Canonical skill names in order of first appearance"""
+        seen = {}
+        for _, _, canonical in self.find(text or ""):
+            seen.setdefault(canonical, None)
+        skills = list(seen)
+        return skills[:limit] if limit else skills
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_skill_extractor() -> SkillExtractor:
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = SkillExtractor.from_file()
+    return _extractor
+
+
+def extract_skills(text: str, limit: Optional[int] = None) -> List[str]:
+    return get_skill_extractor().extract(text, limit)
+
+
+def merge_skills(*skill_lists) -> List[str]:
+    """Concatenates skill lists, dropping case-insensitive duplicates"""
+    merged = {}
+    for skills in skill_lists:
+        if isinstance(skills, str):
+            skills = [skills]
+        for skill in skills or []:
+            if isinstance(skill, str) and skill.strip():
+                merged.setdefault(skill.strip().lower(), skill.strip())
+    return list(merged.values())
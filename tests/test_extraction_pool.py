@@ -0,0 +1,35 @@
+"""
+Runs real resumes through the extraction pool with the default limits.
+The repo's own documentation files stand in for uploads.
+"""
+import asyncio
+import os
+
+from app.services import extraction_pool
+from app.services.extraction_pool import start_extraction_pool, stop_extraction_pool, extract_text_async, classify_upload_async
+from app.utils.pdf_engine import TEXT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "AI_Career_Mentor_Executive_Documentation.pdf")
+DOCX = os.path.join(ROOT, "AI_Career_Mentor_Executive_Documentation.docx")
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def test_pool_extracts_pdf_and_docx_with_default_limits():
+    async def run():
+        await start_extraction_pool()
+        try:
+            classification = await classify_upload_async(PDF, "application/pdf")
+            pdf_text = await extract_text_async(PDF, "application/pdf")
+            docx_text = await extract_text_async(DOCX, DOCX_TYPE)
+        finally:
+            await stop_extraction_pool()
+        return classification, pdf_text, docx_text
+
+    crashes = extraction_pool._stats["worker_crashes"]
+    classification, pdf_text, docx_text = asyncio.run(run())
+
+    assert extraction_pool._stats["worker_crashes"] == crashes
+    assert classification == TEXT
+    assert len(pdf_text.strip()) > 1000
+    assert len(docx_text.strip()) > 1000
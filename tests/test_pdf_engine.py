@@ -0,0 +1,34 @@
+"""
+Both PDF backends on one of the repo's own PDFs; pdfplumber is forced so
+the fallback path is exercised even where pypdfium2 is installed.
+"""
+import os
+
+import pytest
+
+from app.utils import pdf_engine
+from app.utils.pdf_engine import TEXT, extract_page_range, extract_pdf_text, scan_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "AI_Career_Mentor_Executive_Documentation.pdf")
+
+
+@pytest.mark.parametrize("backend", ["pdfplumber", "pdfium"])
+def test_backend_extracts_and_scans(backend):
+    if not pdf_engine.BACKENDS[backend].available():
+        pytest.skip(f"{backend} is not installed")
+
+    text, used = extract_page_range(PDF, 0, 3, preferred=backend)
+    assert used == backend
+    assert len(text.strip()) > 500
+    assert len(extract_pdf_text(PDF, preferred=backend).strip()) > 1000
+    assert scan_pdf(PDF, preferred=backend)["classification"] == TEXT
+
+
+def test_pdfplumber_backend_reads_every_page():
+    if not pdf_engine.BACKENDS["pdfplumber"].available():
+        pytest.skip("pdfplumber is not installed")
+    backend = pdf_engine.BACKENDS["pdfplumber"]
+    pages = list(backend.pages(PDF, 0, backend.page_count(PDF)))
+    assert pages and all(isinstance(page, str) for page in pages)
+    assert len(backend.scan(PDF, pdf_engine.PDF_MAX_PAGES)) == len(pages)
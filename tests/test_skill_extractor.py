@@ -0,0 +1,29 @@
+"""
+Single letters and ordinary words in the taxonomy (~ aliases) only count
+as items of a skill list.
+"""
+import pytest
+
+from app.utils.skill_extractor import extract_skills
+
+
+@pytest.mark.parametrize("text", [
+    "Led R&D for the C-suite.",
+    "Vitamin C supplements.",
+    "Swift response to incidents.",
+    "Rust removal on bridges.",
+    "Polish the UI, React to feedback",
+])
+def test_prose_finds_no_ambiguous_skills(text):
+    assert not {"R", "C", "Swift", "Rust", "React"} & set(extract_skills(text))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Skills: Python, R, SQL", ["Python", "R", "SQL"]),
+    ("Languages: C, C++, Java", ["C", "C++", "Java"]),
+    ("Built apps in Swift and Kotlin", ["Swift", "Kotlin"]),
+    ("React, Redux and Jest", ["React", "Redux", "Jest"]),
+    ("R programming and ggplot2", ["R"]),
+])
+def test_skill_lists_keep_ambiguous_skills(text, expected):
+    assert extract_skills(text) == expected
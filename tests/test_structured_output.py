@@ -0,0 +1,26 @@
+"""
+Replies cut off at max_tokens must not pass as complete output.
+"""
+import pytest
+
+from app.schemas.ai_output import ANALYSIS_OUTPUT
+from app.services.structured_output import parse_structured, parse_structured_partial
+
+ANALYSIS_HEAD = (
+    '{"score": 70, "experience_level": "Junior", "skills": ["Python"], '
+    '"top_careers": [{"title": "Data Analyst", "match_percent": 80}], '
+)
+
+
+def test_repaired_reply_is_accepted():
+    data = parse_structured(ANALYSIS_HEAD + '"missing_skills": ["SQL",],}', ANALYSIS_OUTPUT, "analysis")
+    assert data["missing_skills"] == ["SQL"]
+
+
+def test_truncated_reply_is_rejected():
+    truncated = ANALYSIS_HEAD + '"missing_skills": ["SQL", "Tab'
+    with pytest.raises(ValueError):
+        parse_structured(truncated, ANALYSIS_OUTPUT, "analysis")
+    data, was_truncated = parse_structured_partial(truncated, ANALYSIS_OUTPUT, "analysis")
+    assert was_truncated
+    assert data["missing_skills"][-1] == "Tab"